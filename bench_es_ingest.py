@@ -0,0 +1,110 @@
+"""
+Throughput of Elasticsearch ingestion against a local stub `_bulk` endpoint
+
+Usage:
+    python bench_es_ingest.py [--logs 100000] [--reject-rate 0.01] [--latency 0.005]
+
+Compares the previous one-bulk-per-log path (refresh=True) with BulkIndexer.
+The stub answers like Elasticsearch, rejecting a fraction of items with 429
+so per-item retries are exercised, and sleeping --latency seconds per request
+(plus a further --latency when refresh is requested).
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime
+from aiohttp import web
+from elasticsearch import AsyncElasticsearch
+from src.collectors.bulk_indexer import BulkIndexer
+
+PORT = 9299
+
+
+def make_stub(reject_rate: float, latency: float, counters: dict) -> web.Application:
+    """aiohttp app mimicking the Elasticsearch `_bulk` API"""
+    headers = {"X-Elastic-Product": "Elasticsearch"}
+
+    async def bulk(request: web.Request) -> web.Response:
+        body = await request.read()
+        docs = body.count(b"\n") // 2
+        await asyncio.sleep(latency * (2 if request.query.get("refresh") == "true" else 1))
+        items = []
+        for _ in range(docs):
+            if random.random() < reject_rate:
+                items.append({"index": {"status": 429, "error": {"type": "es_rejected_execution_exception"}}})
+            else:
+                items.append({"index": {"status": 201}})
+                counters["stored"] += 1
+        counters["requests"] += 1
+        return web.json_response({"took": 1, "errors": any(i["index"]["status"] != 201 for i in items),
+                                  "items": items}, headers=headers)
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_route("*", "/_bulk", bulk)
+    return app
+
+
+def sample_logs(count: int) -> list:
+    now = datetime.utcnow()
+    return [{
+        "timestamp": now,
+        "service": "api-gateway",
+        "endpoint": "/orders",
+        "response_time": 50.0 + i % 100,
+        "error": False,
+        "status_code": 200
+    } for i in range(count)]
+
+
+async def per_log(client, logs: list) -> float:
+    """Previous LogCollector._store_logs behaviour: one bulk call per log with refresh"""
+    started = time.perf_counter()
+    for log in logs:
+        await client.bulk(operations=[{"index": {"_index": "bench"}}, log], refresh=True)
+    return time.perf_counter() - started
+
+
+async def batched(client, logs: list) -> tuple:
+    indexer = BulkIndexer(client)
+    await indexer.start()
+    started = time.perf_counter()
+    # Producers hand over logs in small groups, like the collectors do
+    for i in range(0, len(logs), 100):
+        await indexer.add(logs[i:i + 100])
+    await indexer.stop()
+    return time.perf_counter() - started, indexer.stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logs", type=int, default=100_000)
+    parser.add_argument("--per-log-sample", type=int, default=500)
+    parser.add_argument("--reject-rate", type=float, default=0.01)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    counters = {"stored": 0, "requests": 0}
+    runner = web.AppRunner(make_stub(args.reject_rate, args.latency, counters))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", PORT).start()
+    client = AsyncElasticsearch(f"http://127.0.0.1:{PORT}")
+
+    try:
+        elapsed = await per_log(client, sample_logs(args.per_log_sample))
+        print(f"per-log bulk + refresh: {args.per_log_sample / elapsed:>10,.0f} docs/s "
+              f"({args.per_log_sample:,} docs)")
+
+        counters.update(stored=0, requests=0)
+        elapsed, stats = await batched(client, sample_logs(args.logs))
+        print(f"BulkIndexer:            {args.logs / elapsed:>10,.0f} docs/s "
+              f"({args.logs:,} docs, {counters['requests']} requests)")
+        print(f"  stats: {json.dumps(stats)}, stored by stub: {counters['stored']:,}")
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
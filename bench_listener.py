@@ -0,0 +1,85 @@
+"""
+Throughput of the UDP/TCP line listener with a sender in a separate process
+
+Usage:
+    python bench_listener.py [--lines 400000] [--rate 250000] [--protocol udp|tcp]
+
+Lines alternate between JSON and key=value records. Storage is replaced by a
+counter so the figure reflects receiving, batching and parsing only. UDP
+lines lost in the kernel never reach the listener, so they show up as the
+gap between sent and received rather than in the dropped counter.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from src.collectors.line_listener import LineListener
+
+HOST = "127.0.0.1"
+PORT = 15140
+
+SENDER = """
+import json, socket, sys, time
+protocol, lines, rate, port = sys.argv[1], int(sys.argv[2]), float(sys.argv[3]), int(sys.argv[4])
+json_line = json.dumps({"service": "api-gateway", "endpoint": "/auth", "response_time": 12.5, "status_code": 200}).encode()
+kv_line = b"service=auth-service endpoint=/login response_time=33.1 status_code=500"
+datagram = b"\\n".join([json_line, kv_line] * 10)
+started = time.perf_counter()
+if protocol == "udp":
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    for i in range(lines // 20):
+        sock.sendto(datagram, ("127.0.0.1", port))
+        # Pace the sender to the requested rate
+        while time.perf_counter() - started < (i + 1) * 20 / rate:
+            pass
+else:
+    sock = socket.create_connection(("127.0.0.1", port))
+    for _ in range(lines // 20):
+        sock.sendall(datagram + b"\\n")
+    sock.close()
+print(lines / (time.perf_counter() - started))
+"""
+
+
+class CountingCollector:
+    def __init__(self):
+        self.stored = 0
+
+    async def ingest(self, logs):
+        self.stored += len(logs)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=400_000)
+    parser.add_argument("--rate", type=float, default=250_000)
+    parser.add_argument("--protocol", choices=("udp", "tcp"), default="tcp")
+    args = parser.parse_args()
+
+    collector = CountingCollector()
+    udp = args.protocol == "udp"
+    listener = LineListener(collector, HOST, udp_port=PORT if udp else 0, tcp_port=0 if udp else PORT)
+    await listener.start()
+
+    started = time.perf_counter()
+    sender = await asyncio.create_subprocess_exec(
+        sys.executable, "-c", SENDER, args.protocol, str(args.lines), str(args.rate), str(PORT),
+        stdout=asyncio.subprocess.PIPE
+    )
+    send_rate = float((await sender.communicate())[0])
+    # Wait until the listener has caught up (or received nothing more for a second)
+    last = -1
+    while collector.stored < args.lines and collector.stored != last:
+        last = collector.stored
+        await asyncio.sleep(1)
+    elapsed = time.perf_counter() - started
+    await listener.stop()
+
+    print(f"{args.protocol}: sent {args.lines:,} lines at {send_rate:,.0f}/s, "
+          f"stored {collector.stored:,} ({collector.stored / elapsed:,.0f}/s end to end)")
+    print(f"  stats: {json.dumps(listener.get_stats())}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
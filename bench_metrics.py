@@ -0,0 +1,136 @@
+"""
+Benchmark for metric queries: full log scan vs. pre-aggregated time buckets
+
+Usage:
+    python bench_metrics.py [--sizes 1000000 10000000 50000000] [--legacy-max 1000000]
+
+The legacy scan keeps every log as a dict, so it is only run up to --legacy-max
+logs (about 0.5 GB of RSS per million logs).
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from src.collectors.load_generator import LoadGenerator
+from src.config.settings import MONITORING
+from src.storage.metric_buckets import MetricBucketStore, EPOCH, to_epoch_seconds
+
+CHUNK_SIZE = 1_000_000
+
+
+def generate_chunk(generator: LoadGenerator, size: int, now: float, span: float) -> dict:
+    """Generate a chunk of synthetic log columns spread over the last `span` seconds"""
+    end = EPOCH + timedelta(seconds=now)
+    batch = generator.generate(end - timedelta(seconds=span), end, count=size)
+    return {
+        "service_ids": batch["service"] - 1,
+        "services": np.array(generator.vocabularies["service"][1:]),
+        "timestamps": batch["timestamp"] / 1e9,
+        "response_times": batch["response_time"].astype(np.float64),
+        "errors": batch["error"]
+    }
+
+
+def legacy_recent_metrics(logs: list, start_time: datetime) -> dict:
+    """Previous Database.get_recent_metrics implementation"""
+    metrics = {}
+    for log in [log for log in logs if log["timestamp"] >= start_time]:
+        service = log["service"]
+        if service not in metrics:
+            metrics[service] = {"response_times": [], "error_rates": [], "request_rates": [],
+                                "error_count": 0, "total_requests": 0}
+        metrics[service]["response_times"].append(log["response_time"])
+        metrics[service]["error_rates"].append(1 if log["error"] else 0)
+        metrics[service]["request_rates"].append(1)
+        if log["error"]:
+            metrics[service]["error_count"] += 1
+        metrics[service]["total_requests"] += 1
+    return metrics
+
+
+def legacy_historical_metrics(logs: list) -> dict:
+    """Previous Database.get_historical_metrics implementation"""
+    metrics = {}
+    for log in logs:
+        service = log["service"]
+        if service not in metrics:
+            metrics[service] = {"timestamps": [], "response_times": [], "error_rates": [],
+                                "request_rates": [], "incidents": []}
+        metrics[service]["timestamps"].append(log["timestamp"])
+        metrics[service]["response_times"].append(log["response_time"])
+        metrics[service]["error_rates"].append(1 if log["error"] else 0)
+        metrics[service]["request_rates"].append(1)
+        metrics[service]["incidents"].append(1 if log["error"] or log["response_time"] > 1000 else 0)
+    return metrics
+
+
+def timed(func, *args, repeat: int = 3) -> float:
+    """Best-of-N wall time in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def run(size: int, legacy_max: int):
+    generator = LoadGenerator(seed=42)
+    now_dt = datetime.utcnow()
+    now = to_epoch_seconds(now_dt)
+    span = MONITORING["retention_period"] * 3600
+    recent_start = now_dt - timedelta(minutes=MONITORING["recent_window"])
+
+    store = MetricBucketStore()
+    legacy_logs = [] if size <= legacy_max else None
+    ingest_seconds = 0.0
+
+    for offset in range(0, size, CHUNK_SIZE):
+        chunk = generate_chunk(generator, min(CHUNK_SIZE, size - offset), now, span)
+        started = time.perf_counter()
+        for index, service in enumerate(chunk["services"]):
+            mask = chunk["service_ids"] == index
+            store.add(service, chunk["timestamps"][mask], chunk["response_times"][mask], chunk["errors"][mask])
+        ingest_seconds += time.perf_counter() - started
+
+        if legacy_logs is not None:
+            for service_id, ts, rt, err in zip(chunk["service_ids"].tolist(), chunk["timestamps"].tolist(),
+                                               chunk["response_times"].tolist(), chunk["errors"].tolist()):
+                legacy_logs.append({
+                    "timestamp": EPOCH + timedelta(seconds=ts),
+                    "service": chunk["services"][service_id],
+                    "response_time": rt,
+                    "error": err
+                })
+
+    row = {
+        "logs": f"{size:,}",
+        "ingest (logs/s)": f"{size / ingest_seconds:,.0f}",
+        "recent (buckets)": f"{timed(store.summarize, recent_start):.2f} ms",
+        "historical (buckets)": f"{timed(store.summarize):.2f} ms",
+        "recent (scan)": "skipped",
+        "historical (scan)": "skipped"
+    }
+    if legacy_logs is not None:
+        row["recent (scan)"] = f"{timed(legacy_recent_metrics, legacy_logs, recent_start, repeat=1):.2f} ms"
+        row["historical (scan)"] = f"{timed(legacy_historical_metrics, legacy_logs, repeat=1):.2f} ms"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 50_000_000])
+    parser.add_argument("--legacy-max", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = [run(size, args.legacy_max) for size in args.sizes]
+    headers = list(rows[0].keys())
+    widths = [max(len(h), *(len(r[h]) for r in rows)) for h in headers]
+    print(" | ".join(h.rjust(w) for h, w in zip(headers, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join(row[h].rjust(w) for h, w in zip(headers, widths)))
+
+
+if __name__ == "__main__":
+    main()
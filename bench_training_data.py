@@ -0,0 +1,109 @@
+"""
+Benchmark for Predictor training-set construction: per-row Python loops vs. sliding windows
+
+Usage:
+    python bench_training_data.py [--sizes 1000000 10000000] [--services 20] [--legacy-max 1000000]
+
+Sizes count per-bucket rows summed over all services. The legacy builder
+keeps every feature row as a Python list (about 0.4 GB of RSS per million
+rows), so it is only run up to --legacy-max rows.
+"""
+import argparse
+import time
+import numpy as np
+from src.predictors.predictor import Predictor
+
+
+def generate_series(size: int, n_services: int, seed: int = 42) -> dict:
+    """Synthetic per-bucket series shaped like MetricBucketStore.series()"""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for index, length in enumerate(np.full(n_services, size // n_services)):
+        counts = rng.poisson(50, length) + 1
+        errors = rng.binomial(counts, 0.02)
+        data[f"service-{index}"] = {
+            "timestamps": np.arange(length, dtype=np.int64) * 10,
+            "response_times": rng.lognormal(5, 0.5, length),
+            "error_rates": errors / counts,
+            "request_rates": counts,
+            "incidents": (errors > 2).astype(int)
+        }
+    return data
+
+
+def as_lists(data: dict) -> dict:
+    """The same series as lists, as Database.get_historical_metrics returns them"""
+    return {service: {name: values.tolist() for name, values in metrics.items()} for service, metrics in data.items()}
+
+
+def legacy_prepare_training_data(data: dict) -> tuple:
+    """Previous Predictor._prepare_training_data implementation"""
+    X = []
+    y = []
+
+    for service, metrics in data.items():
+        for i in range(len(metrics["timestamps"]) - 6):
+            feature_vector = []
+            for j in range(5):
+                feature_vector.extend([
+                    metrics["response_times"][i + j],
+                    metrics["error_rates"][i + j],
+                    metrics["request_rates"][i + j]
+                ])
+            X.append(feature_vector)
+            y.append(1 if any(metrics["incidents"][i+5:i+6]) else 0)
+
+    return np.array(X), np.array(y)
+
+
+def timed(func, *args, repeat: int = 3) -> tuple:
+    """Best-of-N wall time in milliseconds, and the last result"""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+
+def run(size: int, n_services: int, legacy_max: int):
+    predictor = Predictor.__new__(Predictor)
+    data = generate_series(size, n_services)
+    vectorized_ms, (X, y) = timed(predictor._prepare_training_data, data)
+
+    row = {
+        "rows": f"{size:,}",
+        "windows": f"{len(X):,}",
+        "vectorized (arrays)": f"{vectorized_ms:.2f} ms",
+        "vectorized (lists)": "skipped",
+        "legacy": "skipped",
+        "speedup": "-"
+    }
+    if size <= legacy_max:
+        lists = as_lists(data)
+        row["vectorized (lists)"] = f"{timed(predictor._prepare_training_data, lists)[0]:.2f} ms"
+        legacy_ms, (legacy_X, legacy_y) = timed(legacy_prepare_training_data, lists, repeat=1)
+        assert np.array_equal(X, legacy_X) and np.array_equal(y, legacy_y)
+        row["legacy"] = f"{legacy_ms:.2f} ms"
+        row["speedup"] = f"{legacy_ms / vectorized_ms:.0f}x"
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000])
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--legacy-max", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    rows = [run(size, args.services, args.legacy_max) for size in args.sizes]
+    headers = list(rows[0].keys())
+    widths = [max(len(h), *(len(r[h]) for r in rows)) for h in headers]
+    print(" | ".join(h.rjust(w) for h, w in zip(headers, widths)))
+    print("-+-".join("-" * w for w in widths))
+    for row in rows:
+        print(" | ".join(row[h].rjust(w) for h, w in zip(headers, widths)))
+
+
+if __name__ == "__main__":
+    main()
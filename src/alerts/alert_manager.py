@@ -2,77 +2,304 @@ import asyncio
 from datetime import datetime, timedelta
 from typing import List, Dict
 import boto3
-from src.config.external_services import AWS_SNS_CONFIG
+from botocore.config import Config
+from src.config.settings import AI_ENRICHMENT, ALERT_SETTINGS
+from src.config.external_services import AWS_SNS_CONFIG, MONITORING_CONFIG
+from src.alerts.enrichment import AnalysisEnricher
+from src.alerts.events import AlertEvents
+from src.alerts.notifier import ConsoleChannel, NotificationDispatcher, SNSChannel
+from src.integrations.analysis_cache import CachedAnalyzer
 from src.integrations.openai_analyzer import OpenAIAnalyzer
 from src.config.external_services import OPENAI_CONFIG
+from src.storage.database import Database, get_database
+
+# An open alert escalates when a report has a higher rank
+SEVERITY_RANK = {"info": 0, "warning": 1, "danger": 2, "critical": 2}
+
 
 class AlertManager:
-    def __init__(self):
-        self.alerts = []
+    """Alert state machine with one alert per (service, endpoint, rule) fingerprint
+
+    The first report of a condition opens an alert. Later reports while it
+    persists only bump its occurrence count and last-seen time, or escalate
+    its severity. The alert resolves once the condition has stayed clear for
+    ALERT_SETTINGS["resolve_after"] seconds, or has not been reported for
+    auto_resolve hours. A fingerprint that fires again
+    within the cooldown reopens the same alert, and after flap_threshold
+    reopens it is marked flapping and stops notifying.
+    """
+
+    def __init__(self, db: Database = None):
+        self.db = db or get_database()
+        self.incidents: Dict[tuple, Dict] = {}
+        self.fingerprints: Dict[str, tuple] = {}
+        self.cooldown = timedelta(seconds=MONITORING_CONFIG["alert_cooldown"])
+        self.resolve_after = timedelta(seconds=ALERT_SETTINGS["resolve_after"])
+        self.running = False
+        self.events = AlertEvents()
+
+        # AI analysis runs in the background and is attached to alerts when ready
         self.ai_analyzer = None
+        self.enricher = None
+        self.insights = None
+        self._insights_task = None
+        # Notifications held until their alert's analysis arrives: alert id -> (alert, timeout handle)
+        self._awaiting_analysis: Dict[str, tuple] = {}
         if OPENAI_CONFIG["enabled"]:
-            self.ai_analyzer = OpenAIAnalyzer(OPENAI_CONFIG["api_key"])
+            self.ai_analyzer = CachedAnalyzer(OpenAIAnalyzer(OPENAI_CONFIG["api_key"], OPENAI_CONFIG["base_url"]))
+            self.enricher = AnalysisEnricher(self.ai_analyzer, self._attach_analysis)
         
         # Initialize SNS client if configured
         self.sns_client = None
+        channels = []
         if AWS_SNS_CONFIG["enabled"]:
             self.sns_client = boto3.client(
                 'sns',
                 region_name=AWS_SNS_CONFIG["region"],
-                aws_access_key_id=AWS_SNS_CONFIG["access_key"],
-                aws_secret_access_key=AWS_SNS_CONFIG["secret_key"]
+                endpoint_url=AWS_SNS_CONFIG["endpoint_url"],
+                aws_access_key_id=AWS_SNS_CONFIG["access_key_id"],
+                aws_secret_access_key=AWS_SNS_CONFIG["secret_access_key"],
+                # The dispatcher retries with its own backoff
+                config=Config(retries={"total_max_attempts": 1})
             )
+            channels.append(SNSChannel(self.sns_client, AWS_SNS_CONFIG["topic_arn"]))
+        elif AWS_SNS_CONFIG["fallback_to_console"]:
+            channels.append(ConsoleChannel())
+        self.notifier = NotificationDispatcher(channels)
+
+    async def start(self):
+        """Start the acknowledge/resolve sweeps"""
+        if not self.running:
+            self.running = True
+            asyncio.create_task(self._maintain())
+
+    async def stop(self):
+        """Stop the acknowledge/resolve sweeps and flush pending notifications"""
+        self.running = False
+        if self.enricher:
+            await self.enricher.stop()
+        # Analyses that did not arrive in time are not waited for any longer
+        for alert_id in list(self._awaiting_analysis):
+            self._deliver(alert_id)
+        await self.notifier.stop()
+
+    @staticmethod
+    def fingerprint(alert: Dict) -> tuple:
+        """Identity of the condition an alert reports"""
+        return (alert.get("service"), alert.get("endpoint"), alert.get("rule") or alert["title"])
+
+    async def create_alert(self, alert: Dict) -> str:
+        """Report a breached condition and return the id of the alert that tracks it"""
+        now = alert.setdefault("timestamp", datetime.utcnow())
+        key = self.fingerprint(alert)
+        state = self.incidents.get(key)
+
+        if state is not None and state["status"] != "resolved":
+            self._seen(state, now)
+            if SEVERITY_RANK.get(alert["severity"], 0) > SEVERITY_RANK.get(state["alert"]["severity"], 0):
+                await self._update(state, {
+                    "severity": alert["severity"],
+                    "title": alert["title"],
+                    "message": alert["message"],
+                    "metrics": alert.get("metrics"),
+                    "last_seen": now
+                })
+                await self._notify(state)
+            return state["id"]
+
+        if state is not None and now - state["resolved_at"] < self.cooldown:
+            # Fired again soon after resolving: reopen rather than start a new incident
+            reopens = state["alert"]["reopens"] + 1
+            flapping = reopens >= ALERT_SETTINGS["flap_threshold"]
+            state.update(status="new", opened_at=now, clear_since=None, resolved_at=None)
+            await self._update(state, {
+                "status": "new",
+                "severity": alert["severity"],
+                "title": alert["title"],
+                "message": alert["message"],
+                "metrics": alert.get("metrics"),
+                "occurrences": state["alert"]["occurrences"] + 1,
+                "last_seen": now,
+                "reopens": reopens,
+                "flapping": flapping
+            })
+            if not flapping:
+                await self._notify(state)
+            return state["id"]
 
-    async def add_alert(self, title: str, message: str, severity: str = "info") -> None:
-        """Add a new alert with optional AI analysis"""
-        alert = {
-            "timestamp": datetime.utcnow(),
+        alert.update(first_seen=now, last_seen=now, occurrences=1, reopens=0, flapping=False)
+        alert_id = await self.db.store_alert(alert)
+        if state is not None:
+            del self.fingerprints[state["id"]]
+        state = {
+            "id": alert_id,
+            "alert": alert,
+            "status": "new",
+            "opened_at": now,
+            "clear_since": None,
+            "resolved_at": None,
+            "dirty": False
+        }
+        self.incidents[key] = state
+        self.fingerprints[alert_id] = key
+        await self._notify(state)
+        return alert_id
+
+    def touch(self, key: tuple) -> bool:
+        """The condition of an open alert still holds; False when no open alert tracks it
+
+        The condition must then be reported again with create_alert, which
+        reopens an alert resolved (e.g. by hand) within the cooldown.
+        """
+        state = self.incidents.get(key)
+        if state is None or state["status"] == "resolved":
+            return False
+        self._seen(state, datetime.utcnow())
+        return True
+
+    def clear(self, key: tuple):
+        """The condition of an alert no longer holds; it resolves after resolve_after"""
+        state = self.incidents.get(key)
+        if state is not None and state["status"] != "resolved" and state["clear_since"] is None:
+            state["clear_since"] = datetime.utcnow()
+
+    async def update_status(self, alert_id: str, status: str):
+        """Acknowledge or resolve an alert by hand"""
+        await self.db.update_alert_status(alert_id, status)
+        key = self.fingerprints.get(alert_id)
+        if key is not None:
+            state = self.incidents[key]
+            state["alert"]["status"] = status
+            state["status"] = status
+            if status == "resolved":
+                state["resolved_at"] = datetime.utcnow()
+        self.events.publish({"type": "status", "alert_id": alert_id, "status": status})
+
+    async def send_alert(self, title: str, message: str, severity: str = "info", service: str = None) -> str:
+        """Report a condition that has no rule of its own"""
+        return await self.create_alert({
+            "service": service,
             "title": title,
             "message": message,
-            "severity": severity
-        }
-        
-        # Add AI analysis if enabled
-        if self.ai_analyzer:
-            analysis = await self.ai_analyzer.analyze_metrics(
-                self._get_current_metrics(),
-                self.alerts[-5:] if self.alerts else []
-            )
-            alert["ai_analysis"] = analysis
-        
-        self.alerts.append(alert)
-        
-        # Notify via SNS if enabled and alert is warning or higher
-        if self.sns_client and severity in ["warning", "danger"]:
-            await self._send_sns_notification(alert)
+            "severity": severity,
+            "timestamp": datetime.utcnow()
+        })
 
     async def get_recent_alerts(self, hours: int = 24) -> List[Dict]:
-        """Get recent alerts with AI insights"""
-        cutoff_time = datetime.utcnow() - timedelta(hours=hours)
-        recent_alerts = [
-            alert for alert in self.alerts 
-            if alert["timestamp"] >= cutoff_time
-        ]
+        """Get recent alerts with the latest AI insights
+
+        Insights are refreshed in the background; until the first refresh
+        finishes they are "pending", and the result is pushed as an event.
+        """
+        recent_alerts = await self.db.get_alerts_seen_since(datetime.utcnow() - timedelta(hours=hours))
         
         # Add AI analysis for the overall alert state if enabled
         if self.ai_analyzer and recent_alerts:
-            analysis = await self.ai_analyzer.analyze_metrics(
-                self._get_current_metrics(),
-                recent_alerts
-            )
+            if self._insights_task is None or self._insights_task.done():
+                self._insights_task = asyncio.create_task(self._refresh_insights(recent_alerts))
             
             # Add AI insights to the response
             return {
                 "alerts": recent_alerts,
-                "ai_insights": {
-                    "analysis": analysis["analysis"],
-                    "recommendations": analysis["recommendations"],
-                    "severity": analysis["severity"]
-                }
+                "ai_insights": self.insights or "pending"
             }
         
         return {"alerts": recent_alerts}
 
+    async def _refresh_insights(self, alerts: List[Dict]):
+        analysis = await self.ai_analyzer.analyze_metrics(self._get_current_metrics(), alerts)
+        self.insights = {
+            "analysis": analysis["analysis"],
+            "recommendations": analysis["recommendations"],
+            "severity": analysis["severity"]
+        }
+        self.events.publish({"type": "insights", "ai_insights": self.insights})
+
+    async def maintain(self, now: datetime = None):
+        """Persist counters of open alerts, apply auto-acknowledge and auto-resolve, archive old alerts"""
+        now = now or datetime.utcnow()
+        acknowledge_after = timedelta(minutes=ALERT_SETTINGS["auto_acknowledge"])
+        resolve_before = now - timedelta(hours=ALERT_SETTINGS["auto_resolve"])
+        for key, state in list(self.incidents.items()):
+            if state["status"] == "resolved":
+                # Past the cooldown a new report opens a new alert
+                if now - state["resolved_at"] >= self.cooldown:
+                    del self.incidents[key]
+                    del self.fingerprints[state["id"]]
+                continue
+
+            fields = {}
+            if state["dirty"]:
+                fields["occurrences"] = state["alert"]["occurrences"]
+                fields["last_seen"] = state["alert"]["last_seen"]
+                state["dirty"] = False
+            if ((state["clear_since"] is not None and now - state["clear_since"] >= self.resolve_after)
+                    or state["alert"]["last_seen"] < resolve_before):
+                fields.update(status="resolved", resolved_at=now, auto_resolved=True)
+                state.update(status="resolved", resolved_at=now)
+            elif state["status"] == "new" and now - state["opened_at"] >= acknowledge_after:
+                fields.update(status="acknowledged", auto_acknowledged=True)
+                state["status"] = "acknowledged"
+            if fields:
+                await self._update(state, fields)
+                if "status" in fields:
+                    self.events.publish({"type": "status", "alert_id": state["id"], "status": fields["status"]})
+
+        await self.db.archive_alerts(now - timedelta(days=ALERT_SETTINGS["archive_after"]))
+
+    async def _maintain(self):
+        while self.running:
+            await asyncio.sleep(ALERT_SETTINGS["maintenance_interval"])
+            try:
+                await self.maintain()
+            except Exception as e:
+                print(f"Error maintaining alerts: {e}")
+
+    def _seen(self, state: Dict, now: datetime):
+        state["alert"]["occurrences"] += 1
+        state["alert"]["last_seen"] = now
+        state["clear_since"] = None
+        state["dirty"] = True
+
+    async def _update(self, state: Dict, fields: Dict):
+        state["alert"].update(fields)
+        await self.db.update_alert(state["id"], fields)
+
+    async def _notify(self, state: Dict):
+        """Queue AI analysis if enabled, publish the alert and queue warnings and above for delivery
+
+        With AI analysis enabled, delivery waits for the alert's analysis (up
+        to AI_ENRICHMENT["notify_wait"] seconds) so the message can include it.
+        """
+        alert = state["alert"]
+        if self.enricher:
+            await self._update(state, {"ai_analysis": "pending"})
+        self.events.publish({"type": "alert", "alert": alert})
+
+        if SEVERITY_RANK.get(alert["severity"], 0) >= SEVERITY_RANK["warning"]:
+            if not self.enricher:
+                self.notifier.submit(alert)
+            elif state["id"] not in self._awaiting_analysis:
+                # A notification already held for this alert goes out with its latest state
+                timeout = asyncio.get_running_loop().call_later(AI_ENRICHMENT["notify_wait"], self._deliver, state["id"])
+                self._awaiting_analysis[state["id"]] = (alert, timeout)
+        if self.enricher:
+            self.enricher.submit(alert)
+
+    def _deliver(self, alert_id: str):
+        """Queue a held notification for delivery, with whatever analysis it has by now"""
+        held = self._awaiting_analysis.pop(alert_id, None)
+        if held is not None:
+            alert, timeout = held
+            timeout.cancel()
+            self.notifier.submit(alert)
+
+    async def _attach_analysis(self, alert: Dict, analysis: Dict):
+        alert["ai_analysis"] = analysis
+        await self.db.update_alert(alert["_id"], {"ai_analysis": analysis})
+        self.events.publish({"type": "analysis", "alert_id": alert["_id"], "ai_analysis": analysis})
+        self._deliver(alert["_id"])
+
     def _get_current_metrics(self) -> Dict:
         """Get current system metrics for AI analysis"""
         # This would be replaced with actual metric collection
@@ -81,36 +308,3 @@ class AlertManager:
             "error_rates": [1.5, 2.0, 2.5],     # Example values
             "request_rate": 100                  # Example value
         }
-
-    async def _send_sns_notification(self, alert: Dict) -> None:
-        """Send alert notification via AWS SNS"""
-        if not self.sns_client:
-            return
-        
-        try:
-            message = f"""
-Alert: {alert['title']}
-Severity: {alert['severity']}
-Message: {alert['message']}
-Timestamp: {alert['timestamp']}
-"""
-            
-            # Add AI analysis if available
-            if "ai_analysis" in alert:
-                message += f"""
-AI Analysis:
-{alert['ai_analysis']['analysis']}
-
-Recommendations:
-{chr(10).join('- ' + r for r in alert['ai_analysis']['recommendations'])}
-"""
-            
-            await asyncio.to_thread(
-                self.sns_client.publish,
-                TopicArn=AWS_SNS_CONFIG["topic_arn"],
-                Subject=f"API Alert: {alert['title']}",
-                Message=message
-            )
-        
-        except Exception as e:
-            print(f"Failed to send SNS notification: {e}")
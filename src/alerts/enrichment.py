@@ -0,0 +1,82 @@
+"""
+Background AI analysis of alerts, several alerts per prompt
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, List
+from src.config.settings import AI_ENRICHMENT
+
+
+class AnalysisEnricher:
+    """Analyzes queued alerts off the alerting path and hands each result to on_analysis
+
+    A worker takes the first queued alert, then waits up to batch_window
+    seconds for more (at most batch_size), and analyzes them with one call to
+    analyzer.analyze_alerts. Alerts that do not fit in the queue get a
+    rule-based analysis right away instead.
+    """
+
+    def __init__(self, analyzer, on_analysis: Callable[[Dict, Dict], Awaitable[None]],
+                 queue_size: int = None, workers: int = None):
+        self.analyzer = analyzer
+        self.on_analysis = on_analysis
+        self.queue_size = queue_size or AI_ENRICHMENT["queue_size"]
+        self.n_workers = workers or AI_ENRICHMENT["workers"]
+        self.queue = None
+        self.workers: List[asyncio.Task] = []
+        self.stats = {"queued": 0, "analyzed": 0, "batches": 0, "overflow": 0, "failed": 0}
+
+    def submit(self, alert: Dict) -> bool:
+        """Queue an alert for analysis; False if it got a rule-based analysis instead"""
+        if not self.workers:
+            self.queue = asyncio.Queue(self.queue_size)
+            self.workers = [asyncio.create_task(self._work()) for _ in range(self.n_workers)]
+        try:
+            self.queue.put_nowait(alert)
+            self.stats["queued"] += 1
+            return True
+        except asyncio.QueueFull:
+            self.stats["overflow"] += 1
+            analysis = self.analyzer.rule_based_analysis(alert.get("metrics") or {}, [alert])
+            asyncio.create_task(self.on_analysis(alert, analysis))
+            return False
+
+    async def stop(self, timeout: float = 5):
+        """Finish queued analyses (for up to timeout seconds), then stop the workers"""
+        if self.queue is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "queue_depth": self.queue.qsize() if self.queue is not None else 0}
+
+    async def _work(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + AI_ENRICHMENT["batch_window"]
+            while len(batch) < AI_ENRICHMENT["batch_size"]:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                analyses = await self.analyzer.analyze_alerts(batch)
+                self.stats["batches"] += 1
+                for alert, analysis in zip(batch, analyses):
+                    await self.on_analysis(alert, analysis)
+                self.stats["analyzed"] += len(batch)
+            except Exception as e:
+                self.stats["failed"] += len(batch)
+                print(f"Error analyzing alerts: {e}")
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
@@ -0,0 +1,34 @@
+"""
+Fan-out of alert changes to connected clients
+"""
+import asyncio
+from typing import Dict, List
+
+
+class AlertEvents:
+    """Each subscriber gets its own bounded queue of events
+
+    A subscriber that falls behind loses the events that do not fit rather
+    than slowing down the publisher.
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self.subscribers: List[asyncio.Queue] = []
+        self.dropped = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        if queue in self.subscribers:
+            self.subscribers.remove(queue)
+
+    def publish(self, event: Dict):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
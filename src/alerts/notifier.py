@@ -0,0 +1,187 @@
+"""
+Alert notification delivery off the detection path: bounded queues, rate limits, digests and retries
+"""
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from src.config.settings import NOTIFICATIONS
+
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SNSChannel:
+    """Publishes to an SNS topic from a dedicated, bounded thread pool"""
+
+    name = "sns"
+
+    def __init__(self, client, topic_arn: str, threads: int = None):
+        self.client = client
+        self.topic_arn = topic_arn
+        self.executor = ThreadPoolExecutor(threads or NOTIFICATIONS["publish_threads"], thread_name_prefix="sns")
+
+    async def send(self, alerts: List[Dict]):
+        subject, message = format_notification(alerts)
+        await asyncio.get_running_loop().run_in_executor(
+            self.executor,
+            lambda: self.client.publish(TopicArn=self.topic_arn, Subject=subject[:100], Message=message)
+        )
+
+
+class ConsoleChannel:
+    """Prints notifications when no SNS topic is configured"""
+
+    name = "console"
+
+    async def send(self, alerts: List[Dict]):
+        subject, message = format_notification(alerts)
+        print(f"{subject}\n{message}")
+
+
+def format_notification(alerts: List[Dict]) -> tuple:
+    """Subject and body for one alert, or a digest of several"""
+    if len(alerts) == 1:
+        alert = alerts[0]
+        return f"API Alert: {alert['title']}", _format_alert(alert)
+    critical = sum(1 for alert in alerts if alert["severity"] == "critical")
+    subject = f"API Alerts: {len(alerts)} alerts ({critical} critical)"
+    return subject, "\n".join(_format_alert(alert) for alert in alerts)
+
+
+def _format_alert(alert: Dict) -> str:
+    message = f"""
+Alert: {alert['title']}
+Severity: {alert['severity']}
+Message: {alert['message']}
+Timestamp: {alert['timestamp']}
+"""
+    # Add AI analysis if available
+    analysis = alert.get("ai_analysis")
+    if isinstance(analysis, dict) and analysis.get("analysis"):
+        message += f"""
+AI Analysis:
+{analysis['analysis']}
+
+Recommendations:
+{chr(10).join('- ' + r for r in analysis.get('recommendations', []))}
+"""
+    return message
+
+
+class NotificationDispatcher:
+    """Delivers alerts to channels in the background
+
+    Each channel has a bounded queue drained by its own workers. A worker
+    takes every alert already queued (up to digest_max) as one message, and
+    waits for the channel's token bucket before sending, so during an alert
+    storm the queued alerts coalesce into digests instead of piling up
+    behind the rate limit. Failed sends are retried with jittered backoff.
+    submit never waits; alerts that do not fit in a full queue are dropped
+    and counted.
+    """
+
+    def __init__(self, channels: List, queue_size: int = None, workers: int = None):
+        self.channels = channels
+        self.queue_size = queue_size or NOTIFICATIONS["queue_size"]
+        self.n_workers = workers or NOTIFICATIONS["workers"]
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.workers: List[asyncio.Task] = []
+        self.stats = {"queued": 0, "sent": 0, "delivered": 0, "digests": 0, "retried": 0, "failed": 0, "dropped": 0}
+
+    def submit(self, alert: Dict) -> bool:
+        """Queue an alert for every channel; False if any queue was full"""
+        self._start()
+        accepted = True
+        for channel in self.channels:
+            try:
+                self.queues[channel.name].put_nowait(alert)
+                self.stats["queued"] += 1
+            except asyncio.QueueFull:
+                self.stats["dropped"] += 1
+                accepted = False
+        return accepted
+
+    def _start(self):
+        if self.workers:
+            return
+        for channel in self.channels:
+            limits = NOTIFICATIONS["rate_limits"].get(channel.name, NOTIFICATIONS["rate_limits"]["default"])
+            self.queues[channel.name] = asyncio.Queue(self.queue_size)
+            self.buckets[channel.name] = TokenBucket(limits["rate"], limits["burst"])
+            for _ in range(self.n_workers):
+                self.workers.append(asyncio.create_task(self._work(channel)))
+
+    async def stop(self, timeout: float = 5):
+        """Deliver what is queued (for up to timeout seconds), then stop the workers"""
+        try:
+            await asyncio.wait_for(asyncio.gather(*(queue.join() for queue in self.queues.values())), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "queue_depth": {name: queue.qsize() for name, queue in self.queues.items()}}
+
+    async def _work(self, channel):
+        queue = self.queues[channel.name]
+        while True:
+            alerts = [await queue.get()]
+            taken = 1
+            try:
+                await self.buckets[channel.name].acquire()
+                # Everything that queued up while waiting for a token goes out together
+                while taken < NOTIFICATIONS["digest_max"] and not queue.empty():
+                    alert = queue.get_nowait()
+                    taken += 1
+                    # A reopened or escalated alert may be queued more than once
+                    if not any(alert is queued for queued in alerts):
+                        alerts.append(alert)
+                await self._send(channel, alerts)
+            finally:
+                for _ in range(taken):
+                    queue.task_done()
+
+    async def _send(self, channel, alerts: List[Dict]):
+        attempt = 0
+        while True:
+            try:
+                await channel.send(alerts)
+                self.stats["sent"] += 1
+                self.stats["delivered"] += len(alerts)
+                if len(alerts) > 1:
+                    self.stats["digests"] += 1
+                return
+            except Exception as e:
+                attempt += 1
+                if attempt > NOTIFICATIONS["max_retries"]:
+                    self.stats["failed"] += len(alerts)
+                    print(f"Failed to send {channel.name} notification: {e}")
+                    return
+                self.stats["retried"] += 1
+                # Exponential backoff with full jitter
+                delay = min(NOTIFICATIONS["retry_max_delay"], NOTIFICATIONS["retry_base_delay"] * 2 ** attempt)
+                await asyncio.sleep(random.uniform(0, delay))
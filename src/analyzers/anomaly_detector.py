@@ -2,115 +2,281 @@ import asyncio
 import numpy as np
 from datetime import datetime, timedelta
 from typing import Dict, List
-from src.storage.database import Database
+from src.analyzers.baselines import BaselineMonitor
+from src.analyzers.streaming_stats import SlidingWindowStats
+from src.config.settings import ALERT_THRESHOLDS, STREAMING_DETECTION, LATENCY_ALERT_RULES
+from src.storage.columnar import to_epoch_ns
+from src.storage.database import Database, get_database
+from src.storage.sketch import quantiles_many
 from src.alerts.alert_manager import AlertManager
 
+# Latency percentiles recorded in every alert's metric summary
+SUMMARY_QUANTILES = [0.5, 0.95, 0.99]
+
 class AnomalyDetector:
-    def __init__(self):
-        self.db = Database()
-        self.alert_manager = AlertManager()
+    def __init__(self, db: Database = None, alert_manager: AlertManager = None):
+        self.db = db or get_database()
+        self.alert_manager = alert_manager or AlertManager(self.db)
         self.running = False
+        self.window = SlidingWindowStats(STREAMING_DETECTION["window"], STREAMING_DETECTION["slot_seconds"])
+        self._updated = asyncio.Event()
+        self._breaches: Dict[tuple, str] = {}
+        self._started = datetime.utcnow()
+        # Window statistics of the current evaluation, shared by every alert it raises
+        self._snapshot = {"start": None, "end": None, "rows": {}}
         
-        # Define thresholds for different metrics
-        self.thresholds = {
-            "response_time": {
-                "critical": 1000,  # ms
-                "warning": 500     # ms
-            },
-            "error_rate": {
-                "critical": 0.1,   # 10%
-                "warning": 0.05    # 5%
-            },
-            "request_rate": {
-                "min": 1,         # requests per minute
-                "max": 1000       # requests per minute
-            }
-        }
+        # Static ceilings; adaptive baselines judge each series against its own history
+        self.thresholds = ALERT_THRESHOLDS
+        self.baselines = BaselineMonitor()
 
     async def start(self):
         """Start the anomaly detection process"""
         self.running = True
+        await self.baselines.backfill(self.db)
+        await self.alert_manager.start()
+        self.db.subscribe(self._on_logs)
         asyncio.create_task(self._detect_anomalies())
 
     async def stop(self):
         """Stop the anomaly detection process"""
         self.running = False
 
+    def _on_logs(self, batch: Dict[str, np.ndarray]):
+        """Fold newly stored logs into the sliding windows"""
+        self.window.add(batch["service"], batch["endpoint"], batch["timestamp"],
+                        batch["response_time"], batch["error"])
+        self.baselines.add(batch)
+        if not self._updated.is_set():
+            self._updated.set()
+
     async def _detect_anomalies(self):
-        """Main anomaly detection loop"""
+        """Check thresholds after new logs arrive, at most once per evaluation interval"""
+        interval = STREAMING_DETECTION["evaluation_interval"]
+        self._started = datetime.utcnow()
         while self.running:
             try:
-                metrics = await self.db.get_recent_metrics()
-                await self._analyze_metrics(metrics)
+                # Also wake up without traffic so idle services are noticed
+                await asyncio.wait_for(self._updated.wait(), STREAMING_DETECTION["slot_seconds"])
+            except asyncio.TimeoutError:
+                pass
+            self._updated.clear()
+            try:
+                now = datetime.utcnow()
+                self.window.advance(to_epoch_ns(now))
+                await self._analyze_window()
+                for result in self.baselines.close_buckets(now):
+                    await self._analyze_baselines(result)
             except Exception as e:
                 print(f"Error in anomaly detection: {e}")
-            await asyncio.sleep(10)  # Check every 10 seconds
-
-    async def _analyze_metrics(self, metrics: Dict):
-        """Analyze metrics for anomalies"""
-        for service, service_metrics in metrics.items():
-            # Analyze response times
-            if service_metrics["response_times"]:
-                avg_response_time = np.mean(service_metrics["response_times"])
-                if avg_response_time > self.thresholds["response_time"]["critical"]:
-                    await self._create_alert(
-                        service,
-                        "Critical: High Response Time",
-                        f"Average response time ({avg_response_time:.2f}ms) exceeds critical threshold",
-                        "critical"
-                    )
-                elif avg_response_time > self.thresholds["response_time"]["warning"]:
-                    await self._create_alert(
-                        service,
-                        "Warning: Elevated Response Time",
-                        f"Average response time ({avg_response_time:.2f}ms) exceeds warning threshold",
-                        "warning"
-                    )
+            if interval:
+                await asyncio.sleep(interval)
 
-            # Analyze error rates
-            if service_metrics["error_rates"]:
-                error_rate = sum(service_metrics["error_rates"]) / len(service_metrics["error_rates"])
-                if error_rate > self.thresholds["error_rate"]["critical"]:
-                    await self._create_alert(
-                        service,
-                        "Critical: High Error Rate",
-                        f"Error rate ({error_rate:.2%}) exceeds critical threshold",
-                        "critical"
-                    )
-                elif error_rate > self.thresholds["error_rate"]["warning"]:
-                    await self._create_alert(
-                        service,
-                        "Warning: Elevated Error Rate",
-                        f"Error rate ({error_rate:.2%}) exceeds warning threshold",
-                        "warning"
-                    )
+    async def _analyze_window(self):
+        """Evaluate thresholds on the sliding window statistics"""
+        dictionaries = self.db.backend.dictionaries
+        services = dictionaries["service"].values
+        endpoints = dictionaries["endpoint"].values
+        min_requests = STREAMING_DETECTION["min_requests"]
+        # Request rates are only meaningful once a full window has been observed
+        check_rates = (datetime.utcnow() - self._started).total_seconds() >= self.window.window_seconds
 
-            # Analyze request rates
-            if service_metrics["request_rates"]:
-                request_rate = len(service_metrics["request_rates"]) / 5  # per minute
-                if request_rate > self.thresholds["request_rate"]["max"]:
-                    await self._create_alert(
-                        service,
-                        "Warning: High Request Rate",
-                        f"Request rate ({request_rate:.2f}/min) exceeds maximum threshold",
-                        "warning"
-                    )
-                elif request_rate < self.thresholds["request_rate"]["min"]:
+        qs = [rule["percentile"] / 100 for rule in LATENCY_ALERT_RULES]
+        n_rules = len(qs)
+        end = datetime.utcnow()
+        rows = {}
+        self._snapshot = {"start": end - timedelta(seconds=self.window.window_seconds), "end": end, "rows": rows}
+
+        stats = self.window.snapshot(by_service=True)
+        percentiles = quantiles_many(stats["sketch"], qs + SUMMARY_QUANTILES)
+        for i, service_id in enumerate(stats["keys"].tolist()):
+            service = services[service_id]
+            rows[(service, None)] = (stats, percentiles, i)
+            if stats["count"][i] >= min_requests:
+                await self._check_response_time(service, None, stats["mean"][i])
+                await self._check_latency_percentiles(service, None, percentiles[i, :n_rules])
+                await self._check_error_rate(service, None, stats["error_ratio"][i])
+            if check_rates:
+                await self._check_request_rate(service, stats["rate"][i] * 60)
+
+        stats = self.window.snapshot()
+        percentiles = quantiles_many(stats["sketch"], qs + SUMMARY_QUANTILES)
+        for i, (service_id, endpoint_id) in enumerate(stats["keys"].tolist()):
+            service, endpoint = services[service_id], endpoints[endpoint_id]
+            rows[(service, endpoint)] = (stats, percentiles, i)
+            if stats["count"][i] >= min_requests:
+                await self._check_response_time(service, endpoint, stats["mean"][i])
+                await self._check_latency_percentiles(service, endpoint, percentiles[i, :n_rules])
+                await self._check_error_rate(service, endpoint, stats["error_ratio"][i])
+
+    async def _analyze_baselines(self, result: Dict):
+        """Alert on series that deviate from their learnt baselines in a closed bucket"""
+        dictionaries = self.db.backend.dictionaries
+        services = dictionaries["service"].values
+        endpoints = dictionaries["endpoint"].values
+        labels = {
+            "response_time": ("Response Time Anomaly", "average response time", "{:.2f}ms"),
+            "error_rate": ("Error Rate Anomaly", "error rate", "{:.2%}"),
+            "request_rate": ("Request Rate Anomaly", "request rate", "{:.1f}/min")
+        }
+        for metric, (title, label, unit) in labels.items():
+            scores = result[metric]
+            for i, (service_id, endpoint_id) in enumerate(result["keys"]):
+                severity = scores["severity"][i]
+                service, endpoint = services[service_id], endpoints[endpoint_id]
+                key = (service, endpoint, f"baseline_{metric}")
+                if self._breached(key, severity):
+                    scope = f"{endpoint} {label}" if endpoint else label.capitalize()
                     await self._create_alert(
-                        service,
-                        "Warning: Low Request Rate",
-                        f"Request rate ({request_rate:.2f}/min) below minimum threshold",
-                        "warning"
+                        key,
+                        f"{severity.capitalize()}: {title}",
+                        f"{scope} ({unit.format(scores['values'][i])}) deviates from its "
+                        f"{scores['detectors'][i]} baseline ({unit.format(scores['baseline'][i])}, "
+                        f"z={scores['z'][i]:.1f})",
+                        severity
                     )
 
-    async def _create_alert(self, service: str, title: str, message: str, severity: str):
-        """Create a new alert"""
+    async def _check_response_time(self, service: str, endpoint: str, avg_response_time: float):
+        severity = None
+        if avg_response_time > self.thresholds["response_time"]["critical"]:
+            severity = "critical"
+        elif avg_response_time > self.thresholds["response_time"]["warning"]:
+            severity = "warning"
+        key = (service, endpoint, "response_time")
+        if self._breached(key, severity):
+            scope = f"{endpoint} average" if endpoint else "Average"
+            if severity == "critical":
+                await self._create_alert(
+                    key,
+                    "Critical: High Response Time",
+                    f"{scope} response time ({avg_response_time:.2f}ms) exceeds critical threshold",
+                    "critical"
+                )
+            else:
+                await self._create_alert(
+                    key,
+                    "Warning: Elevated Response Time",
+                    f"{scope} response time ({avg_response_time:.2f}ms) exceeds warning threshold",
+                    "warning"
+                )
+
+    async def _check_latency_percentiles(self, service: str, endpoint: str, values: np.ndarray):
+        """values holds the window's latency percentile for each LATENCY_ALERT_RULES entry"""
+        breached = None
+        for rule, value in zip(LATENCY_ALERT_RULES, values.tolist()):
+            if value > rule["threshold"]:
+                breached = (rule, value)
+                break
+        severity = breached[0]["severity"] if breached else None
+        key = (service, endpoint, "latency_percentile")
+        if self._breached(key, severity):
+            rule, value = breached
+            scope = f"{endpoint} p{rule['percentile']}" if endpoint else f"p{rule['percentile']}"
+            await self._create_alert(
+                key,
+                f"{severity.capitalize()}: High p{rule['percentile']} Response Time",
+                f"{scope} response time ({value:.2f}ms) exceeds {rule['threshold']}ms",
+                severity
+            )
+
+    async def _check_error_rate(self, service: str, endpoint: str, error_rate: float):
+        severity = None
+        if error_rate > self.thresholds["error_rate"]["critical"]:
+            severity = "critical"
+        elif error_rate > self.thresholds["error_rate"]["warning"]:
+            severity = "warning"
+        key = (service, endpoint, "error_rate")
+        if self._breached(key, severity):
+            scope = f"{endpoint} error" if endpoint else "Error"
+            if severity == "critical":
+                await self._create_alert(
+                    key,
+                    "Critical: High Error Rate",
+                    f"{scope} rate ({error_rate:.2%}) exceeds critical threshold",
+                    "critical"
+                )
+            else:
+                await self._create_alert(
+                    key,
+                    "Warning: Elevated Error Rate",
+                    f"{scope} rate ({error_rate:.2%}) exceeds warning threshold",
+                    "warning"
+                )
+
+    async def _check_request_rate(self, service: str, request_rate: float):
+        """request_rate is per minute"""
+        severity = None
+        if request_rate > self.thresholds["request_rate"]["max"]:
+            severity = "high"
+        elif request_rate < self.thresholds["request_rate"]["min"]:
+            severity = "low"
+        key = (service, None, "request_rate")
+        if self._breached(key, severity):
+            if severity == "high":
+                await self._create_alert(
+                    key,
+                    "Warning: High Request Rate",
+                    f"Request rate ({request_rate:.2f}/min) exceeds maximum threshold",
+                    "warning"
+                )
+            else:
+                await self._create_alert(
+                    key,
+                    "Warning: Low Request Rate",
+                    f"Request rate ({request_rate:.2f}/min) below minimum threshold",
+                    "warning"
+                )
+
+    def _breached(self, key: tuple, severity: str) -> bool:
+        """Track the breach state of a (service, endpoint, rule) check; True when it enters a new breached state
+
+        A breach is reported once when it starts or changes severity. While it
+        holds, or once it clears, only the alert manager's state is updated;
+        a breach whose alert was resolved meanwhile (e.g. by hand) is reported
+        again.
+        """
+        previous = self._breaches.get(key)
+        if severity is None:
+            if self._breaches.pop(key, None) is not None:
+                self.alert_manager.clear(key)
+            return False
+        self._breaches[key] = severity
+        return severity != previous or not self.alert_manager.touch(key)
+
+    async def _create_alert(self, key: tuple, title: str, message: str, severity: str):
+        """Report a breached check to the alert manager"""
+        service, endpoint, rule = key
         alert = {
             "service": service,
+            "endpoint": endpoint,
+            "rule": rule,
             "title": title,
             "message": message,
             "severity": severity,
             "timestamp": datetime.utcnow(),
-            "metrics": await self.db.get_recent_metrics()
+            "metrics": self._metric_summary(service, endpoint)
         }
         await self.alert_manager.create_alert(alert)
+
+    def _metric_summary(self, service: str, endpoint: str = None) -> Dict:
+        """Fixed-size window statistics of a series for an alert
+
+        start/end point at the window, so sketches and per-bucket series can
+        be fetched later through /alerts/{id}/metrics.
+        """
+        summary = {"start": self._snapshot["start"], "end": self._snapshot["end"]}
+        row = self._snapshot["rows"].get((service, endpoint))
+        if row is None:
+            return summary
+        stats, percentiles, i = row
+        p50, p95, p99 = percentiles[i, -len(SUMMARY_QUANTILES):].tolist()
+        summary.update(
+            count=int(stats["count"][i]),
+            mean=float(stats["mean"][i]),
+            std=float(stats["std"][i]),
+            error_ratio=float(stats["error_ratio"][i]),
+            rate=float(stats["rate"][i]),
+            p50=p50,
+            p95=p95,
+            p99=p99
+        )
+        return summary
@@ -0,0 +1,399 @@
+"""
+Adaptive baselines (EWMA, MAD, hour-of-week) scored for all series at once
+"""
+import warnings
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+import numpy as np
+from src.config.settings import BASELINE_DETECTION, MONITORING
+from src.storage.columnar import EPOCH, to_epoch_ns
+
+NS = 1_000_000_000
+
+# Metrics derived from each closed bucket, and whether drops are anomalous too
+METRICS = {
+    "response_time": False,
+    "error_rate": False,
+    "request_rate": True
+}
+
+
+def _pad(array: np.ndarray, rows: int, fill) -> np.ndarray:
+    """Extend the first axis of array to rows, filling new rows with fill"""
+    if len(array) >= rows:
+        return array
+    padded = np.full((rows,) + array.shape[1:], fill, dtype=array.dtype)
+    padded[:len(array)] = array
+    return padded
+
+
+def _z_scores(values: np.ndarray, baseline: np.ndarray, spread: np.ndarray) -> np.ndarray:
+    """Deviation from baseline in units of spread, with spread floored relative to the baseline"""
+    spread = np.maximum(spread, BASELINE_DETECTION["min_spread_ratio"] * np.abs(baseline))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(spread > 0, (values - baseline) / spread, np.nan)
+
+
+class BaselineDetector(ABC):
+    """Learns a baseline per series and scores new bucket values against it
+
+    Every method works on all series at once: history is a [series, buckets]
+    matrix and values a [series] vector, with NaN where a series had too
+    little traffic to be measured.
+    """
+
+    def __init__(self):
+        self.n_series = 0
+
+    @abstractmethod
+    def resize(self, n_series: int):
+        """Make room for new series"""
+
+    @abstractmethod
+    def fit(self, history: np.ndarray, bucket_ids: np.ndarray):
+        """Learn baselines from past buckets (backfill)"""
+
+    @abstractmethod
+    def score(self, values: np.ndarray, bucket_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (z-scores, baseline values) of one bucket"""
+
+    @abstractmethod
+    def update(self, values: np.ndarray, bucket_id: int):
+        """Fold one bucket into the baselines"""
+
+    def _winsorize(self, values: np.ndarray, baseline: np.ndarray, z: np.ndarray) -> np.ndarray:
+        """Clip anomalous values so an incident does not drag the baseline along"""
+        limit = BASELINE_DETECTION["z_warning"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            outside = np.abs(z) > limit
+            # Move the value back to limit spreads from the baseline
+            clipped = np.where(outside, baseline + limit * (values - baseline) / np.abs(z), values)
+        return np.where(np.isnan(baseline), values, clipped)
+
+
+class EWMADetector(BaselineDetector):
+    """Exponentially weighted mean and variance (control bands)"""
+
+    def __init__(self, alpha: float = None):
+        super().__init__()
+        self.alpha = alpha or BASELINE_DETECTION["ewma_alpha"]
+        self.mean = np.full(0, np.nan)
+        self.var = np.zeros(0)
+
+    def resize(self, n_series: int):
+        self.mean = _pad(self.mean, n_series, np.nan)
+        self.var = _pad(self.var, n_series, 0.0)
+        self.n_series = n_series
+
+    def fit(self, history: np.ndarray, bucket_ids: np.ndarray):
+        # Sequential in time but vectorized across series
+        for column in range(history.shape[1]):
+            self.update(history[:, column], int(bucket_ids[column]))
+
+    def score(self, values: np.ndarray, bucket_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        return _z_scores(values, self.mean, np.sqrt(self.var)), self.mean.copy()
+
+    def update(self, values: np.ndarray, bucket_id: int):
+        z, baseline = self.score(values, bucket_id)
+        values = self._winsorize(values, baseline, z)
+        seen = ~np.isnan(values)
+        first = seen & np.isnan(self.mean)
+        self.mean[first] = values[first]
+        delta = np.where(seen & ~first, values - self.mean, 0.0)
+        self.mean += self.alpha * delta
+        self.var = np.where(seen & ~first, (1 - self.alpha) * (self.var + self.alpha * delta * delta), self.var)
+
+
+class MADDetector(BaselineDetector):
+    """Robust z-score against the median and median absolute deviation of recent buckets"""
+
+    def __init__(self, window: int = None):
+        super().__init__()
+        self.window = window or BASELINE_DETECTION["mad_window"]
+        self.values = np.full((0, self.window), np.nan)
+        self.position = 0
+
+    def resize(self, n_series: int):
+        self.values = _pad(self.values, n_series, np.nan)
+        self.n_series = n_series
+
+    def fit(self, history: np.ndarray, bucket_ids: np.ndarray):
+        recent = history[:, -self.window:]
+        self.values[:, :recent.shape[1]] = recent
+        self.position = recent.shape[1] % self.window
+
+    def score(self, values: np.ndarray, bucket_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        enough = (~np.isnan(self.values)).sum(axis=1) >= BASELINE_DETECTION["min_samples"]
+        # All-NaN rows (series without history yet) warn and yield NaN
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            median = np.nanmedian(self.values, axis=1)
+            mad = np.nanmedian(np.abs(self.values - median[:, np.newaxis]), axis=1)
+        median = np.where(enough, median, np.nan)
+        # 1.4826 * MAD estimates the standard deviation of normal data
+        return _z_scores(values, median, 1.4826 * mad), median
+
+    def update(self, values: np.ndarray, bucket_id: int):
+        self.values[:, self.position] = values
+        self.position = (self.position + 1) % self.window
+
+
+class SeasonalDetector(BaselineDetector):
+    """Mean and standard deviation per hour of the week"""
+
+    SLOTS = 168
+
+    def __init__(self):
+        super().__init__()
+        self.counts = np.zeros((0, self.SLOTS))
+        self.means = np.zeros((0, self.SLOTS))
+        self.m2 = np.zeros((0, self.SLOTS))
+
+    @staticmethod
+    def slot(bucket_ids, bucket_seconds: int = None):
+        """Hour of the week (Monday 00:00 UTC is 0) of bucket numbers"""
+        seconds = np.asarray(bucket_ids) * (bucket_seconds or BASELINE_DETECTION["bucket_seconds"])
+        # The epoch fell on a Thursday, 72 hours after Monday 00:00
+        return (seconds // 3600 + 72) % SeasonalDetector.SLOTS
+
+    def resize(self, n_series: int):
+        self.counts = _pad(self.counts, n_series, 0.0)
+        self.means = _pad(self.means, n_series, 0.0)
+        self.m2 = _pad(self.m2, n_series, 0.0)
+        self.n_series = n_series
+
+    def fit(self, history: np.ndarray, bucket_ids: np.ndarray):
+        # One weighted bincount per moment over (series, slot) cells
+        n_series = history.shape[0]
+        cells = (np.arange(n_series)[:, np.newaxis] * self.SLOTS + self.slot(bucket_ids)[np.newaxis, :]).ravel()
+        values = history.ravel()
+        seen = ~np.isnan(values)
+        size = n_series * self.SLOTS
+        counts = np.bincount(cells[seen], minlength=size)
+        sums = np.bincount(cells[seen], weights=values[seen], minlength=size)
+        squares = np.bincount(cells[seen], weights=values[seen] ** 2, minlength=size)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, 0.0)
+        self.counts[:n_series] = counts.reshape(n_series, self.SLOTS)
+        self.means[:n_series] = means.reshape(n_series, self.SLOTS)
+        self.m2[:n_series] = np.maximum(squares - counts * means * means, 0.0).reshape(n_series, self.SLOTS)
+
+    def score(self, values: np.ndarray, bucket_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        slot = int(self.slot(bucket_id))
+        counts = self.counts[:, slot]
+        enough = counts >= BASELINE_DETECTION["min_samples"]
+        mean = np.where(enough, self.means[:, slot], np.nan)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(np.where(counts > 1, self.m2[:, slot] / (counts - 1), 0.0))
+        return _z_scores(values, mean, std), mean
+
+    def update(self, values: np.ndarray, bucket_id: int):
+        z, baseline = self.score(values, bucket_id)
+        values = self._winsorize(values, baseline, z)
+        slot = int(self.slot(bucket_id))
+        seen = ~np.isnan(values)
+        # Welford's update, vectorized across series
+        counts = self.counts[:, slot] + seen
+        delta = np.where(seen, values - self.means[:, slot], 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = self.means[:, slot] + np.where(seen, delta / np.maximum(counts, 1), 0.0)
+        self.m2[:, slot] += np.where(seen, delta * (values - means), 0.0)
+        self.means[:, slot] = means
+        self.counts[:, slot] = counts
+
+
+# Detector implementations selectable in BASELINE_DETECTION["detectors"]
+DETECTORS = {
+    "ewma": EWMADetector,
+    "mad": MADDetector,
+    "seasonal": SeasonalDetector
+}
+
+
+class BaselineMonitor:
+    """Per-bucket metrics of every service and service/endpoint series, scored by baseline detectors
+
+    Series are keyed by encoded (service id, endpoint id); endpoint id 0 holds
+    the service as a whole. Logs are accumulated per bucket and a bucket is
+    scored once it is closed.
+    """
+
+    def __init__(self, detectors: List[str] = None, bucket_seconds: int = None):
+        self.bucket_seconds = bucket_seconds or BASELINE_DETECTION["bucket_seconds"]
+        self.bucket_ns = self.bucket_seconds * NS
+        self.rows: Dict[Tuple[int, int], int] = {}
+        self.keys: List[Tuple[int, int]] = []
+        names = detectors or BASELINE_DETECTION["detectors"]
+        self.detectors = {metric: {name: DETECTORS[name]() for name in names} for metric in METRICS}
+        # Open buckets: bucket number -> (counts, sums, errors) per series
+        self.open: Dict[int, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self.last_closed = None
+        self._sized = 0
+
+    def _series(self, services: np.ndarray, endpoints: np.ndarray) -> np.ndarray:
+        """Series row of each (service, endpoint) pair, adding rows for new pairs"""
+        pairs = (services.astype(np.int64) << 32) | endpoints.astype(np.int64)
+        unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+        rows = []
+        for pair in unique_pairs.tolist():
+            key = (pair >> 32, pair & 0xFFFFFFFF)
+            if key not in self.rows:
+                self.rows[key] = len(self.keys)
+                self.keys.append(key)
+            rows.append(self.rows[key])
+        if len(self.keys) > self._sized:
+            self._sized = len(self.keys)
+            for detectors in self.detectors.values():
+                for detector in detectors.values():
+                    detector.resize(self._sized)
+        return np.array(rows, dtype=np.int64)[inverse]
+
+    def _aggregate(self, batch: Dict[str, np.ndarray], columns: np.ndarray, n_buckets: int) -> Tuple[np.ndarray, ...]:
+        """Counts, latency sums and errors per [series, bucket] for both endpoint and service series
+
+        columns holds each log's bucket column, in [0, n_buckets).
+        """
+        services = np.concatenate((batch["service"], batch["service"]))
+        endpoints = np.concatenate((batch["endpoint"], np.zeros_like(batch["endpoint"])))
+        rows = self._series(services, endpoints)
+        buckets = np.tile(columns, 2)
+        cells = rows * n_buckets + buckets
+        size = len(self.keys) * n_buckets
+        shape = (len(self.keys), n_buckets)
+        counts = np.bincount(cells, minlength=size).reshape(shape)
+        sums = np.bincount(cells, weights=np.tile(batch["response_time"], 2), minlength=size).reshape(shape)
+        errors = np.bincount(cells, weights=np.tile(batch["error"], 2), minlength=size).reshape(shape)
+        return counts, sums, errors
+
+    def _values(self, counts: np.ndarray, sums: np.ndarray, errors: np.ndarray) -> Dict[str, np.ndarray]:
+        """Metric values from bucket aggregates, NaN where traffic was too low to judge"""
+        measured = counts >= BASELINE_DETECTION["min_requests"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return {
+                "response_time": np.where(measured, sums / counts, np.nan),
+                "error_rate": np.where(measured, errors / counts, np.nan),
+                "request_rate": counts * (60 / self.bucket_seconds)  # per minute
+            }
+
+    async def backfill(self, db, days: float = None):
+        """Fit every detector on the stored history, a day of logs at a time"""
+        days = BASELINE_DETECTION["backfill_days"] if days is None else days
+        end = datetime.utcnow()
+        current = to_epoch_ns(end) // self.bucket_ns
+        first_bucket = current - int(days * 86400 // self.bucket_seconds)
+        # The current bucket is still open and is carried over to live scoring
+        n_buckets = int(current - first_bucket + 1)
+        totals = None
+
+        day = EPOCH + timedelta(seconds=int(first_bucket) * self.bucket_seconds)
+        while day < end:
+            batch = await db.backend.scan_logs(
+                day, min(day + timedelta(days=1), end) - timedelta(microseconds=1),
+                ["timestamp", "service", "endpoint", "response_time", "error"]
+            )
+            day += timedelta(days=1)
+            if not len(batch["timestamp"]):
+                continue
+            aggregates = self._aggregate(batch, batch["timestamp"] // self.bucket_ns - first_bucket, n_buckets)
+            if totals is None:
+                totals = list(aggregates)
+            else:
+                # Series first seen today extend the matrices
+                totals = [_pad(total, len(self.keys), 0) + part for total, part in zip(totals, aggregates)]
+
+        self.last_closed = int(current - 1)
+        if totals is None:
+            return
+        self.open[int(current)] = tuple(total[:, -1].copy() for total in totals)
+        values = self._values(*(total[:, :-1] for total in totals))
+        bucket_ids = np.arange(first_bucket, current)
+        # Leading buckets before a series' first traffic are gaps, not zero traffic
+        started = np.cumsum(totals[0][:, :-1], axis=1) > 0
+        values["request_rate"] = np.where(started, values["request_rate"], np.nan)
+        for metric, detectors in self.detectors.items():
+            for detector in detectors.values():
+                detector.fit(values[metric], bucket_ids)
+
+    def add(self, batch: Dict[str, np.ndarray], now: datetime = None):
+        """Accumulate newly stored logs into their open buckets
+
+        Logs for buckets already scored are too late, and logs dated more than
+        max_clock_skew ahead of now cannot be real yet; both are dropped.
+        """
+        if not len(batch["timestamp"]):
+            return
+        buckets = batch["timestamp"] // self.bucket_ns
+        latest = (to_epoch_ns(now or datetime.utcnow()) + MONITORING["max_clock_skew"] * NS) // self.bucket_ns
+        keep = buckets <= latest
+        if self.last_closed is not None:
+            keep &= buckets > self.last_closed
+        if not keep.all():
+            batch = {name: column[keep] for name, column in batch.items()}
+            buckets = buckets[keep]
+            if not len(buckets):
+                return
+        # Aggregate over the buckets present only, however far apart they are
+        present, columns = np.unique(buckets, return_inverse=True)
+        counts, sums, errors = self._aggregate(batch, columns, len(present))
+        for offset, bucket in enumerate(present.tolist()):
+            current = self.open.get(bucket)
+            if current is None:
+                current = (np.zeros(0, np.int64), np.zeros(0), np.zeros(0))
+            current = tuple(_pad(array, len(self.keys), 0) for array in current)
+            current[0][:] += counts[:, offset]
+            current[1][:] += sums[:, offset]
+            current[2][:] += errors[:, offset]
+            self.open[bucket] = current
+
+    def close_buckets(self, now: datetime) -> List[Dict]:
+        """Score every bucket that ended before now, oldest first
+
+        Returns one result per closed bucket: {"bucket": start time, "keys": [...],
+        metric: {"z": [series], "baseline": [series], "values": [series],
+        "severity": [series of None/"warning"/"critical"], "detectors": [...]}}.
+        """
+        # Buckets stay open for one more bucket to let late logs arrive
+        closable = to_epoch_ns(now) // self.bucket_ns - 2
+        if self.last_closed is None:
+            self.last_closed = closable
+            return []
+        results = []
+        for bucket in range(self.last_closed + 1, closable + 1):
+            counts, sums, errors = self.open.pop(bucket, (np.zeros(0, np.int64), np.zeros(0), np.zeros(0)))
+            counts, sums, errors = (_pad(array, len(self.keys), 0) for array in (counts, sums, errors))
+            results.append(self._score(bucket, self._values(counts, sums, errors)))
+        self.last_closed = max(self.last_closed, closable)
+        return results
+
+    def _score(self, bucket: int, values: Dict[str, np.ndarray]) -> Dict:
+        result = {"bucket": EPOCH + timedelta(seconds=bucket * self.bucket_seconds), "keys": list(self.keys)}
+        for metric, two_sided in METRICS.items():
+            zs = []
+            baselines = []
+            for detector in self.detectors[metric].values():
+                z, baseline = detector.score(values[metric], bucket)
+                detector.update(values[metric], bucket)
+                zs.append(np.abs(z) if two_sided else z)
+                baselines.append(baseline)
+            zs = np.where(np.isnan(zs), -np.inf, np.array(zs))
+            columns = np.arange(zs.shape[1])
+            # Severity follows the deviation that enough of the ready detectors agree on
+            ready = np.isfinite(zs).sum(axis=0)
+            votes = np.clip(np.minimum(BASELINE_DETECTION["min_agreeing"], ready), 1, None)
+            z = -np.sort(-zs, axis=0)[votes - 1, columns]
+            z = np.where(np.isfinite(z), z, np.nan)
+            strongest = np.argmax(zs, axis=0)
+            baseline = np.array(baselines)[strongest, columns]
+            with np.errstate(invalid="ignore"):
+                severity = np.where(z > BASELINE_DETECTION["z_critical"], "critical",
+                                    np.where(z > BASELINE_DETECTION["z_warning"], "warning", ""))
+            names = list(self.detectors[metric])
+            result[metric] = {
+                "values": values[metric],
+                "z": z,
+                "baseline": baseline,
+                "severity": [s or None for s in severity.tolist()],
+                "detectors": [names[i] for i in strongest.tolist()]
+            }
+        return result
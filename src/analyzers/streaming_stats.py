@@ -0,0 +1,175 @@
+"""
+Sliding-window request statistics updated incrementally from the ingest stream
+"""
+import time
+from typing import Dict, Tuple
+import numpy as np
+from src.config.settings import MONITORING
+from src.storage.sketch import N_BINS, bin_indexes
+
+NS = 1_000_000_000
+
+
+class SlidingWindowStats:
+    """Per (service, endpoint) count, latency mean/variance/sketch and errors over the last window
+
+    Each key keeps a ring of time slots plus running totals. Adding events only
+    touches their slots and totals, and moving the window forward subtracts the
+    slots that fall out, so the cost per event does not depend on the window.
+    """
+
+    def __init__(self, window_seconds: float, slot_seconds: float = 1):
+        self.slot_ns = int(slot_seconds * NS)
+        self.n_slots = max(1, int(round(window_seconds / slot_seconds)))
+        self.window_seconds = self.n_slots * self.slot_ns / NS
+        # Newest absolute slot number covered by the window
+        self.head = None
+
+        self.rows: Dict[Tuple[int, int], int] = {}
+        capacity = 16
+        self.keys = np.zeros((capacity, 2), dtype=np.int64)
+        self.counts = np.zeros((capacity, self.n_slots), dtype=np.int64)
+        self.errors = np.zeros((capacity, self.n_slots), dtype=np.int64)
+        self.sums = np.zeros((capacity, self.n_slots), dtype=np.float64)
+        self.squares = np.zeros((capacity, self.n_slots), dtype=np.float64)
+        self.sketches = np.zeros((capacity, self.n_slots, N_BINS), dtype=np.uint32)
+        self.total_counts = np.zeros(capacity, dtype=np.int64)
+        self.total_errors = np.zeros(capacity, dtype=np.int64)
+        self.total_sums = np.zeros(capacity, dtype=np.float64)
+        self.total_squares = np.zeros(capacity, dtype=np.float64)
+        self.total_sketches = np.zeros((capacity, N_BINS), dtype=np.int64)
+
+    def _grow(self):
+        """Double the number of rows"""
+        for name in ("keys", "counts", "errors", "sums", "squares", "sketches",
+                     "total_counts", "total_errors", "total_sums", "total_squares", "total_sketches"):
+            array = getattr(self, name)
+            grown = np.zeros((2 * len(array),) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _row(self, service: int, endpoint: int) -> int:
+        row = self.rows.get((service, endpoint))
+        if row is None:
+            row = len(self.rows)
+            if row == len(self.total_counts):
+                self._grow()
+            self.rows[(service, endpoint)] = row
+            self.keys[row] = (service, endpoint)
+        return row
+
+    def advance(self, now_ns: int):
+        """Move the window so it ends at now_ns, expiring older slots"""
+        head = now_ns // self.slot_ns
+        if self.head is None:
+            self.head = head
+            return
+        if head <= self.head:
+            return
+        if head - self.head >= self.n_slots:
+            expired = np.arange(self.n_slots)
+        else:
+            expired = np.arange(self.head + 1, head + 1) % self.n_slots
+        self.total_counts -= self.counts[:, expired].sum(axis=1)
+        self.total_errors -= self.errors[:, expired].sum(axis=1)
+        self.total_sums -= self.sums[:, expired].sum(axis=1)
+        self.total_squares -= self.squares[:, expired].sum(axis=1)
+        self.total_sketches -= self.sketches[:, expired].sum(axis=1, dtype=np.int64)
+        self.counts[:, expired] = 0
+        self.errors[:, expired] = 0
+        self.sums[:, expired] = 0
+        self.squares[:, expired] = 0
+        self.sketches[:, expired] = 0
+        self.head = head
+
+    def add(self, services: np.ndarray, endpoints: np.ndarray, timestamps: np.ndarray,
+            response_times: np.ndarray, errors: np.ndarray, now_ns: int = None):
+        """Fold a batch of events (encoded ids, epoch ns) into the window
+
+        The window only moves with the clock (now_ns, default the current
+        time), never with event timestamps. Events older than the window are
+        ignored, events up to max_clock_skew ahead of now count in the newest
+        slot, and events further ahead are dropped.
+        """
+        if not len(timestamps):
+            return
+        self.advance(time.time_ns() if now_ns is None else now_ns)
+        slots = timestamps // self.slot_ns
+        latest = self.head + MONITORING["max_clock_skew"] * NS // self.slot_ns
+        keep = (slots > self.head - self.n_slots) & (slots <= latest)
+        slots = np.minimum(slots, self.head)
+        if not keep.all():
+            services, endpoints, slots = services[keep], endpoints[keep], slots[keep]
+            response_times, errors = response_times[keep], errors[keep]
+            if not len(slots):
+                return
+
+        pairs = (services.astype(np.int64) << 32) | endpoints.astype(np.int64)
+        unique_pairs, inverse = np.unique(pairs, return_inverse=True)
+        rows = np.array([self._row(int(p >> 32), int(p & 0xFFFFFFFF)) for p in unique_pairs])[inverse]
+
+        # Aggregate over the (row, slot) cells the batch touches only
+        cells = rows * self.n_slots + slots % self.n_slots
+        touched, inverse = np.unique(cells, return_inverse=True)
+        values = response_times.astype(np.float64)
+        counts = np.bincount(inverse)
+        error_counts = np.bincount(inverse, weights=errors).astype(np.int64)
+        sums = np.bincount(inverse, weights=values)
+        squares = np.bincount(inverse, weights=values * values)
+
+        # Touched cells are distinct; their rows are not
+        self.counts.reshape(-1)[touched] += counts
+        self.errors.reshape(-1)[touched] += error_counts
+        self.sums.reshape(-1)[touched] += sums
+        self.squares.reshape(-1)[touched] += squares
+        touched_rows = touched // self.n_slots
+        np.add.at(self.total_counts, touched_rows, counts)
+        np.add.at(self.total_errors, touched_rows, error_counts)
+        np.add.at(self.total_sums, touched_rows, sums)
+        np.add.at(self.total_squares, touched_rows, squares)
+
+        # Only the touched sketch cells are updated
+        sketch_cells, sketch_counts = np.unique(cells * N_BINS + bin_indexes(values), return_counts=True)
+        self.sketches.reshape(-1)[sketch_cells] += sketch_counts.astype(np.uint32)
+        np.add.at(self.total_sketches.reshape(-1), sketch_cells // (self.n_slots * N_BINS) * N_BINS
+                  + sketch_cells % N_BINS, sketch_counts)
+
+    def snapshot(self, by_service: bool = False) -> Dict[str, np.ndarray]:
+        """Window statistics per (service, endpoint) row, or summed per service
+
+        Returns keys (service ids, plus endpoint ids unless by_service) and
+        count, mean, std, error_ratio, rate (requests per second) and sketch
+        (latency bin counts) arrays.
+        """
+        n = len(self.rows)
+        counts = self.total_counts[:n]
+        errors = self.total_errors[:n]
+        sums = self.total_sums[:n]
+        squares = self.total_squares[:n]
+        keys = self.keys[:n]
+        sketches = self.total_sketches[:n]
+        if by_service:
+            services, inverse = np.unique(keys[:, 0], return_inverse=True)
+            counts = np.bincount(inverse, weights=counts, minlength=len(services))
+            errors = np.bincount(inverse, weights=errors, minlength=len(services))
+            sums = np.bincount(inverse, weights=sums, minlength=len(services))
+            squares = np.bincount(inverse, weights=squares, minlength=len(services))
+            service_sketches = np.zeros((len(services), N_BINS), dtype=np.int64)
+            np.add.at(service_sketches, inverse, sketches)
+            sketches = service_sketches
+            keys = services
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(counts > 0, sums / counts, 0.0)
+            # Running totals can drift slightly below zero variance
+            variance = np.maximum(np.where(counts > 0, squares / counts, 0.0) - mean * mean, 0.0)
+            error_ratio = np.where(counts > 0, errors / counts, 0.0)
+        return {
+            "keys": keys,
+            "count": counts.astype(np.int64),
+            "mean": mean,
+            "std": np.sqrt(variance),
+            "error_ratio": error_ratio,
+            "rate": counts / self.window_seconds,
+            "sketch": sketches
+        }
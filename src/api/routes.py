@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import RedirectResponse, StreamingResponse
+import asyncio
+import json
+import zlib
 from typing import Dict, List
-from datetime import datetime
-from src.storage.database import Database
+from datetime import datetime, timedelta
+from src.config.settings import INGESTION, MONITORING
+from src.storage.database import ACTIVE_STATUSES, get_database
+from src.alerts.alert_manager import AlertManager
 from src.analyzers.anomaly_detector import AnomalyDetector
+from src.collectors.log_collector import LogCollector
+from src.collectors.log_parser import NDJSONDecoder
 from src.predictors.predictor import Predictor
 
 router = APIRouter()
-db = Database()
-anomaly_detector = AnomalyDetector()
-predictor = Predictor()
+db = get_database()
+log_collector = LogCollector(db)
+alert_manager = AlertManager(db)
+anomaly_detector = AnomalyDetector(db, alert_manager)
+predictor = Predictor(db, alert_manager)
 
 @router.get("/")
 async def root():
@@ -21,6 +30,55 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.now(datetime.timezone.utc)}
 
+@router.post("/logs")
+async def ingest_logs(request: Request):
+    """Ingest NDJSON logs (optionally gzip-encoded), parsed as the body streams in"""
+    decoder = NDJSONDecoder(gzip=request.headers.get("content-encoding", "").lower() == "gzip")
+    batch = []
+    accepted = 0
+    rejected = 0
+    errors = []
+
+    async def handle(logs: List[Dict], line_errors: List[str]):
+        nonlocal batch, accepted, rejected
+        batch.extend(logs)
+        accepted += len(logs)
+        rejected += len(line_errors)
+        errors.extend(line_errors[:INGESTION["max_errors_reported"] - len(errors)])
+        if len(batch) >= INGESTION["batch_size"]:
+            await log_collector.ingest(batch)
+            batch = []
+
+    try:
+        async for chunk in request.stream():
+            for logs, line_errors in decoder.feed(chunk):
+                await handle(logs, line_errors)
+        await handle(*decoder.close())
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid gzip body: {e}")
+    finally:
+        # Logs parsed before a failure are kept
+        if batch:
+            await log_collector.ingest(batch)
+
+    return {"accepted": accepted, "rejected": rejected, "errors": errors}
+
+@router.get("/ingest/stats")
+async def get_ingest_stats():
+    """Ingestion counters: received, stored, rejected and dropped lines, queue depth"""
+    return log_collector.get_ingest_stats()
+
+@router.get("/analysis/stats")
+async def get_analysis_stats():
+    """AI analysis cache hit rate, saved latency and token spend"""
+    if alert_manager.ai_analyzer is None:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        **alert_manager.ai_analyzer.get_stats(),
+        "enrichment": alert_manager.enricher.get_stats()
+    }
+
 @router.get("/metrics/{service}")
 async def get_service_metrics(service: str):
     """Get metrics for a specific service"""
@@ -29,32 +87,86 @@ async def get_service_metrics(service: str):
         raise HTTPException(status_code=404, detail="Service not found")
     return metrics[service]
 
+@router.get("/latency")
+async def get_latency(minutes: int = None):
+    """Latency percentiles and mergeable sketches per service and endpoint"""
+    start_time = datetime.utcnow() - timedelta(minutes=minutes or MONITORING["recent_window"])
+    return await db.get_latency_percentiles(start_time)
+
+@router.get("/latency/{service}")
+async def get_service_latency(service: str, minutes: int = None):
+    """Latency percentiles of a service, per endpoint and per metric bucket"""
+    start_time = datetime.utcnow() - timedelta(minutes=minutes or MONITORING["recent_window"])
+    latency = await db.get_latency_percentiles(start_time, service=service)
+    if service not in latency:
+        raise HTTPException(status_code=404, detail="Service not found")
+    return {**latency[service], "series": await db.get_latency_series(service, start_time)}
+
 @router.get("/alerts")
-async def get_alerts(status: str = None):
-    """Get all active alerts"""
-    alerts = await db.get_active_alerts()
-    if status:
-        alerts = [a for a in alerts if a.get("status") == status]
-    return alerts
+async def get_alerts(status: str = None, service: str = None, cursor: str = None, limit: int = 100):
+    """Page through alerts, newest first; active ones unless a status (or "all") is given"""
+    if cursor is not None and not cursor.isdigit():
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if status == "all":
+        statuses = None
+    else:
+        statuses = [status] if status else ACTIVE_STATUSES
+    return await db.page_alerts(statuses, service, cursor, max(1, min(limit, 1000)))
+
+@router.get("/alerts/stream")
+async def stream_alerts(request: Request):
+    """Server-sent events for new alerts, status changes and AI analyses as they complete"""
+    queue = alert_manager.events.subscribe()
+
+    async def events():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), 15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            alert_manager.events.unsubscribe(queue)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+@router.get("/alerts/{alert_id}/metrics")
+async def get_alert_metrics(alert_id: str):
+    """Latency sketches and per-bucket series of an alert's service over the window it was raised on"""
+    alert = await db.get_alert(alert_id)
+    if alert is None:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    summary = alert.get("metrics") or {}
+    start_time, end_time = summary.get("start"), summary.get("end")
+    latency = await db.get_latency_percentiles(start_time, end_time, service=alert["service"])
+    if alert["service"] not in latency:
+        return {"summary": summary, "latency": None, "series": None}
+    return {
+        "summary": summary,
+        "latency": latency[alert["service"]],
+        "series": await db.get_latency_series(alert["service"], start_time, end_time)
+    }
 
 @router.post("/alerts/{alert_id}/acknowledge")
 async def acknowledge_alert(alert_id: str):
     """Acknowledge an alert"""
-    await db.update_alert_status(alert_id, "acknowledged")
+    await alert_manager.update_status(alert_id, "acknowledged")
     return {"status": "success"}
 
 @router.post("/alerts/{alert_id}/resolve")
 async def resolve_alert(alert_id: str):
     """Resolve an alert"""
-    await db.update_alert_status(alert_id, "resolved")
+    await alert_manager.update_status(alert_id, "resolved")
     return {"status": "success"}
 
 @router.get("/predictions/{service}")
 async def get_predictions(service: str):
     """Get predictions for a specific service"""
-    current_metrics = await db.get_recent_metrics()
-    if service not in current_metrics:
+    scores = await predictor.get_scores()
+    if service not in scores["metrics"]:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    predictions = predictor._make_predictions({service: current_metrics[service]})
+    predictions = predictor._make_predictions(scores, [service])
     return predictions[0] if predictions else {"message": "No predictions available"}
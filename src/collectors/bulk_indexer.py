@@ -0,0 +1,191 @@
+"""
+Buffered, batched Elasticsearch ingestion with concurrent bulk workers
+"""
+import asyncio
+import json
+import random
+from datetime import datetime
+from typing import Dict, List
+from elasticsearch import exceptions as es_exceptions
+from src.collectors.spill_queue import SpillQueue
+from src.config.external_services import ELASTICSEARCH_CONFIG
+
+# Errors raised by the client for a whole bulk request
+ES_ERRORS = (es_exceptions.ApiError, es_exceptions.TransportError)
+
+# Per-item statuses worth retrying (rejected execution, overloaded or unavailable nodes)
+RETRYABLE_STATUSES = {429, 502, 503, 504}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_document(doc: Dict) -> bytes:
+    """Serialize a log document to a single NDJSON line"""
+    return json.dumps(doc, default=_json_default, separators=(",", ":")).encode()
+
+
+def index_name() -> str:
+    """Monthly index the collector writes to"""
+    return f"{ELASTICSEARCH_CONFIG['index_prefix']}-{datetime.utcnow().strftime('%Y-%m')}"
+
+
+class BulkIndexer:
+    """Bounded queue of document batches drained by concurrent bulk workers"""
+
+    def __init__(
+        self,
+        es_client,
+        max_docs: int = None,
+        max_bytes: int = None,
+        flush_interval: float = None,
+        workers: int = None,
+        queue_size: int = None,
+        max_retries: int = None,
+        spill: SpillQueue = None
+    ):
+        self.es_client = es_client
+        self.max_docs = max_docs or ELASTICSEARCH_CONFIG["bulk_max_docs"]
+        self.max_bytes = max_bytes or ELASTICSEARCH_CONFIG["bulk_max_bytes"]
+        self.flush_interval = flush_interval or ELASTICSEARCH_CONFIG["bulk_flush_interval"]
+        self.workers = workers or ELASTICSEARCH_CONFIG["bulk_workers"]
+        self.max_retries = ELASTICSEARCH_CONFIG["bulk_max_retries"] if max_retries is None else max_retries
+        # Batches that could not be indexed are written here and replayed later
+        self.spill = spill
+
+        # Producers block on this queue once every worker is busy (backpressure)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size or ELASTICSEARCH_CONFIG["bulk_queue_size"])
+        self._buffer: List[bytes] = []
+        self._buffer_bytes = 0
+        self._buffer_started = 0.0
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"indexed": 0, "failed": 0, "retried": 0, "batches": 0}
+
+    async def start(self):
+        """Start the flush timer and bulk workers"""
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flush_timer()))
+        if self.spill:
+            self._tasks.append(asyncio.create_task(self._replay_spilled()))
+
+    async def stop(self):
+        """Flush buffered documents and wait for in-flight batches"""
+        await self.flush()
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def add(self, docs: List[Dict]):
+        """Buffer documents, handing full batches to the workers"""
+        for doc in docs:
+            line = encode_document(doc)
+            if not self._buffer:
+                self._buffer_started = asyncio.get_running_loop().time()
+            self._buffer.append(line)
+            self._buffer_bytes += len(line)
+            if len(self._buffer) >= self.max_docs or self._buffer_bytes >= self.max_bytes:
+                await self.flush()
+
+    async def flush(self):
+        """Queue the current buffer as a batch"""
+        if self._buffer:
+            batch = self._buffer
+            self._buffer = []
+            self._buffer_bytes = 0
+            await self.queue.put(batch)
+
+    async def _flush_timer(self):
+        """Flush buffers that are older than flush_interval"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.flush_interval / 2)
+            if self._buffer and loop.time() - self._buffer_started >= self.flush_interval:
+                await self.flush()
+
+    async def _replay_spilled(self):
+        """Replay the spill queue whenever the cluster answers again"""
+        while True:
+            await asyncio.sleep(ELASTICSEARCH_CONFIG["spill_check_interval"])
+            try:
+                if not self.spill.empty and await self.es_client.ping():
+                    await self.spill.replay(self._send)
+            except Exception as e:
+                print(f"Error replaying spilled logs: {e}")
+
+    async def _worker(self):
+        while True:
+            batch = await self.queue.get()
+            try:
+                if self.spill and not self.spill.empty:
+                    # Queue behind the backlog to keep order and skip a request likely to fail
+                    self.spill.put(batch)
+                else:
+                    failed = await self._send(batch)
+                    if failed:
+                        self._fail(failed)
+            except Exception as e:
+                print(f"Bulk indexing worker error: {e}")
+                self._fail(batch)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, lines: List[bytes]) -> List[bytes]:
+        """Index a batch, retrying only the items that failed transiently
+
+        Returns the documents that failed transiently on every attempt and
+        are worth sending again later. Documents Elasticsearch rejected for
+        good (per item, or a whole request refused with a non-retryable
+        status such as 400, 401 or 413) are counted as failed and dropped,
+        since resending them cannot succeed.
+        """
+        attempt = 0
+        while lines:
+            action = json.dumps({"index": {"_index": index_name()}}).encode()
+            operations = []
+            for line in lines:
+                operations.append(action)
+                operations.append(line)
+
+            retry = lines
+            try:
+                # Refresh is left to the index's refresh_interval
+                response = await self.es_client.bulk(operations=operations)
+                self.stats["batches"] += 1
+                if not response["errors"]:
+                    self.stats["indexed"] += len(lines)
+                    return []
+                retry = []
+                for line, item in zip(lines, response["items"]):
+                    status = item["index"].get("status", 500)
+                    if status < 300:
+                        self.stats["indexed"] += 1
+                    elif status in RETRYABLE_STATUSES:
+                        retry.append(line)
+                    else:
+                        self.stats["failed"] += 1
+            except ES_ERRORS as e:
+                status = getattr(e, "status_code", None)
+                if status is not None and status not in RETRYABLE_STATUSES:
+                    self.stats["failed"] += len(lines)
+                    print(f"Bulk request rejected, dropped {len(lines)} logs: {e}")
+                    return []
+
+            lines = retry
+            attempt += 1
+            if not lines or attempt > self.max_retries:
+                return lines
+            self.stats["retried"] += len(lines)
+            # Exponential backoff with full jitter
+            await asyncio.sleep(random.uniform(0, 0.1 * 2 ** attempt))
+
+    def _fail(self, lines: List[bytes]):
+        if self.spill:
+            self.spill.put(lines)
+        else:
+            self.stats["failed"] += len(lines)
+            print(f"Dropped {len(lines)} logs after failed bulk indexing")
@@ -0,0 +1,175 @@
+"""
+UDP and TCP listener for JSON or key=value log lines pushed by sidecars
+"""
+import asyncio
+import socket
+from typing import List, Set
+from src.collectors.log_parser import parse_lines
+from src.config.settings import LISTENER
+
+
+class _DatagramProtocol(asyncio.DatagramProtocol):
+    """One or more newline-separated lines per datagram"""
+
+    def __init__(self, listener: "LineListener"):
+        self.listener = listener
+
+    def datagram_received(self, data: bytes, addr):
+        self.listener.accept(data.split(b"\n"))
+
+
+class _StreamProtocol(asyncio.Protocol):
+    """Newline-delimited lines over a TCP connection"""
+
+    def __init__(self, listener: "LineListener"):
+        self.listener = listener
+        self.transport = None
+        self.pending = b""
+        self.skipping = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        if self.skipping:
+            # Discard the rest of an oversized line
+            newline = data.find(b"\n")
+            if newline < 0:
+                return
+            data = data[newline + 1:]
+            self.skipping = False
+
+        lines = (self.pending + data).split(b"\n")
+        self.pending = lines.pop()
+        if len(self.pending) > LISTENER["max_line_bytes"]:
+            self.listener.stats["rejected"] += 1
+            self.pending = b""
+            self.skipping = True
+        if lines:
+            self.listener.accept(lines, self.transport)
+
+    def connection_lost(self, exc):
+        if self.pending:
+            self.listener.accept([self.pending])
+            self.pending = b""
+        self.listener.paused.discard(self.transport)
+
+
+class LineListener:
+    """Batches lines from UDP/TCP sockets into a bounded queue drained by one task
+
+    Protocol callbacks only append to the current batch, so no task is created
+    per message. While the queue is full the current batch is held back and
+    TCP connections are paused until the queue drains; UDP lines arriving
+    once the held batch is complete are dropped (and counted).
+    """
+
+    def __init__(self, collector, host: str = None, udp_port: int = None, tcp_port: int = None):
+        self.collector = collector
+        self.host = host or LISTENER["host"]
+        self.udp_port = LISTENER["udp_port"] if udp_port is None else udp_port
+        self.tcp_port = LISTENER["tcp_port"] if tcp_port is None else tcp_port
+        self.batch_size = LISTENER["batch_size"]
+        self.flush_interval = LISTENER["flush_interval"]
+
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LISTENER["queue_size"])
+        self.paused: Set[asyncio.Transport] = set()
+        self._pending: List[bytes] = []
+        self._queued_lines = 0
+        self._udp_transport = None
+        self._tcp_server = None
+        self._task = None
+        self.stats = {"received": 0, "stored": 0, "rejected": 0, "dropped": 0}
+
+    @property
+    def queue_depth(self) -> int:
+        """Lines waiting to be stored"""
+        return self._queued_lines + len(self._pending)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "queue_depth": self.queue_depth, "queued_batches": self.queue.qsize()}
+
+    async def start(self):
+        """Bind the sockets and start draining"""
+        loop = asyncio.get_running_loop()
+        if self.udp_port:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            # A large kernel buffer absorbs bursts while the drain task is busy
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, LISTENER["udp_receive_buffer"])
+            sock.bind((self.host, self.udp_port))
+            self._udp_transport, _ = await loop.create_datagram_endpoint(lambda: _DatagramProtocol(self), sock=sock)
+        if self.tcp_port:
+            self._tcp_server = await loop.create_server(lambda: _StreamProtocol(self), self.host, self.tcp_port)
+        self._task = asyncio.create_task(self._drain())
+        print(f"Log listener on {self.host} (udp:{self.udp_port}, tcp:{self.tcp_port})")
+
+    async def stop(self):
+        """Close the sockets and store what is still queued"""
+        if self._udp_transport:
+            self._udp_transport.close()
+        if self._tcp_server:
+            self._tcp_server.close()
+            await self._tcp_server.wait_closed()
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        while not self.queue.empty():
+            await self._store(self._dequeue(self.queue.get_nowait()))
+        if self._pending:
+            await self._store(self._take_pending())
+
+    def accept(self, lines: List[bytes], transport: asyncio.Transport = None):
+        """Add raw lines to the current batch (called from protocol callbacks)"""
+        self.stats["received"] += len(lines)
+        if transport is None and self.queue.full() and len(self._pending) >= self.batch_size:
+            self.stats["dropped"] += len(lines)
+            return
+        self._pending.extend(lines)
+        if len(self._pending) >= self.batch_size and not self.queue.full():
+            self._enqueue(self._take_pending())
+        if transport is not None and self.queue.full() and transport not in self.paused:
+            transport.pause_reading()
+            self.paused.add(transport)
+
+    def _take_pending(self) -> List[bytes]:
+        batch = self._pending
+        self._pending = []
+        return batch
+
+    def _enqueue(self, batch: List[bytes]):
+        """Queue a batch; callers check the queue is not full"""
+        self.queue.put_nowait(batch)
+        self._queued_lines += len(batch)
+
+    def _dequeue(self, batch: List[bytes]) -> List[bytes]:
+        self._queued_lines -= len(batch)
+        return batch
+
+    async def _drain(self):
+        while True:
+            try:
+                batch = self._dequeue(await asyncio.wait_for(self.queue.get(), self.flush_interval))
+            except asyncio.TimeoutError:
+                # Quiet period: store the partial batch
+                batch = self._take_pending()
+                if not batch:
+                    continue
+            try:
+                await self._store(batch)
+            except Exception as e:
+                print(f"Error storing listener batch: {e}")
+            # Queue the batch held back while the queue was full
+            if len(self._pending) >= self.batch_size and not self.queue.full():
+                self._enqueue(self._take_pending())
+            if self.paused and not self.queue.full():
+                for transport in self.paused:
+                    transport.resume_reading()
+                self.paused.clear()
+
+    async def _store(self, batch: List[bytes]):
+        lines = [line for line in batch if line and not line.isspace()]
+        logs, errors = parse_lines(lines, allow_key_values=True)
+        self.stats["rejected"] += len(errors)
+        if logs:
+            await self.collector.ingest(logs)
+            self.stats["stored"] += len(logs)
@@ -0,0 +1,330 @@
+"""
+Vectorized synthetic log generator for demos, load tests and benchmarks
+
+Usage:
+    python -m src.collectors.load_generator [--hours 1] [--rate 50] [--count N]
+        [--scenario outage ...] [--output logs.ndjson.gz] [--benchmark]
+
+Traffic follows a daily curve from LOAD_GENERATOR and is split across SERVICES;
+INCIDENT_SCENARIOS inject latency, error, outage and traffic incidents.
+"""
+import argparse
+import gzip
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List
+import numpy as np
+from src.config.settings import SERVICES, DEMO_SETTINGS, MONITORING, LOAD_GENERATOR, INCIDENT_SCENARIOS
+from src.storage.columnar import COLUMNS, ENCODED_COLUMNS, to_epoch_ns
+
+NS = 1_000_000_000
+
+# Status code of each error type (any other error type is a 500)
+ERROR_STATUS = {"timeout": 504, "database_error": 503}
+CLIENT_ERROR_STATUSES = np.array([400, 401, 404, 422], dtype=np.int16)
+
+# Outages answer like a gateway giving up after a long wait
+OUTAGE_LATENCY = 30000
+
+
+class LoadGenerator:
+    """Generates batches of log columns in the layout of ColumnarLogStore
+
+    Encoded columns hold indexes into self.vocabularies, where index 0 is a
+    missing value like in columnar.Dictionary; encode() maps them onto a
+    store's dictionaries and to_logs() turns a batch into log dicts.
+    """
+
+    def __init__(self, seed: int = None, requests_per_second: float = None, services: Dict = None):
+        self.rng = np.random.default_rng(seed)
+        self.rate = requests_per_second or LOAD_GENERATOR["requests_per_second"]
+        self.services = services or SERVICES
+        self.incidents: List[Dict] = []
+
+        names = list(self.services)
+        endpoints = [self.services[name]["endpoints"] for name in names]
+        self.vocabularies = {
+            "service": [None] + names,
+            "endpoint": [None] + [endpoint for group in endpoints for endpoint in group],
+            "method": [None] + DEMO_SETTINGS["http_methods"],
+            "region": [None] + DEMO_SETTINGS["regions"],
+            "environment": [None] + DEMO_SETTINGS["environments"],
+            "error_type": [None] + DEMO_SETTINGS["error_types"]
+        }
+
+        # Per-service parameters, indexed by service index - 1
+        self._endpoint_offsets = np.cumsum([1] + [len(group) for group in endpoints[:-1]])
+        self._endpoint_counts = np.array([len(group) for group in endpoints])
+        self._latencies = np.array([self.services[name]["expected_latency"] for name in names], dtype=np.float32)
+        self._error_rates = np.array(
+            [self.services[name]["error_threshold"] * LOAD_GENERATOR["base_error_ratio"] for name in names],
+            dtype=np.float32
+        )
+        # Some endpoints are consistently slower than others
+        self._endpoint_factors = np.concatenate(([1.0], self.rng.uniform(0.6, 1.6, len(self.vocabularies["endpoint"]) - 1)))
+        self._endpoint_factors = self._endpoint_factors.astype(np.float32)
+        self._error_status = np.array(
+            [0] + [ERROR_STATUS.get(name, 500) for name in DEMO_SETTINGS["error_types"]], dtype=np.int16
+        )
+        self._method_cdf = np.cumsum(LOAD_GENERATOR["method_weights"]) / sum(LOAD_GENERATOR["method_weights"])
+        self._environment_cdf = np.cumsum(LOAD_GENERATOR["environment_weights"]) / sum(LOAD_GENERATOR["environment_weights"])
+
+    def add_incident(self, kind: str, service: str, start: datetime, duration: float,
+                     magnitude: float = None, endpoint: str = None):
+        """Inject an incident
+
+        kind is "latency" (response times multiplied by magnitude), "errors"
+        (error probability set to magnitude), "outage" (every request fails
+        slowly) or "traffic" (request rate multiplied by magnitude).
+        """
+        if kind not in ("latency", "errors", "outage", "traffic"):
+            raise ValueError(f"Unknown incident kind: {kind}")
+        start_ns = to_epoch_ns(start)
+        self.incidents.append({
+            "kind": kind,
+            "service": service,
+            "endpoint": endpoint,
+            "magnitude": magnitude,
+            "start": start,
+            "end": start + timedelta(seconds=duration),
+            "service_index": self.vocabularies["service"].index(service),
+            "endpoint_index": self.vocabularies["endpoint"].index(endpoint) if endpoint else 0,
+            "start_ns": start_ns,
+            "end_ns": start_ns + int(duration * NS)
+        })
+
+    def add_scenario(self, name: str, start: datetime, end: datetime):
+        """Schedule an INCIDENT_SCENARIOS entry within [start, end]"""
+        for spec in INCIDENT_SCENARIOS[name]:
+            self.add_incident(
+                spec["kind"], spec["service"], start + (end - start) * spec["start"],
+                spec["duration"], spec.get("magnitude"), spec.get("endpoint")
+            )
+
+    def load_curve(self, seconds: np.ndarray) -> np.ndarray:
+        """Relative load (mean 1 over a day) at epoch seconds"""
+        hours = (seconds % 86400) / 3600
+        business = MONITORING["business_hours"]
+        boost = LOAD_GENERATOR["business_hours_boost"]
+        curve = 1 + LOAD_GENERATOR["diurnal_amplitude"] * np.cos(2 * np.pi * (hours - LOAD_GENERATOR["peak_hour"]) / 24)
+        curve += boost * ((hours >= business["start"]) & (hours < business["end"]))
+        return np.maximum(curve, 0.05) / (1 + boost * (business["end"] - business["start"]) / 24)
+
+    def generate(self, start: datetime, end: datetime, count: int = None) -> Dict[str, np.ndarray]:
+        """Generate the logs of [start, end), count of them or as many as the load curve implies"""
+        return self._generate(to_epoch_ns(start), to_epoch_ns(end), count)
+
+    def iter_batches(self, start: datetime, end: datetime, batch_size: int = 1_000_000) -> Iterator[Dict[str, np.ndarray]]:
+        """Generate [start, end) in time-ordered batches of roughly batch_size logs"""
+        start_ns = to_epoch_ns(start)
+        end_ns = to_epoch_ns(end)
+        step = LOAD_GENERATOR["bin_seconds"] * NS
+        window = max(step, int(batch_size / self.rate) // LOAD_GENERATOR["bin_seconds"] * step)
+        for window_start in range(start_ns, end_ns, window):
+            yield self._generate(window_start, min(window_start + window, end_ns))
+
+    def _generate(self, start_ns: int, end_ns: int, count: int = None) -> Dict[str, np.ndarray]:
+        rng = self.rng
+        step = LOAD_GENERATOR["bin_seconds"] * NS
+        bins = np.arange(start_ns, end_ns, step, dtype=np.int64)
+        widths = np.minimum(bins + step, end_ns) - bins
+        load = self.load_curve(bins // NS)
+
+        # Expected requests per service and bin
+        rates = np.repeat(load[np.newaxis, :] * (self.rate / len(self._latencies)), len(self._latencies), axis=0)
+        for incident in self._active("traffic", start_ns, end_ns):
+            overlap = (bins < incident["end_ns"]) & (bins + widths > incident["start_ns"])
+            rates[incident["service_index"] - 1, overlap] *= incident["magnitude"]
+        expected = rates.sum(axis=0) * (widths / NS)
+
+        if count is None:
+            per_bin = rng.poisson(expected)
+        else:
+            per_bin = rng.multinomial(count, expected / expected.sum())
+        total = int(per_bin.sum())
+        bin_index = np.repeat(np.arange(len(bins)), per_bin)
+
+        # Stratified arrival times keep every batch sorted by timestamp
+        rank = np.arange(total) - np.repeat(np.cumsum(per_bin) - per_bin, per_bin)
+        offsets = (rank + rng.random(total)) / per_bin[bin_index] * widths[bin_index]
+        timestamps = bins[bin_index] + offsets.astype(np.int64)
+
+        # Service by inverse CDF of each bin's service mix
+        shares = np.cumsum(rates, axis=0) / rates.sum(axis=0)
+        draw = rng.random(total)
+        service = np.ones(total, dtype=np.int16)
+        for row in shares[:-1]:
+            service += draw > row[bin_index]
+        s = service - 1
+
+        endpoint = (self._endpoint_offsets[s] + rng.random(total) * self._endpoint_counts[s]).astype(np.int32)
+        method = (np.searchsorted(self._method_cdf, rng.random(total), side="right") + 1).astype(np.int16)
+        environment = (np.searchsorted(self._environment_cdf, rng.random(total), side="right") + 1).astype(np.int16)
+        region = rng.integers(1, len(self.vocabularies["region"]), total, dtype=np.int16)
+
+        # Log-normal latency around each endpoint's baseline, rising with load
+        sigma = LOAD_GENERATOR["latency_sigma"]
+        pressure = np.maximum(0.5, 1 + LOAD_GENERATOR["load_latency_factor"] * (load - 1)).astype(np.float32)
+        noise = np.exp(rng.standard_normal(total, dtype=np.float32) * sigma - sigma * sigma / 2)
+        response_time = self._latencies[s] * self._endpoint_factors[endpoint] * pressure[bin_index] * noise
+
+        error_rate = self._error_rates[s]
+        for incident in self._active("latency", start_ns, end_ns):
+            rows = self._rows(incident, timestamps, service, endpoint)
+            response_time[rows] *= incident["magnitude"]
+        for incident in self._active("errors", start_ns, end_ns):
+            error_rate[self._rows(incident, timestamps, service, endpoint)] = incident["magnitude"]
+        outage = np.zeros(total, dtype=bool)
+        for incident in self._active("outage", start_ns, end_ns):
+            outage[self._rows(incident, timestamps, service, endpoint)] = True
+
+        error = rng.random(total, dtype=np.float32) < error_rate
+        error_type = np.where(
+            error, rng.integers(1, len(self.vocabularies["error_type"]), total, dtype=np.int16), 0
+        ).astype(np.int16)
+        timeout = self.vocabularies["error_type"].index("timeout")
+        error |= outage
+        error_type[outage] = timeout
+        response_time[error_type == timeout] *= 8
+        response_time[outage] = OUTAGE_LATENCY * noise[outage]
+
+        status_code = np.where(method == 2, 201, 200).astype(np.int16)
+        client_error = ~error & (rng.random(total, dtype=np.float32) < LOAD_GENERATOR["client_error_rate"])
+        status_code[client_error] = CLIENT_ERROR_STATUSES[rng.integers(0, len(CLIENT_ERROR_STATUSES), int(client_error.sum()))]
+        status_code[error] = self._error_status[error_type[error]]
+        status_code[outage] = 503
+
+        size = DEMO_SETTINGS["response_size"]
+        response_size = np.exp(rng.uniform(np.log(size["min"]), np.log(size["max"]), total)).astype(np.int32)
+
+        return {
+            "timestamp": timestamps,
+            "response_time": response_time.astype(COLUMNS["response_time"]),
+            "status_code": status_code,
+            "error": error,
+            "response_size": response_size,
+            "service": service,
+            "endpoint": endpoint,
+            "method": method,
+            "region": region,
+            "environment": environment,
+            "error_type": error_type
+        }
+
+    def _active(self, kind: str, start_ns: int, end_ns: int) -> List[Dict]:
+        return [
+            incident for incident in self.incidents
+            if incident["kind"] == kind and incident["start_ns"] < end_ns and incident["end_ns"] > start_ns
+        ]
+
+    def _rows(self, incident: Dict, timestamps: np.ndarray, service: np.ndarray, endpoint: np.ndarray) -> np.ndarray:
+        """Indexes of rows affected by an incident"""
+        lo, hi = np.searchsorted(timestamps, [incident["start_ns"], incident["end_ns"]])
+        mask = service[lo:hi] == incident["service_index"]
+        if incident["endpoint_index"]:
+            mask &= endpoint[lo:hi] == incident["endpoint_index"]
+        return lo + np.flatnonzero(mask)
+
+    def encode(self, batch: Dict[str, np.ndarray], dictionaries: Dict) -> Dict[str, np.ndarray]:
+        """Map vocabulary indexes onto a store's dictionaries (for insert_columns)"""
+        encoded = dict(batch)
+        for name in ENCODED_COLUMNS:
+            ids = np.array([dictionaries[name].encode(value) for value in self.vocabularies[name]], dtype=COLUMNS[name])
+            encoded[name] = ids[batch[name]]
+        return encoded
+
+    def to_logs(self, batch: Dict[str, np.ndarray]) -> List[Dict]:
+        """Convert a batch into log dicts"""
+        fields = {
+            "timestamp": batch["timestamp"].view("datetime64[ns]").astype("datetime64[us]").tolist(),
+            "response_time": batch["response_time"].astype(np.float64).round(2).tolist(),
+            "status_code": batch["status_code"].tolist(),
+            "error": batch["error"].tolist(),
+            "response_size": batch["response_size"].tolist()
+        }
+        for name in ENCODED_COLUMNS:
+            values = self.vocabularies[name]
+            fields[name] = [values[i] for i in batch[name].tolist()]
+        names = list(fields)
+        logs = [dict(zip(names, row)) for row in zip(*fields.values())]
+        for log in logs:
+            if log["error_type"] is None:
+                del log["error_type"]
+        return logs
+
+
+async def populate(db, hours: float = 1, requests_per_second: float = None, scenarios: List[str] = None,
+                   seed: int = None, end: datetime = None) -> LoadGenerator:
+    """Fill a Database with generated history ending at end (now by default)
+
+    Batches go straight into the backend's columns when it is columnar.
+    Returns the generator, whose incidents list the injected windows.
+    """
+    end = end or datetime.utcnow()
+    start = end - timedelta(hours=hours)
+    generator = LoadGenerator(seed, requests_per_second)
+    for name in scenarios or []:
+        generator.add_scenario(name, start, end)
+
+    dictionaries = getattr(db.backend, "dictionaries", None)
+    for batch in generator.iter_batches(start, end):
+        if dictionaries is not None:
+            await db.backend.insert_columns(generator.encode(batch, dictionaries))
+        else:
+            await db.store_logs(generator.to_logs(batch))
+    return generator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hours", type=float, default=1)
+    parser.add_argument("--rate", type=float, default=None, help="mean requests per second")
+    parser.add_argument("--count", type=int, default=None, help="approximate number of logs (overrides --rate)")
+    parser.add_argument("--scenario", action="append", choices=list(INCIDENT_SCENARIOS), default=[])
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="-", help="NDJSON file (gzip if it ends in .gz), - for stdout")
+    parser.add_argument("--benchmark", action="store_true", help="only report generation throughput")
+    args = parser.parse_args()
+
+    end = datetime.utcnow()
+    start = end - timedelta(hours=args.hours)
+    rate = args.count / (args.hours * 3600) if args.count else args.rate
+    generator = LoadGenerator(args.seed, rate)
+    for name in args.scenario:
+        generator.add_scenario(name, start, end)
+    for incident in generator.incidents:
+        print(f"{incident['kind']} on {incident['service']}{incident['endpoint'] or ''} "
+              f"{incident['start']:%H:%M:%S}-{incident['end']:%H:%M:%S}", file=sys.stderr)
+
+    if args.benchmark:
+        total = 0
+        started = time.perf_counter()
+        for batch in generator.iter_batches(start, end):
+            total += len(batch["timestamp"])
+        elapsed = time.perf_counter() - started
+        print(f"Generated {total:,} logs in {elapsed:.2f}s ({total / elapsed:,.0f} logs/s)", file=sys.stderr)
+        return
+
+    # Imported here so benchmarks do not pull in the Elasticsearch client
+    from src.collectors.bulk_indexer import encode_document
+    if args.output == "-":
+        out = sys.stdout.buffer
+    elif args.output.endswith(".gz"):
+        out = gzip.open(args.output, "wb", compresslevel=3)
+    else:
+        out = open(args.output, "wb")
+    total = 0
+    try:
+        for batch in generator.iter_batches(start, end):
+            logs = generator.to_logs(batch)
+            out.write(b"".join(encode_document(log) + b"\n" for log in logs))
+            total += len(logs)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"Wrote {total:,} logs", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
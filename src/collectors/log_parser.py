@@ -0,0 +1,233 @@
+"""
+Log schema, validation and incremental NDJSON decoding for pushed logs
+"""
+import json
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from src.config.settings import INGESTION
+
+# Field types shared by the Elasticsearch index mapping and ingest validation
+LOG_MAPPING = {
+    "timestamp": {"type": "date"},
+    "service": {"type": "keyword"},
+    "endpoint": {"type": "keyword"},
+    "response_time": {"type": "float"},
+    "status_code": {"type": "integer"},
+    "error": {"type": "boolean"},
+    "error_type": {"type": "keyword"},
+    "environment": {"type": "keyword"},
+    "region": {"type": "keyword"},
+    "request_id": {"type": "keyword"},
+    "user_id": {"type": "keyword"},
+    "method": {"type": "keyword"},
+    "response_size": {"type": "integer"}
+}
+
+REQUIRED_FIELDS = frozenset(("service", "endpoint", "response_time"))
+
+# Accepted (min, max) of numeric fields, within their columnar storage types;
+# NaN is never in range
+FIELD_RANGES = {
+    "response_time": (0.0, 3.4e38),
+    "status_code": (100, 999),
+    "response_size": (0, 2 ** 31 - 1)
+}
+
+
+def _to_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return value != 0
+    if isinstance(value, str) and value.lower() in ("true", "false", "1", "0"):
+        return value.lower() in ("true", "1")
+    raise ValueError(f"invalid boolean {value!r}")
+
+
+def _to_datetime(value) -> datetime:
+    """Parse an ISO-8601 string or epoch milliseconds into a naive UTC datetime"""
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return datetime.utcfromtimestamp(value / 1000)
+    if not isinstance(value, str):
+        raise TypeError(f"invalid timestamp {value!r}")
+    if value.endswith("Z"):
+        return datetime.fromisoformat(value[:-1])
+    timestamp = datetime.fromisoformat(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp
+
+
+_CASTS = {
+    "date": _to_datetime,
+    "keyword": str,
+    "float": float,
+    "integer": int,
+    "boolean": _to_bool
+}
+
+# Python type each field already has when no conversion is needed
+_TYPES = {
+    "date": datetime,
+    "keyword": str,
+    "float": float,
+    "integer": int,
+    "boolean": bool
+}
+
+_FIELDS = {name: (_TYPES[spec["type"]], _CASTS[spec["type"]]) for name, spec in LOG_MAPPING.items()}
+
+_decode_json = json.JSONDecoder().decode
+
+
+def validate_log(raw: Dict, received_at: datetime = None) -> Dict:
+    """Check a pushed log against LOG_MAPPING and coerce its field types
+
+    Unknown fields are dropped, numeric fields must lie within
+    FIELD_RANGES, a missing timestamp defaults to received_at and a
+    missing error flag is derived from the status code.
+    """
+    if not isinstance(raw, dict):
+        raise ValueError("log must be a JSON object")
+
+    log = {}
+    for name, value in raw.items():
+        field = _FIELDS.get(name)
+        if field is None or value is None:
+            continue
+        if type(value) is field[0]:
+            log[name] = value
+            continue
+        try:
+            log[name] = field[1](value)
+        except (TypeError, ValueError, OverflowError, OSError):
+            # Out-of-range numbers raise OverflowError (int) or OSError (epoch timestamps)
+            raise ValueError(f"invalid value for '{name}': {value!r}")
+
+    for name, (low, high) in FIELD_RANGES.items():
+        if name in log and not low <= log[name] <= high:
+            raise ValueError(f"'{name}' out of range: {log[name]!r}")
+
+    if not REQUIRED_FIELDS <= log.keys():
+        missing = sorted(REQUIRED_FIELDS - log.keys())
+        raise ValueError(f"missing required field '{missing[0]}'")
+    if "timestamp" not in log:
+        log["timestamp"] = received_at or datetime.utcnow()
+    if "error" not in log:
+        log["error"] = log.get("status_code", 200) >= 500
+    return log
+
+
+def parse_key_values(line: bytes) -> Dict:
+    """Parse a compact `key=value key=value` line (values cannot contain spaces)"""
+    record = {}
+    for token in line.decode().split():
+        key, separator, value = token.partition("=")
+        if not separator:
+            raise ValueError(f"expected key=value, got {token!r}")
+        record[key] = value
+    return record
+
+
+def parse_lines(lines: List[bytes], allow_key_values: bool = False) -> Tuple[List[Dict], List[Tuple[int, str]]]:
+    """Parse and validate non-empty lines, returning (logs, [(line index, error)])
+
+    JSON lines are decoded in one call, falling back to per-line decoding
+    (and per-line errors) if any of them is malformed. Other lines are read
+    as key=value records when allow_key_values is set.
+    """
+    if allow_key_values:
+        json_indexes = [i for i, line in enumerate(lines) if line.lstrip()[:1] == b"{"]
+    else:
+        json_indexes = range(len(lines))
+    records = [None] * len(lines)
+    if json_indexes:
+        try:
+            decoded = _decode_json("[" + b",".join([lines[i] for i in json_indexes]).decode() + "]")
+            if len(decoded) == len(json_indexes):
+                for i, record in zip(json_indexes, decoded):
+                    records[i] = record
+        except ValueError:
+            pass
+
+    logs = []
+    errors = []
+    received_at = datetime.utcnow()
+    for i, line in enumerate(lines):
+        try:
+            # json.JSONDecodeError and UnicodeDecodeError are ValueErrors as well
+            record = records[i]
+            if record is None:
+                if allow_key_values and line.lstrip()[:1] != b"{":
+                    record = parse_key_values(line)
+                else:
+                    record = _decode_json(line.decode())
+            logs.append(validate_log(record, received_at))
+        except ValueError as e:
+            errors.append((i, str(e)))
+    return logs, errors
+
+
+class NDJSONDecoder:
+    """Incremental NDJSON parser fed with arbitrary (optionally gzip) byte chunks"""
+
+    # Largest slice of inflated data handled at once, however well the body compresses
+    INFLATE_BYTES = 1024 * 1024
+
+    def __init__(self, gzip: bool = False, max_line_bytes: int = None):
+        self.max_line_bytes = max_line_bytes or INGESTION["max_line_bytes"]
+        self._inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzip else None
+        self._pending = b""
+        self._skipping = False
+        self._line_number = 0
+
+    def feed(self, chunk: bytes) -> Iterator[Tuple[List[Dict], List[str]]]:
+        """Parse the complete lines in chunk, yielding (logs, errors) per slice"""
+        if self._inflater is None:
+            yield self._split(chunk)
+            return
+        while chunk:
+            piece = self._inflater.decompress(chunk, self.INFLATE_BYTES)
+            chunk = self._inflater.unconsumed_tail
+            yield self._split(piece)
+
+    def close(self) -> Tuple[List[Dict], List[str]]:
+        """Parse whatever is left after the last chunk"""
+        if self._inflater:
+            self._pending += self._inflater.flush()
+        lines = [] if self._skipping else self._pending.split(b"\n")
+        self._pending = b""
+        return self._parse(lines)
+
+    def _split(self, data: bytes) -> Tuple[List[Dict], List[str]]:
+        if self._skipping:
+            # Discard the rest of an oversized line
+            newline = data.find(b"\n")
+            if newline < 0:
+                return [], []
+            data = data[newline + 1:]
+            self._skipping = False
+
+        lines = (self._pending + data).split(b"\n")
+        self._pending = lines.pop()
+        logs, errors = self._parse(lines)
+        if len(self._pending) > self.max_line_bytes:
+            self._line_number += 1
+            errors.append(f"line {self._line_number}: longer than {self.max_line_bytes} bytes")
+            self._pending = b""
+            self._skipping = True
+        return logs, errors
+
+    def _parse(self, lines: List[bytes]) -> Tuple[List[Dict], List[str]]:
+        numbers = []
+        non_empty = []
+        for line in lines:
+            self._line_number += 1
+            if line and not line.isspace():
+                numbers.append(self._line_number)
+                non_empty.append(line)
+        logs, errors = parse_lines(non_empty)
+        return logs, [f"line {numbers[i]}: {message}" for i, message in errors]
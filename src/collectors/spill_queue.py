@@ -0,0 +1,134 @@
+"""
+Disk-backed FIFO of bulk batches that could not be indexed in Elasticsearch
+"""
+import asyncio
+import os
+import struct
+import zlib
+from typing import Awaitable, Callable, Iterator, List
+from src.config.external_services import ELASTICSEARCH_CONFIG
+
+# Record header: compressed payload length, document count, CRC32 of the payload
+HEADER = struct.Struct(">III")
+
+
+class SpillQueue:
+    """Append-only segment files of compressed, length-prefixed batches"""
+
+    def __init__(self, directory: str = None, max_bytes: int = None, segment_bytes: int = None):
+        self.directory = directory or ELASTICSEARCH_CONFIG["spill_dir"]
+        self.max_bytes = max_bytes or ELASTICSEARCH_CONFIG["spill_max_bytes"]
+        self.segment_bytes = segment_bytes or ELASTICSEARCH_CONFIG["spill_segment_bytes"]
+        os.makedirs(self.directory, exist_ok=True)
+
+        # Segments left over from a previous run are replayed first
+        self.segments: List[str] = sorted(
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.startswith("spill-") and name.endswith(".log")
+        )
+        self.total_bytes = sum(os.path.getsize(path) for path in self.segments)
+        self._next_id = int(os.path.basename(self.segments[-1])[6:-4]) + 1 if self.segments else 1
+        self._active = None
+        self.stats = {"spilled_docs": 0, "replayed_docs": 0, "dropped_docs": 0}
+
+    @property
+    def empty(self) -> bool:
+        return not self.segments
+
+    def put(self, lines: List[bytes]):
+        """Append a batch of encoded documents"""
+        payload = zlib.compress(b"\n".join(lines), 3)
+        record = HEADER.pack(len(payload), len(lines), zlib.crc32(payload)) + payload
+
+        # Enforce the disk cap by discarding the oldest segments first
+        while self.total_bytes + len(record) > self.max_bytes and self._sealed():
+            self._drop(self.segments[0])
+        if self.total_bytes + len(record) > self.max_bytes:
+            self.stats["dropped_docs"] += len(lines)
+            print(f"Spill queue full, dropped {len(lines)} logs")
+            return
+
+        if self._active is None or os.path.getsize(self._active) >= self.segment_bytes:
+            self._active = os.path.join(self.directory, f"spill-{self._next_id:012d}.log")
+            self._next_id += 1
+            self.segments.append(self._active)
+        with open(self._active, "ab") as f:
+            f.write(record)
+        self.total_bytes += len(record)
+        self.stats["spilled_docs"] += len(lines)
+
+    def _sealed(self) -> List[str]:
+        """Segments no longer being appended to"""
+        return [path for path in self.segments if path != self._active]
+
+    def _drop(self, path: str):
+        """Discard a whole segment"""
+        self.stats["dropped_docs"] += sum(len(lines) for lines in self._read(path))
+        self._remove(path)
+        print(f"Spill queue over {self.max_bytes} bytes, dropped segment {os.path.basename(path)}")
+
+    def _remove(self, path: str):
+        self.total_bytes -= os.path.getsize(path)
+        os.remove(path)
+        self.segments.remove(path)
+        if path == self._active:
+            self._active = None
+
+    def _read(self, path: str) -> Iterator[List[bytes]]:
+        """Yield the batches stored in a segment, stopping at a torn or corrupt record"""
+        with open(path, "rb") as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return
+                length, count, checksum = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    print(f"Skipping corrupt tail of {os.path.basename(path)}")
+                    return
+                yield zlib.decompress(payload).split(b"\n")
+
+    async def replay(self, send: Callable[[List[bytes]], Awaitable[List[bytes]]], concurrency: int = None) -> bool:
+        """Resend spilled batches oldest first; True once the backlog is drained
+
+        send returns the documents that failed transiently; the pass then
+        stops and the segment is kept for the next one, so delivery is
+        at-least-once. A batch whose send raises can never go through, so it
+        is dropped rather than blocking the batches behind it.
+        """
+        concurrency = concurrency or ELASTICSEARCH_CONFIG["spill_replay_concurrency"]
+        # Seal the active segment so new spills queue up behind this pass
+        self._active = None
+
+        for path in list(self.segments):
+            semaphore = asyncio.Semaphore(concurrency)
+            failed = False
+
+            async def replay_batch(lines: List[bytes]):
+                nonlocal failed
+                try:
+                    if await send(lines):
+                        failed = True
+                    else:
+                        self.stats["replayed_docs"] += len(lines)
+                except Exception as e:
+                    self.stats["dropped_docs"] += len(lines)
+                    print(f"Dropped {len(lines)} spilled logs that could not be replayed: {e}")
+                finally:
+                    semaphore.release()
+
+            tasks = []
+            for lines in self._read(path):
+                await semaphore.acquire()
+                if failed:
+                    semaphore.release()
+                    break
+                tasks.append(asyncio.create_task(replay_batch(lines)))
+            await asyncio.gather(*tasks)
+            if failed:
+                return False
+            # The segment may have been dropped by the disk cap meanwhile
+            if path in self.segments:
+                self._remove(path)
+        return True
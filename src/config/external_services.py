@@ -3,6 +3,7 @@ Configuration for external services (AWS SNS, Elasticsearch, and OpenAI)
 """
 import os
 from dotenv import load_dotenv
+from src.config.settings import ALERT_SETTINGS
 
 # Load environment variables
 load_dotenv()
@@ -13,6 +14,7 @@ AWS_SNS_CONFIG = {
     "access_key_id": os.getenv("AWS_ACCESS_KEY_ID", ""),
     "secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY", ""),
     "topic_arn": os.getenv("AWS_SNS_TOPIC_ARN", ""),
+    "endpoint_url": os.getenv("AWS_SNS_ENDPOINT_URL") or None,
     "fallback_to_console": True
 }
 
@@ -22,7 +24,18 @@ ELASTICSEARCH_CONFIG = {
     "index_prefix": os.getenv("ELASTICSEARCH_INDEX_PREFIX", "api_monitor"),
     "username": os.getenv("ELASTICSEARCH_USERNAME", ""),
     "password": os.getenv("ELASTICSEARCH_PASSWORD", ""),
-    "fallback_to_memory": True
+    "fallback_to_memory": True,
+    "bulk_max_docs": int(os.getenv("ELASTICSEARCH_BULK_MAX_DOCS", 5000)),
+    "bulk_max_bytes": int(os.getenv("ELASTICSEARCH_BULK_MAX_BYTES", 5 * 1024 * 1024)),
+    "bulk_flush_interval": float(os.getenv("ELASTICSEARCH_BULK_FLUSH_INTERVAL", 1.0)),  # seconds
+    "bulk_workers": int(os.getenv("ELASTICSEARCH_BULK_WORKERS", 4)),
+    "bulk_queue_size": int(os.getenv("ELASTICSEARCH_BULK_QUEUE_SIZE", 8)),  # batches
+    "bulk_max_retries": int(os.getenv("ELASTICSEARCH_BULK_MAX_RETRIES", 3)),
+    "spill_dir": os.getenv("ELASTICSEARCH_SPILL_DIR", "data/spill"),
+    "spill_max_bytes": int(os.getenv("ELASTICSEARCH_SPILL_MAX_BYTES", 1024 * 1024 * 1024)),
+    "spill_segment_bytes": int(os.getenv("ELASTICSEARCH_SPILL_SEGMENT_BYTES", 16 * 1024 * 1024)),
+    "spill_replay_concurrency": int(os.getenv("ELASTICSEARCH_SPILL_REPLAY_CONCURRENCY", 2)),
+    "spill_check_interval": float(os.getenv("ELASTICSEARCH_SPILL_CHECK_INTERVAL", 5.0))  # seconds
 }
 
 OPENAI_CONFIG = {
@@ -30,12 +43,18 @@ OPENAI_CONFIG = {
     "api_key": os.getenv("OPENAI_API_KEY", ""),
     "model": os.getenv("OPENAI_MODEL", "gpt-4"),
     "temperature": float(os.getenv("OPENAI_TEMPERATURE", "0.7")),
-    "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS", "500"))
+    "max_tokens": int(os.getenv("OPENAI_MAX_TOKENS", "500")),
+    "base_url": os.getenv("OPENAI_BASE_URL") or None,
+    "cache_ttl": float(os.getenv("OPENAI_CACHE_TTL", 300)),  # seconds
+    "cache_size": int(os.getenv("OPENAI_CACHE_SIZE", 256)),
+    "tokens_per_minute": int(os.getenv("OPENAI_TOKENS_PER_MINUTE", 20000)),
+    "cost_per_1k_tokens": float(os.getenv("OPENAI_COST_PER_1K_TOKENS", 0.03)),  # USD
+    "max_cost_per_minute": float(os.getenv("OPENAI_MAX_COST_PER_MINUTE", 0.5))  # USD
 }
 
 # Monitoring settings
 MONITORING_CONFIG = {
-    "alert_cooldown": int(os.getenv("ALERT_COOLDOWN", 300)),
+    "alert_cooldown": int(os.getenv("ALERT_COOLDOWN", ALERT_SETTINGS["cooldown_period"])),
     "log_retention_days": int(os.getenv("LOG_RETENTION_DAYS", 7)),
     "monitoring_interval": int(os.getenv("MONITORING_INTERVAL", 5))
 }
@@ -60,12 +60,58 @@ SERVICES = {
 MONITORING = {
     "collection_interval": 5,  # Seconds between log collection
     "retention_period": 24,    # Hours to keep logs
+    "bucket_width": 10,        # Seconds per pre-aggregated metric bucket
+    "recent_window": 5,        # Minutes covered by recent metrics
+    "max_clock_skew": 60,      # Seconds a log may be dated ahead of now; later logs are dropped by the detectors
     "business_hours": {
         "start": 9,           # 9 AM
         "end": 17            # 5 PM
     }
 }
 
+# Streaming Anomaly Detection
+STREAMING_DETECTION = {
+    "window": 60,                # Seconds covered by the sliding statistics
+    "slot_seconds": 1,           # Granularity at which events leave the window
+    "evaluation_interval": 0.5,  # Seconds between threshold checks, 0 to check after every batch
+    "min_requests": 20           # Requests in the window before latency and error checks apply
+}
+
+# Adaptive Baseline Detection
+BASELINE_DETECTION = {
+    "detectors": ["ewma", "mad", "seasonal"],  # Any of baselines.DETECTORS
+    "min_agreeing": 2,           # Detectors (of those with enough history) that must flag a bucket
+    "bucket_seconds": 60,        # Width of the buckets the baselines are learnt on
+    "backfill_days": 7,          # History used to fit baselines at startup
+    "min_requests": 10,          # Requests in a bucket before latency and error rate are judged
+    "min_samples": 30,           # Buckets a MAD window or hour-of-week slot needs before scoring
+    "ewma_alpha": 0.05,          # Weight of the newest bucket in EWMA baselines
+    "mad_window": 60,            # Buckets in the MAD window
+    "min_spread_ratio": 0.05,    # Spread floor relative to the baseline, against flat series
+    "z_warning": 4,              # Deviation (in spreads) raising a warning
+    "z_critical": 7              # Deviation (in spreads) raising a critical alert
+}
+
+# Log Ingestion Configuration
+INGESTION = {
+    "batch_size": 5000,              # Logs handed to storage at once
+    "max_line_bytes": 1024 * 1024,   # Longest accepted NDJSON line
+    "max_errors_reported": 20        # Validation errors echoed per request
+}
+
+# UDP/TCP Line Listener Configuration
+LISTENER = {
+    "enabled": True,
+    "host": "0.0.0.0",
+    "udp_port": 5140,                      # 0 disables the UDP socket
+    "tcp_port": 5141,                      # 0 disables the TCP server
+    "batch_size": 5000,                    # Lines parsed and stored at once
+    "flush_interval": 0.5,                 # Seconds before a partial batch is stored
+    "queue_size": 64,                      # Batches waiting to be stored
+    "max_line_bytes": 64 * 1024,           # Longest accepted TCP line
+    "udp_receive_buffer": 8 * 1024 * 1024  # SO_RCVBUF requested for the UDP socket
+}
+
 # Alert Configuration
 ALERT_THRESHOLDS = {
     "response_time": {
@@ -82,10 +128,69 @@ ALERT_THRESHOLDS = {
     }
 }
 
+# Latency Sketch Configuration
+LATENCY_SKETCH = {
+    "relative_accuracy": 0.05,  # Max relative error of reported percentiles
+    "min_latency": 0.5,         # ms, smaller values share the lowest bin
+    "max_latency": 120000,      # ms, larger values share the highest bin
+    "endpoint_bucket_width": 60  # Seconds per per-endpoint sketch bucket
+}
+
+# Latency percentile alert rules, checked on the streaming window (most severe first)
+LATENCY_ALERT_RULES = [
+    {"percentile": 99, "threshold": 2000, "severity": "critical"},  # ms
+    {"percentile": 95, "threshold": 1000, "severity": "warning"}    # ms
+]
+
 ALERT_SETTINGS = {
     "cooldown_period": 300,   # 5 minutes between similar alerts
     "auto_acknowledge": 60,   # Minutes before auto-acknowledging
     "auto_resolve": 24,      # Hours before auto-resolving
+    "resolve_after": 120,     # Seconds a condition must stay clear before its alert resolves
+    "flap_threshold": 3,      # Reopens within the cooldown before an alert is marked flapping
+    "maintenance_interval": 10,  # Seconds between acknowledge/resolve sweeps
+    "archive_after": 7,       # Days resolved alerts stay queryable before being archived
+}
+
+# Alert Notification Delivery
+NOTIFICATIONS = {
+    "queue_size": 1000,          # Alerts waiting per channel before new ones are dropped
+    "workers": 2,                # Concurrent senders per channel
+    "digest_max": 50,            # Most alerts coalesced into one message
+    "max_retries": 3,
+    "retry_base_delay": 0.5,     # Seconds, doubled per attempt with full jitter
+    "retry_max_delay": 10,
+    "publish_threads": 4,        # Threads for blocking SNS publish calls
+    "rate_limits": {             # Messages per second and burst size per channel
+        "sns": {"rate": 1, "burst": 5},
+        "default": {"rate": 10, "burst": 20}
+    }
+}
+
+# Background AI Analysis of Alerts
+AI_ENRICHMENT = {
+    "workers": 2,                # Concurrent analysis calls
+    "batch_size": 8,             # Most alerts analyzed in one prompt
+    "batch_window": 0.5,         # Seconds to wait for more alerts before analyzing a batch
+    "queue_size": 500,           # Alerts waiting; overflow gets a rule-based analysis
+    "notify_wait": 10            # Seconds a notification waits for its alert's analysis before being sent without it
+}
+
+# Incident Prediction
+PREDICTION = {
+    "interval": 300,             # Seconds between prediction rounds
+    "threshold": 0.7,            # Incident probability that raises a prediction alert
+    "score_bucket": 30,          # Seconds prediction scores are reused for one model version
+    "n_estimators": 100,
+    "n_jobs": -1,                # Cores used to fit the forest (-1: all)
+    "training_processes": 1,     # Worker processes for model training
+    "online": True,              # Add trees for new windows instead of retraining from scratch
+    "update_windows": 200,       # New labelled windows that trigger a model update
+    "trees_per_update": 10,      # Trees fitted on just the new windows per update
+    "max_trees": 200,            # Oldest trees are dropped past this many
+    "drift_threshold": 0.5,      # Feature mean shift (in training std devs) that forces a full retrain
+    "checkpoint_dir": "data/models",
+    "checkpoints_kept": 3
 }
 
 # Demo Data Generation
@@ -106,9 +211,47 @@ DEMO_SETTINGS = {
     }
 }
 
+# Synthetic Load Generation
+LOAD_GENERATOR = {
+    "requests_per_second": 50,       # Mean rate over a day, across all services
+    "bin_seconds": 1,                # Resolution of the load curve
+    "diurnal_amplitude": 0.5,        # Swing of the daily curve around its mean
+    "peak_hour": 15,                 # UTC hour of peak traffic
+    "business_hours_boost": 0.3,     # Extra load during MONITORING business hours
+    "latency_sigma": 0.35,           # Log-normal spread of response times
+    "load_latency_factor": 0.3,      # Relative latency increase per unit of load above the mean
+    "base_error_ratio": 0.3,         # Steady error rate as a fraction of each service's error_threshold
+    "client_error_rate": 0.03,       # 4xx responses (not counted as errors)
+    "method_weights": [0.6, 0.25, 0.1, 0.05],  # Matches DEMO_SETTINGS["http_methods"]
+    "environment_weights": [0.9, 0.1]           # Matches DEMO_SETTINGS["environments"]
+}
+
+# Incident scenarios injected by the load generator; start is a fraction of
+# the generated window, duration is in seconds
+INCIDENT_SCENARIOS = {
+    "latency_spike": [
+        {"kind": "latency", "service": "order-service", "start": 0.6, "duration": 600, "magnitude": 6}
+    ],
+    "error_burst": [
+        {"kind": "errors", "service": "auth-service", "start": 0.7, "duration": 300, "magnitude": 0.4}
+    ],
+    "outage": [
+        {"kind": "outage", "service": "product-service", "start": 0.8, "duration": 180}
+    ],
+    "traffic_surge": [
+        {"kind": "traffic", "service": "api-gateway", "start": 0.4, "duration": 900, "magnitude": 4},
+        {"kind": "latency", "service": "api-gateway", "start": 0.4, "duration": 900, "magnitude": 2}
+    ],
+    "slow_endpoint": [
+        {"kind": "latency", "service": "user-service", "endpoint": "/preferences",
+         "start": 0.5, "duration": 1200, "magnitude": 10}
+    ]
+}
+
 # Database Settings
 DATABASE = {
-    "type": "in-memory",     # or "mongodb"
+    "type": "in-memory",     # or "segments" to persist logs in hourly files
+    "data_dir": "data/segments",
     "mongodb_uri": "mongodb://localhost:27017",
     "database_name": "api_monitor"
 }
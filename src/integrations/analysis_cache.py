@@ -0,0 +1,257 @@
+"""
+Caching, request coalescing and spend limits in front of OpenAIAnalyzer
+"""
+import asyncio
+import hashlib
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from src.config.external_services import OPENAI_CONFIG
+from src.integrations.openai_analyzer import OpenAIAnalyzer, latest
+
+
+def fingerprint(metrics: Dict, alerts: List[Dict]) -> str:
+    """Key that is equal for nearly identical analysis inputs
+
+    Metrics are quantized (latency and request rate to ~10% steps, error
+    rate to half a percentage point) and alerts are reduced to the set of
+    conditions they report, ignoring timestamps and the exact values in
+    their messages.
+    """
+    values = latest(metrics)
+    key = {
+        "response_time": _log_step(values["response_time"]),
+        "request_rate": _log_step(values["request_rate"]),
+        "error_rate": round(values["error_rate"] * 2),
+        "alerts": sorted(
+            [str(alert.get("service")), str(alert.get("endpoint")), str(alert.get("rule") or alert.get("title")),
+             str(alert.get("severity"))]
+            for alert in alerts[-5:]
+        )
+    }
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def _log_step(value: float) -> int:
+    return int(round(math.log(value) / math.log(1.1))) if value > 0 else -1
+
+
+class AnalysisCache:
+    """LRU cache of analyses that expire after ttl seconds
+
+    Expired entries are kept (until evicted) so they can still stand in when
+    the budget is exhausted.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str, allow_stale: bool = False) -> Optional[Dict]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        stored, analysis = entry
+        if not allow_stale and time.monotonic() - stored > self.ttl:
+            return None
+        self.entries.move_to_end(key)
+        return analysis
+
+    def put(self, key: str, analysis: Dict):
+        self.entries[key] = (time.monotonic(), analysis)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+class TokenBudget:
+    """Tokens spent over the last minute, against a per-minute limit"""
+
+    def __init__(self, tokens_per_minute: int):
+        self.tokens_per_minute = tokens_per_minute
+        self.spent = deque()
+        self.total = 0
+
+    def used(self) -> int:
+        cutoff = time.monotonic() - 60
+        while self.spent and self.spent[0][0] < cutoff:
+            self.total -= self.spent.popleft()[1]
+        return self.total
+
+    def reserve(self, tokens: int) -> bool:
+        """Take tokens from the budget if they fit"""
+        if self.used() + tokens > self.tokens_per_minute:
+            return False
+        self.spent.append((time.monotonic(), tokens))
+        self.total += tokens
+        return True
+
+    def adjust(self, reserved: int, actual: int):
+        """Replace a reservation's estimate by the tokens actually used"""
+        self.spent.append((time.monotonic(), actual - reserved))
+        self.total += actual - reserved
+
+
+class CachedAnalyzer:
+    """OpenAIAnalyzer behind a fingerprint cache, single-flight calls and a token budget
+
+    A cache hit returns the stored analysis. Concurrent misses with the same
+    fingerprint share one model call. When a call would exceed the per-minute
+    token budget, the last analysis for the fingerprint (even if expired) or
+    a rule-based analysis is returned instead.
+    """
+
+    def __init__(self, analyzer: OpenAIAnalyzer, ttl: float = None, max_entries: int = None,
+                 tokens_per_minute: int = None):
+        self.analyzer = analyzer
+        self.cache = AnalysisCache(ttl or OPENAI_CONFIG["cache_ttl"], max_entries or OPENAI_CONFIG["cache_size"])
+        # The cost limit is converted to tokens; the tighter of the two applies
+        affordable = int(OPENAI_CONFIG["max_cost_per_minute"] / OPENAI_CONFIG["cost_per_1k_tokens"] * 1000)
+        self.budget = TokenBudget(min(tokens_per_minute or OPENAI_CONFIG["tokens_per_minute"], affordable))
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            "requests": 0, "hits": 0, "coalesced": 0, "calls": 0, "errors": 0,
+            "budget_fallbacks": 0, "tokens": 0, "call_seconds": 0.0, "saved_seconds": 0.0
+        }
+
+    async def analyze_metrics(self, metrics: Dict, alerts: List[Dict]) -> Dict:
+        """Same contract as OpenAIAnalyzer.analyze_metrics"""
+        self.stats["requests"] += 1
+        key = fingerprint(metrics, alerts)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            self.stats["saved_seconds"] += self._mean_call_seconds()
+            return cached
+
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            self.stats["saved_seconds"] += self._mean_call_seconds()
+            return await asyncio.shield(pending)
+
+        # Estimate the prompt at ~4 characters per token plus the longest completion
+        estimate = len(self.analyzer._prepare_analysis_context(metrics, alerts)) // 4 + self.analyzer.max_tokens
+        if not self.budget.reserve(estimate):
+            self.stats["budget_fallbacks"] += 1
+            return self.cache.get(key, allow_stale=True) or self.analyzer.rule_based_analysis(metrics, alerts)
+
+        pending = asyncio.get_running_loop().create_task(self._call(key, metrics, alerts, estimate))
+        self.inflight[key] = pending
+        return await asyncio.shield(pending)
+
+    async def analyze_alerts(self, alerts: List[Dict]) -> List[Dict]:
+        """Analyses for several alerts, calling the model once for all cache misses
+
+        Alerts with the same fingerprint share one analysis, and fingerprints
+        already being analyzed wait for that call instead of paying for
+        another, as in analyze_metrics.
+        """
+        self.stats["requests"] += len(alerts)
+        keys = [fingerprint(alert.get("metrics") or {}, [alert]) for alert in alerts]
+        found = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: Dict[str, Dict] = {}
+        for key, alert in zip(keys, alerts):
+            if key in found or key in waiting or key in missing:
+                self.stats["coalesced"] += 1
+                self.stats["saved_seconds"] += self._mean_call_seconds()
+                continue
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.stats["hits"] += 1
+                self.stats["saved_seconds"] += self._mean_call_seconds()
+                found[key] = cached
+            elif key in self.inflight:
+                self.stats["coalesced"] += 1
+                self.stats["saved_seconds"] += self._mean_call_seconds()
+                waiting[key] = self.inflight[key]
+            else:
+                missing[key] = alert
+
+        if missing:
+            estimate = sum(
+                len(self.analyzer._prepare_analysis_context(alert.get("metrics") or {}, [alert])) // 4
+                for alert in missing.values()
+            ) + self.analyzer.max_tokens
+            if self.budget.reserve(estimate):
+                loop = asyncio.get_running_loop()
+                for key in missing:
+                    self.inflight[key] = loop.create_future()
+                call = loop.create_task(self._call_batch(missing, estimate))
+                found.update(await asyncio.shield(call))
+            else:
+                self.stats["budget_fallbacks"] += len(missing)
+                for key, alert in missing.items():
+                    found[key] = (self.cache.get(key, allow_stale=True)
+                                  or self.analyzer.rule_based_analysis(alert.get("metrics") or {}, [alert]))
+        for key, pending in waiting.items():
+            found[key] = await asyncio.shield(pending)
+        return [found[key] for key in keys]
+
+    async def _call_batch(self, batch: Dict[str, Dict], estimate: int) -> Dict[str, Dict]:
+        """One model call for the alerts in batch (by fingerprint), resolving their inflight futures"""
+        try:
+            start = time.perf_counter()
+            analyses = dict(zip(batch, await self.analyzer.analyze_alerts(list(batch.values()))))
+            self.stats["calls"] += 1
+            self.stats["call_seconds"] += time.perf_counter() - start
+            tokens = sum(analysis.get("tokens") or 0 for analysis in analyses.values()) or estimate
+            self.budget.adjust(estimate, tokens)
+            self.stats["tokens"] += tokens
+            for key, analysis in analyses.items():
+                if "error" in analysis:
+                    self.stats["errors"] += 1
+                else:
+                    self.cache.put(key, analysis)
+                self.inflight[key].set_result(analysis)
+            return analyses
+        except Exception as e:
+            for key in batch:
+                future = self.inflight[key]
+                future.set_exception(e)
+                # Marks it retrieved: the batch's own caller reports the error
+                future.exception()
+            raise
+        finally:
+            for key in batch:
+                del self.inflight[key]
+
+    async def _call(self, key: str, metrics: Dict, alerts: List[Dict], estimate: int) -> Dict:
+        try:
+            start = time.perf_counter()
+            analysis = await self.analyzer.analyze_metrics(metrics, alerts)
+            self.stats["calls"] += 1
+            self.stats["call_seconds"] += time.perf_counter() - start
+            tokens = analysis.get("tokens")
+            self.budget.adjust(estimate, tokens if tokens is not None else estimate)
+            self.stats["tokens"] += tokens if tokens is not None else estimate
+            # Failed calls are not cached so the next request tries again
+            if "error" in analysis:
+                self.stats["errors"] += 1
+            else:
+                self.cache.put(key, analysis)
+            return analysis
+        finally:
+            del self.inflight[key]
+
+    def rule_based_analysis(self, metrics: Dict, alerts: List[Dict]) -> Dict:
+        return self.analyzer.rule_based_analysis(metrics, alerts)
+
+    def _mean_call_seconds(self) -> float:
+        return self.stats["call_seconds"] / self.stats["calls"] if self.stats["calls"] else 0.0
+
+    def get_stats(self) -> Dict:
+        requests = self.stats["requests"]
+        return {
+            **self.stats,
+            "hit_rate": (self.stats["hits"] + self.stats["coalesced"]) / requests if requests else 0.0,
+            "mean_call_seconds": self._mean_call_seconds(),
+            "tokens_last_minute": self.budget.used(),
+            "tokens_per_minute": self.budget.tokens_per_minute,
+            "cost": self.stats["tokens"] / 1000 * OPENAI_CONFIG["cost_per_1k_tokens"],
+            "cache_entries": len(self.cache.entries)
+        }
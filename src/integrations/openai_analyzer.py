@@ -1,10 +1,16 @@
-from typing import List, Dict
+import re
+from typing import AsyncIterator, List, Dict, Optional
+import httpx
 from openai import AsyncOpenAI
 from datetime import datetime, timedelta
 
 class OpenAIAnalyzer:
-    def __init__(self, api_key: str):
-        self.client = AsyncOpenAI(api_key=api_key)
+    def __init__(self, api_key: str, base_url: str = None):
+        # An explicit HTTP client keeps the SDK independent of the installed httpx's defaults
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url,
+                                  http_client=httpx.AsyncClient(timeout=httpx.Timeout(60.0, connect=5.0)))
+        self.model = "gpt-4-turbo-preview"
+        self.max_tokens = 1000
         self.system_prompt = """You are an AI system monitoring expert. Analyze the provided metrics and alerts to:
 1. Identify potential issues and their root causes
 2. Suggest actionable solutions
@@ -20,13 +26,13 @@ Format your response in a clear, concise manner."""
             
             # Call OpenAI API
             response = await self.client.chat.completions.create(
-                model="gpt-4-turbo-preview",
+                model=self.model,
                 messages=[
                     {"role": "system", "content": self.system_prompt},
                     {"role": "user", "content": context}
                 ],
                 temperature=0.7,
-                max_tokens=1000
+                max_tokens=self.max_tokens
             )
             
             # Extract and return the analysis
@@ -37,7 +43,8 @@ Format your response in a clear, concise manner."""
                 "timestamp": datetime.utcnow().isoformat(),
                 "analysis": analysis,
                 "recommendations": self._extract_recommendations(analysis),
-                "severity": self._determine_severity(metrics, alerts)
+                "severity": self._determine_severity(metrics, alerts),
+                "tokens": response.usage.total_tokens if response.usage else None
             }
         
         except Exception as e:
@@ -49,14 +56,131 @@ Format your response in a clear, concise manner."""
                 "severity": "warning"
             }
 
+    async def stream_analysis(self, metrics: Dict, alerts: List[Dict]) -> AsyncIterator[Dict]:
+        """Analyze metrics and alerts, yielding frames as the completion streams in
+
+        The first frame carries the locally computed severity, before the model
+        is called. Then come "token" frames with each piece of text,
+        "recommendation" frames as soon as a line holding one is complete, and
+        a final "done" frame (or "error").
+        """
+        severity = self._determine_severity(metrics, alerts)
+        yield {"type": "severity", "severity": severity, "timestamp": datetime.utcnow().isoformat()}
+
+        analysis = ""
+        line = ""
+        recommendations = []
+        try:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": self._prepare_analysis_context(metrics, alerts)}
+                ],
+                temperature=0.7,
+                max_tokens=self.max_tokens,
+                stream=True
+            )
+            async for chunk in stream:
+                content = chunk.choices[0].delta.content if chunk.choices else None
+                if not content:
+                    continue
+                analysis += content
+                yield {"type": "token", "content": content}
+                # Only complete lines are checked for recommendations
+                *complete, line = (line + content).split("\n")
+                for text in complete:
+                    recommendation = _recommendation(text)
+                    if recommendation:
+                        recommendations.append(recommendation)
+                        yield {"type": "recommendation", "recommendation": recommendation}
+            recommendation = _recommendation(line)
+            if recommendation:
+                recommendations.append(recommendation)
+                yield {"type": "recommendation", "recommendation": recommendation}
+            yield {
+                "type": "done",
+                "timestamp": datetime.utcnow().isoformat(),
+                "analysis": analysis,
+                "recommendations": recommendations,
+                "severity": severity
+            }
+
+        except Exception as e:
+            yield {"type": "error", "error": str(e), "analysis": analysis, "recommendations": recommendations}
+
+    async def analyze_alerts(self, alerts: List[Dict]) -> List[Dict]:
+        """Analyze several alerts with a single completion; one result per alert, in order"""
+        try:
+            sections = "\n\n".join(
+                f"Alert {i}: {alert['title']} ({alert['severity']})\n{alert['message']}\n"
+                + self._prepare_analysis_context(alert.get("metrics") or {}, [alert])
+                for i, alert in enumerate(alerts, 1)
+            )
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": self.system_prompt},
+                    {"role": "user", "content": (
+                        f"{sections}\n\nAnswer for each alert separately, starting each answer "
+                        f"with a line 'Alert <number>:'."
+                    )}
+                ],
+                temperature=0.7,
+                max_tokens=self.max_tokens
+            )
+            analysis = response.choices[0].message.content
+            answers = _split_answers(analysis, len(alerts))
+            tokens = response.usage.total_tokens if response.usage else None
+            return [
+                {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "analysis": answer,
+                    "recommendations": self._extract_recommendations(answer),
+                    "severity": self._determine_severity(alert.get("metrics") or {}, [alert]),
+                    # The call's tokens, shared out over the alerts it covered
+                    "tokens": tokens // len(alerts) if tokens is not None else None
+                }
+                for alert, answer in zip(alerts, answers)
+            ]
+
+        except Exception as e:
+            return [
+                {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "error": str(e),
+                    "analysis": "Failed to generate analysis",
+                    "recommendations": [],
+                    "severity": "warning"
+                }
+                for _ in alerts
+            ]
+
+    def rule_based_analysis(self, metrics: Dict, alerts: List[Dict]) -> Dict:
+        """Analysis from the thresholds alone, used when the model cannot be called"""
+        latest_metrics = latest(metrics)
+        severity = self._determine_severity(metrics, alerts)
+        recommendations = []
+        if latest_metrics["error_rate"] > 5:
+            recommendations.append("Consider checking recent deployments and downstream dependencies for errors")
+        if latest_metrics["response_time"] > 500:
+            recommendations.append("Consider scaling the slowest services or reviewing slow queries")
+        return {
+            "timestamp": datetime.utcnow().isoformat(),
+            "analysis": (
+                f"Rule-based analysis: response time {latest_metrics['response_time']:.0f}ms, "
+                f"error rate {latest_metrics['error_rate']:.2f}%, "
+                f"request rate {latest_metrics['request_rate']:.0f}/min, {len(alerts)} recent alerts"
+            ),
+            "recommendations": recommendations,
+            "severity": severity,
+            "source": "rules"
+        }
+
     def _prepare_analysis_context(self, metrics: Dict, alerts: List[Dict]) -> str:
         """Prepare context string for OpenAI analysis"""
         # Get the latest metrics
-        latest_metrics = {
-            "response_time": metrics["response_times"][-1] if metrics["response_times"] else 0,
-            "error_rate": metrics["error_rates"][-1] if metrics["error_rates"] else 0,
-            "request_rate": metrics["request_rate"]
-        }
+        latest_metrics = latest(metrics)
         
         # Format alerts
         recent_alerts = "\n".join([
@@ -85,21 +209,20 @@ Please analyze these metrics and alerts to:
         
         # Split analysis into lines and look for actionable items
         for line in analysis.split('\n'):
-            if any(keyword in line.lower() for keyword in ['recommend', 'should', 'suggest', 'consider', 'try']):
-                # Clean up the recommendation
-                recommendation = line.strip('- ').strip()
-                if recommendation:
-                    recommendations.append(recommendation)
+            recommendation = _recommendation(line)
+            if recommendation:
+                recommendations.append(recommendation)
         
         return recommendations
 
     def _determine_severity(self, metrics: Dict, alerts: List[Dict]) -> str:
         """Determine the overall severity based on metrics and alerts"""
-        if not metrics["error_rates"] or not metrics["response_times"]:
+        latest_metrics = latest(metrics)
+        if latest_metrics["count"] == 0:
             return "info"
             
-        latest_error_rate = metrics["error_rates"][-1]
-        latest_response_time = metrics["response_times"][-1]
+        latest_error_rate = latest_metrics["error_rate"]
+        latest_response_time = latest_metrics["response_time"]
         
         # Check for critical conditions
         if latest_error_rate > 10 or latest_response_time > 1000:
@@ -109,3 +232,41 @@ Please analyze these metrics and alerts to:
             return "warning"
         # Everything looks good
         return "info"
+
+
+def _recommendation(line: str) -> Optional[str]:
+    """The actionable item in a line of analysis, if it holds one"""
+    if any(keyword in line.lower() for keyword in ['recommend', 'should', 'suggest', 'consider', 'try']):
+        # Clean up the recommendation
+        return line.strip('- ').strip() or None
+    return None
+
+
+def _split_answers(analysis: str, count: int) -> List[str]:
+    """Split a batched completion on its 'Alert <n>:' lines; alerts without an answer get the whole text"""
+    answers = {}
+    parts = re.split(r"^\W*Alert (\d+)\W*:?", analysis, flags=re.MULTILINE)
+    for number, text in zip(parts[1::2], parts[2::2]):
+        answers.setdefault(int(number), text.strip())
+    return [answers.get(i) or analysis.strip() for i in range(1, count + 1)]
+
+
+def latest(metrics: Dict) -> Dict:
+    """Latest response time (ms), error rate (%) and request rate (/min)
+
+    Accepts either metric lists (response_times, error_rates, request_rate)
+    or an alert's window summary (mean, error_ratio, rate per second, count).
+    """
+    if "response_times" in metrics:
+        return {
+            "response_time": metrics["response_times"][-1] if metrics["response_times"] else 0,
+            "error_rate": metrics["error_rates"][-1] if metrics["error_rates"] else 0,
+            "request_rate": metrics.get("request_rate", 0),
+            "count": min(len(metrics["response_times"]), len(metrics["error_rates"]))
+        }
+    return {
+        "response_time": metrics.get("mean", 0),
+        "error_rate": metrics.get("error_ratio", 0) * 100,
+        "request_rate": metrics.get("rate", 0) * 60,
+        "count": metrics.get("count", 0)
+    }
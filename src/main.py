@@ -1,9 +1,10 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
 import os
+import json
 from dotenv import load_dotenv
 from typing import Dict, List
 from integrations.openai_analyzer import OpenAIAnalyzer
@@ -29,14 +30,22 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="src/static"), name="static")
 
 # Initialize OpenAI analyzer
-openai_analyzer = OpenAIAnalyzer(os.getenv("OPENAI_API_KEY"))
+openai_analyzer = OpenAIAnalyzer(os.getenv("OPENAI_API_KEY"), os.getenv("OPENAI_BASE_URL"))
 
 @app.get("/")
 async def root():
     return FileResponse('src/static/index.html')
 
 @app.post("/analyze")
-async def analyze_data(metrics: Dict, alerts: List[Dict]):
+async def analyze_data(metrics: Dict, alerts: List[Dict], stream: bool = False):
+    if stream:
+        # Server-sent events: severity first, then tokens and recommendations as they arrive
+        async def frames():
+            async for frame in openai_analyzer.stream_analysis(metrics, alerts):
+                yield f"event: {frame['type']}\ndata: {json.dumps(frame)}\n\n"
+
+        return StreamingResponse(frames(), media_type="text/event-stream",
+                                 headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
     try:
         # Call OpenAI analyzer
         analysis = await openai_analyzer.analyze_metrics(metrics, alerts)
@@ -0,0 +1,127 @@
+"""
+Compact on-disk checkpoints of incident models, loaded through memory mapping
+"""
+import json
+import os
+import re
+import shutil
+from typing import Dict, List, Optional
+import numpy as np
+from src.config.settings import PREDICTION
+
+NODE_ARRAYS = ["roots", "left", "right", "feature", "threshold", "proba"]
+CHECKPOINT_NAME = re.compile(r"^model-(\d+)$")
+
+
+class FlatForest:
+    """A random forest classifier flattened into node arrays
+
+    The nodes of every tree share one set of arrays: children as global node
+    indexes (-1 at leaves), the split feature, the split threshold as float32
+    and each node's class probabilities. Scoring walks every tree for every
+    row at once, one tree level per step, and matches the forest's
+    predict_proba up to float32 rounding of the leaf probabilities.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], classes: np.ndarray):
+        self.arrays = arrays
+        self.classes_ = classes
+
+    @classmethod
+    def from_forest(cls, model) -> "FlatForest":
+        trees = [estimator.tree_ for estimator in model.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        left = np.concatenate([tree.children_left for tree in trees])
+        right = np.concatenate([tree.children_right for tree in trees])
+        leaves = left < 0
+        shift = np.repeat(offsets, [tree.node_count for tree in trees])
+
+        # sklearn compares float32 features against float64 thresholds; for a
+        # float32 x, x <= t exactly when x <= the largest float32 not above t
+        threshold = np.concatenate([tree.threshold for tree in trees])
+        threshold32 = threshold.astype(np.float32)
+        above = threshold32 > threshold
+        threshold32[above] = np.nextafter(threshold32[above], np.float32(-np.inf))
+
+        values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+        return cls({
+            "roots": offsets.astype(np.int32),
+            "left": np.where(leaves, -1, left + shift).astype(np.int32),
+            "right": np.where(leaves, -1, right + shift).astype(np.int32),
+            "feature": np.where(leaves, 0, np.concatenate([tree.feature for tree in trees])).astype(np.int16),
+            "threshold": threshold32,
+            "proba": (values / values.sum(axis=1, keepdims=True)).astype(np.float32)
+        }, np.asarray(model.classes_))
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.arrays["roots"])
+
+    def predict_proba(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        left, right = self.arrays["left"], self.arrays["right"]
+        feature, threshold = self.arrays["feature"], self.arrays["threshold"]
+        # One entry per (row, tree); only those not yet at a leaf move down a level
+        nodes = np.tile(np.asarray(self.arrays["roots"]), len(X))
+        rows = np.repeat(np.arange(len(X)), self.n_trees)
+        active = np.arange(len(nodes))
+        while len(active):
+            current = nodes[active]
+            children = left[current]
+            inner = children >= 0
+            active, current, children = active[inner], current[inner], children[inner]
+            go_left = X[rows[active], feature[current]] <= threshold[current]
+            nodes[active] = np.where(go_left, children, right[current])
+        return self.arrays["proba"][nodes].reshape(len(X), self.n_trees, -1).mean(axis=1, dtype=np.float64)
+
+
+def save_checkpoint(model, meta: Dict, directory: str = None, keep: int = None) -> str:
+    """Write model and its metadata as model-<version>, keeping the newest keep checkpoints
+
+    The checkpoint is written under a temporary name and renamed into
+    place, so readers only ever see complete checkpoints.
+    """
+    directory = directory or PREDICTION["checkpoint_dir"]
+    keep = keep or PREDICTION["checkpoints_kept"]
+    flat = model if isinstance(model, FlatForest) else FlatForest.from_forest(model)
+    path = os.path.join(directory, f"model-{meta['version']:08d}")
+    staging = path + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in NODE_ARRAYS:
+        np.save(os.path.join(staging, f"{name}.npy"), flat.arrays[name])
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump({**meta, "classes": flat.classes_.tolist(), "trees": flat.n_trees}, f)
+    shutil.rmtree(path, ignore_errors=True)
+    os.rename(staging, path)
+
+    for name in _checkpoints(directory)[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+    return path
+
+
+def load_checkpoint(directory: str = None) -> Optional[tuple]:
+    """The newest readable checkpoint as (FlatForest, meta), or None
+
+    Node arrays are memory mapped, so loading does not depend on the
+    model's size; pages are read as scoring touches them.
+    """
+    directory = directory or PREDICTION["checkpoint_dir"]
+    for name in reversed(_checkpoints(directory)):
+        path = os.path.join(directory, name)
+        try:
+            with open(os.path.join(path, "meta.json")) as f:
+                meta = json.load(f)
+            arrays = {array: np.load(os.path.join(path, f"{array}.npy"), mmap_mode="r") for array in NODE_ARRAYS}
+            return FlatForest(arrays, np.array(meta["classes"])), meta
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Skipping model checkpoint {path}: {e}")
+    return None
+
+
+def _checkpoints(directory: str) -> List[str]:
+    """Checkpoint names in directory, oldest version first"""
+    if not os.path.isdir(directory):
+        return []
+    names = [name for name in os.listdir(directory) if CHECKPOINT_NAME.match(name)]
+    return sorted(names, key=lambda name: int(CHECKPOINT_NAME.match(name).group(1)))
@@ -1,107 +1,284 @@
 import asyncio
+import time
 import numpy as np
 from typing import Dict, List
-from sklearn.ensemble import RandomForestRegressor
+from numpy.lib.stride_tricks import sliding_window_view
 from datetime import datetime, timedelta
-from src.storage.database import Database
+from src.config.settings import PREDICTION
+from src.storage.database import Database, get_database
 from src.alerts.alert_manager import AlertManager
+from src.predictors.checkpoint import FlatForest, load_checkpoint, save_checkpoint
+from src.predictors.training import ModelTrainer
+
+# Measurements per feature row, and the per-bucket series they are taken from
+FEATURE_WINDOW = 5
+FEATURE_METRICS = ["response_times", "error_rates", "request_rates"]
+
+
+def window_features(columns: np.ndarray) -> np.ndarray:
+    """One row per FEATURE_WINDOW consecutive rows of columns, flattened oldest first
+
+    columns has one row per bucket and one column per metric, so row i of the
+    result is columns[i], columns[i + 1], ... concatenated.
+    """
+    windows = sliding_window_view(columns, FEATURE_WINDOW, axis=0)
+    return windows.transpose(0, 2, 1).reshape(len(windows), -1)
+
+
+def incident_probability(model, X) -> np.ndarray:
+    """Probability of an incident for each row of X"""
+    classes = list(model.classes_)
+    if 1 not in classes:
+        # Trained on a history without incidents
+        return np.zeros(len(X))
+    return model.predict_proba(X)[:, classes.index(1)]
+
+
+
+def last_target(data: Dict) -> float:
+    """Timestamp of the newest bucket _prepare_training_data uses as a target"""
+    return max(
+        (float(metrics["timestamps"][-2]) for metrics in data.values() if len(metrics["timestamps"]) > FEATURE_WINDOW + 1),
+        default=None
+    )
+
+
+def feature_drift(stats: Dict, X: np.ndarray) -> float:
+    """Largest shift of a feature's mean in X from the training data, in training standard deviations"""
+    std = np.where(stats["std"] > 0, stats["std"], 1.0)
+    return float(np.max(np.abs(X.mean(axis=0) - stats["mean"]) / std))
+
 
 class Predictor:
-    def __init__(self):
-        self.db = Database()
-        self.alert_manager = AlertManager()
-        self.model = RandomForestRegressor(n_estimators=100)
+    def __init__(self, db: Database = None, alert_manager: AlertManager = None, checkpoint_dir: str = None):
+        self.db = db or get_database()
+        self.alert_manager = alert_manager or AlertManager(self.db)
+        self.trainer = ModelTrainer()
+        self.checkpoint_dir = checkpoint_dir or PREDICTION["checkpoint_dir"]
+        # The model and its version are replaced together, never modified in place
+        self.current = {"version": 0, "model": None, "trained_at": None, "samples": 0}
+        self.training = None
+        self.saving = None
+        self._load_checkpoint()
+        self.stats = {"fits": 0, "updates": 0, "deferred_updates": 0, "drift_retrains": 0, "training_seconds": 0.0,
+                      "scored": 0, "score_hits": 0}
+        self.scores = None
         self.running = False
         self.prediction_window = 3600  # 1 hour prediction window
 
     async def start(self):
         """Start the prediction process"""
         self.running = True
-        await self._train_initial_model()
+        self.retrain()
         asyncio.create_task(self._predict_issues())
 
     async def stop(self):
         """Stop the prediction process"""
         self.running = False
+        self.trainer.shutdown()
+        if self.saving is not None:
+            await self.saving
+
+    def _load_checkpoint(self):
+        """Serve the newest checkpointed model until a new one is trained"""
+        loaded = load_checkpoint(self.checkpoint_dir)
+        if loaded is None:
+            return
+        model, meta = loaded
+        self.current = {
+            "version": meta["version"],
+            "model": model,
+            "trained_at": datetime.fromisoformat(meta["trained_at"]),
+            "trained_until": meta["trained_until"],
+            "samples": meta["samples"],
+            "feature_stats": {name: np.array(values) for name, values in meta["feature_stats"].items()}
+        }
+
+    def retrain(self, full: bool = True) -> asyncio.Task:
+        """Train (or with full=False, update) the model in the background, unless training is already running"""
+        if self.training is None or self.training.done():
+            self.training = asyncio.create_task(self._train_initial_model() if full else self._update_model())
+        return self.training
 
     async def _train_initial_model(self):
-        """Train the initial prediction model using historical data"""
-        historical_data = await self.db.get_historical_metrics()
-        X, y = self._prepare_training_data(historical_data)
-        if len(X) > 0:
-            self.model.fit(X, y)
-
-    def _prepare_training_data(self, data: Dict) -> tuple:
-        """Prepare training data from historical metrics"""
+        """Train a prediction model on historical data in a worker process and publish it"""
+        try:
+            historical_data = await self.db.get_historical_series()
+            X, y = await asyncio.to_thread(self._prepare_training_data, historical_data)
+            if len(X) == 0:
+                return
+            started = time.perf_counter()
+            model = await self.trainer.fit(X, y)
+            self.stats["fits"] += 1
+            self.stats["training_seconds"] += time.perf_counter() - started
+            self._publish(model, last_target(historical_data), len(X), {"mean": X.mean(axis=0), "std": X.std(axis=0)})
+        except Exception as e:
+            print(f"Error training prediction model: {e}")
+
+    async def _update_model(self):
+        """Bring the model up to date with the windows stored since it was trained
+
+        Nothing happens until update_windows new windows have accumulated.
+        Then, in online mode, trees fitted on just those windows are added to
+        the forest. While the new windows lack one of the model's classes
+        (e.g. no incidents yet), the update is deferred and windows keep
+        accumulating. A full retrain happens instead in batch mode, when the
+        new windows' features drifted from the full fit's training data, or
+        when they hold a class the model has never seen.
+        """
+        current = self.current
+        # A model loaded from a checkpoint cannot grow trees; replace it with a full fit
+        if current["model"] is None or isinstance(current["model"], FlatForest):
+            await self._train_initial_model()
+            return
+        try:
+            historical_data = await self.db.get_historical_series()
+            X, y = await asyncio.to_thread(self._prepare_training_data, historical_data, current["trained_until"])
+            if len(X) < PREDICTION["update_windows"]:
+                return
+            drifted = feature_drift(current["feature_stats"], X) > PREDICTION["drift_threshold"]
+            classes = set(np.unique(y).tolist())
+            known = set(current["model"].classes_.tolist())
+            if not PREDICTION["online"] or drifted or not classes <= known:
+                self.stats["drift_retrains"] += drifted
+                await self._train_initial_model()
+                return
+            if classes != known:
+                # Trees fitted without one of the classes cannot join the forest
+                self.stats["deferred_updates"] += 1
+                return
+            started = time.perf_counter()
+            model = await self.trainer.extend(current["model"], X, y)
+            self.stats["updates"] += 1
+            self.stats["training_seconds"] += time.perf_counter() - started
+            self._publish(model, last_target(historical_data), current["samples"] + len(X), current["feature_stats"])
+        except Exception as e:
+            print(f"Error updating prediction model: {e}")
+
+    def _publish(self, model, trained_until: float, samples: int, feature_stats: Dict):
+        self.current = {
+            "version": self.current["version"] + 1,
+            "model": model,
+            "trained_at": datetime.utcnow(),
+            "trained_until": trained_until,
+            "samples": samples,
+            "feature_stats": feature_stats
+        }
+        self.saving = asyncio.create_task(self._save_checkpoint(self.current))
+
+    async def _save_checkpoint(self, current: Dict):
+        meta = {
+            "version": current["version"],
+            "trained_at": current["trained_at"].isoformat(),
+            "trained_until": current["trained_until"],
+            "samples": current["samples"],
+            "feature_stats": {name: values.tolist() for name, values in current["feature_stats"].items()}
+        }
+        try:
+            await asyncio.to_thread(save_checkpoint, current["model"], meta, self.checkpoint_dir)
+        except Exception as e:
+            print(f"Error saving model checkpoint: {e}")
+
+    def _prepare_training_data(self, data: Dict, since: float = None) -> tuple:
+        """Prepare training data from historical metrics
+
+        Each row holds the last FEATURE_WINDOW measurements of response time,
+        error rate and load; the target is whether the following bucket had
+        an incident. Series may be lists or numpy arrays. With since (epoch
+        seconds), only windows whose target bucket is newer are built.
+        """
         X = []
         y = []
-        
+
         for service, metrics in data.items():
-            for i in range(len(metrics["timestamps"]) - 6):
-                # Features: last 5 measurements of response time, error rate, and load
-                feature_vector = []
-                for j in range(5):
-                    feature_vector.extend([
-                        metrics["response_times"][i + j],
-                        metrics["error_rates"][i + j],
-                        metrics["request_rates"][i + j]
-                    ])
-                X.append(feature_vector)
-                
-                # Target: whether an incident occurred in next hour
-                y.append(1 if any(metrics["incidents"][i+5:i+6]) else 0)
-        
-        return np.array(X), np.array(y)
+            n_windows = len(metrics["timestamps"]) - FEATURE_WINDOW - 1
+            if n_windows <= 0:
+                continue
+            first = 0
+            if since is not None:
+                targets = np.asarray(metrics["timestamps"][FEATURE_WINDOW:FEATURE_WINDOW + n_windows])
+                first = int(np.searchsorted(targets, since, side="right"))
+                if first == n_windows:
+                    continue
+            columns = np.column_stack([
+                np.asarray(metrics[m][first:n_windows + FEATURE_WINDOW - 1], dtype=np.float64) for m in FEATURE_METRICS
+            ])
+            X.append(window_features(columns))
+            y.append(np.asarray(metrics["incidents"][FEATURE_WINDOW + first:FEATURE_WINDOW + n_windows]) != 0)
+
+        if not X:
+            return np.empty((0, FEATURE_WINDOW * len(FEATURE_METRICS))), np.empty(0, dtype=int)
+        return np.concatenate(X), np.concatenate(y).astype(int)
 
     async def _predict_issues(self):
         """Continuously predict potential issues"""
         while self.running:
             try:
-                current_metrics = await self.db.get_recent_metrics()
-                predictions = self._make_predictions(current_metrics)
+                predictions = self._make_predictions(await self.get_scores())
                 await self._handle_predictions(predictions)
                 
-                # Retrain model periodically with new data
-                if datetime.now().minute == 0:  # Retrain every hour
-                    await self._train_initial_model()
+                # Feed the windows stored since the last fit to the model
+                self.retrain(full=False)
                     
             except Exception as e:
                 print(f"Error in prediction: {e}")
             
-            await asyncio.sleep(300)  # Predict every 5 minutes
+            await asyncio.sleep(PREDICTION["interval"])
+
+    async def get_scores(self) -> Dict:
+        """Incident probability of every service under the current model
 
-    def _make_predictions(self, current_metrics: Dict) -> List[Dict]:
-        """Make predictions based on current metrics"""
+        All services are scored in one batch, at most once per model version
+        and time bucket; until either changes, the same scores are returned.
+        """
+        current = self.current
+        bucket = int(time.time() // PREDICTION["score_bucket"])
+        scores = self.scores
+        if scores is not None and scores["version"] == current["version"] and scores["bucket"] == bucket:
+            self.stats["score_hits"] += 1
+            return scores
+        self.scores = self._score(current, await self.db.get_recent_metrics(), bucket)
+        return self.scores
+
+    def _score(self, current: Dict, current_metrics: Dict, bucket: int = None) -> Dict:
+        """Score every service with enough recent data in a single model call"""
+        services = [
+            service for service, metrics in current_metrics.items()
+            if all(len(metrics[m]) >= FEATURE_WINDOW for m in FEATURE_METRICS)
+        ]
+        probabilities = {}
+        if current["model"] is not None and services:
+            # (services, metrics, window) -> one row per service laid out like the training rows
+            windows = np.array(
+                [[current_metrics[service][m][-FEATURE_WINDOW:] for m in FEATURE_METRICS] for service in services],
+                dtype=np.float64
+            )
+            X = windows.transpose(0, 2, 1).reshape(len(services), -1)
+            probabilities = dict(zip(services, incident_probability(current["model"], X).tolist()))
+            self.stats["scored"] += len(services)
+        return {
+            "version": current["version"],
+            "bucket": bucket,
+            "metrics": current_metrics,
+            "probabilities": probabilities,
+            "predicted_time": datetime.now() + timedelta(hours=1)
+        }
+
+    def _make_predictions(self, scores: Dict, services: List[str] = None) -> List[Dict]:
+        """Make predictions for the services (default: all) whose scores pass the threshold"""
         predictions = []
-        for service, metrics in current_metrics.items():
-            # Prepare feature vector
-            feature_vector = self._prepare_feature_vector(metrics)
-            
-            # Make prediction
-            if len(feature_vector) > 0:
-                probability = self.model.predict_proba([feature_vector])[0][1]
-                if probability > 0.7:  # High probability threshold
-                    predictions.append({
-                        "service": service,
-                        "probability": probability,
-                        "predicted_time": datetime.now() + timedelta(hours=1),
-                        "contributing_factors": self._identify_contributing_factors(metrics)
-                    })
-        
+        for service in services if services is not None else scores["probabilities"]:
+            probability = scores["probabilities"].get(service, 0.0)
+            if probability > PREDICTION["threshold"]:
+                predictions.append({
+                    "service": service,
+                    "probability": probability,
+                    "model_version": scores["version"],
+                    "predicted_time": scores["predicted_time"],
+                    "contributing_factors": self._identify_contributing_factors(scores["metrics"][service])
+                })
         return predictions
 
-    def _prepare_feature_vector(self, metrics: Dict) -> List:
-        """Prepare feature vector from current metrics"""
-        feature_vector = []
-        required_metrics = ["response_times", "error_rates", "request_rates"]
-        
-        # Ensure we have enough historical data
-        if all(len(metrics[m]) >= 5 for m in required_metrics):
-            for metric in required_metrics:
-                feature_vector.extend(metrics[metric][-5:])  # Last 5 measurements
-                
-        return feature_vector
-
     def _identify_contributing_factors(self, metrics: Dict) -> List[str]:
         """Identify factors contributing to potential issues"""
         factors = []
@@ -127,5 +304,6 @@ class Predictor:
                 title=f"Potential Issue Predicted for {prediction['service']}",
                 message=f"Predicted issue within next hour (confidence: {prediction['probability']:.2%})\n"
                         f"Contributing factors:\n" + "\n".join(prediction['contributing_factors']),
-                severity="warning"
+                severity="warning",
+                service=prediction['service']
             )
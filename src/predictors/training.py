@@ -0,0 +1,106 @@
+"""
+Incident model training in worker processes, off the event loop
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from src.config.settings import PREDICTION
+
+
+def _share(array: np.ndarray) -> tuple:
+    """Copy an array into a new shared memory block; returns the block and how to attach to it"""
+    shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, array.dtype, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(spec: tuple) -> tuple:
+    """Map a shared array created by _share; returns the block and an array view of it"""
+    name, shape, dtype = spec
+    shm = SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype, buffer=shm.buf)
+
+
+def fit_forest(X_spec: tuple, y_spec: tuple, n_estimators: int, n_jobs: int) -> RandomForestClassifier:
+    """Fit a random forest on shared feature arrays (runs in a worker process)"""
+    X_shm, X = _attach(X_spec)
+    y_shm, y = _attach(y_spec)
+    try:
+        model = RandomForestClassifier(n_estimators=n_estimators, n_jobs=n_jobs)
+        model.fit(X, y)
+        # Fitting threads are not needed once the model is back in the service
+        model.n_jobs = None
+        return model
+    finally:
+        del X, y
+        X_shm.close()
+        y_shm.close()
+
+
+def extend_forest(model: RandomForestClassifier, X_spec: tuple, y_spec: tuple, n_trees: int, max_trees: int,
+                  n_jobs: int) -> RandomForestClassifier:
+    """Add n_trees fitted on the shared arrays only, dropping the oldest trees past max_trees (runs in a worker process)
+
+    y must contain the same classes as the model was trained on.
+    """
+    X_shm, X = _attach(X_spec)
+    y_shm, y = _attach(y_spec)
+    try:
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees, n_jobs=n_jobs)
+        model.fit(X, y)
+        model.estimators_ = model.estimators_[-max_trees:]
+        model.set_params(warm_start=False, n_estimators=len(model.estimators_), n_jobs=None)
+        return model
+    finally:
+        del X, y
+        X_shm.close()
+        y_shm.close()
+
+
+class ModelTrainer:
+    """Fits incident models in a process pool
+
+    Feature arrays are handed to the worker through shared memory, stored
+    as float32 like sklearn's trees use them, so neither side pickles or
+    converts the training set. Models come back as new objects, so a
+    published model is never modified. The pool is started on the first fit.
+    """
+
+    def __init__(self, processes: int = None, n_estimators: int = None, n_jobs: int = None,
+                 trees_per_update: int = None, max_trees: int = None):
+        self.processes = processes or PREDICTION["training_processes"]
+        self.n_estimators = n_estimators or PREDICTION["n_estimators"]
+        self.n_jobs = n_jobs or PREDICTION["n_jobs"]
+        self.trees_per_update = trees_per_update or PREDICTION["trees_per_update"]
+        self.max_trees = max_trees or PREDICTION["max_trees"]
+        self.executor = None
+
+    async def fit(self, X: np.ndarray, y: np.ndarray) -> RandomForestClassifier:
+        """Fit a new model on X, y without blocking the event loop"""
+        return await self._run(fit_forest, X, y, self.n_estimators, self.n_jobs)
+
+    async def extend(self, model: RandomForestClassifier, X: np.ndarray, y: np.ndarray) -> RandomForestClassifier:
+        """A copy of model with trees_per_update more trees fitted on X, y only"""
+        return await self._run(extend_forest, X, y, self.trees_per_update, self.max_trees, self.n_jobs, model=model)
+
+    async def _run(self, func, X: np.ndarray, y: np.ndarray, *args, model: RandomForestClassifier = None):
+        if self.executor is None:
+            # Forking a process that runs an event loop and threads is unsafe
+            self.executor = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        X_shm, X_spec = _share(np.ascontiguousarray(X, dtype=np.float32))
+        y_shm, y_spec = _share(np.ascontiguousarray(y, dtype=np.int8))
+        call_args = (X_spec, y_spec, *args) if model is None else (model, X_spec, y_spec, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *call_args)
+        finally:
+            for shm in (X_shm, y_shm):
+                shm.close()
+                shm.unlink()
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,184 @@
+"""
+Indexed alert store: id lookup, status and service indexes, cursor pages and archival
+"""
+import gzip
+import json
+from bisect import bisect_left
+from collections import deque
+from datetime import datetime
+from heapq import merge
+from itertools import count
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class AlertStore:
+    """Alerts keyed by monotonic integer ids
+
+    by_status and by_service keep the ids of each group in ascending order, so
+    a page of the newest matching alerts is a bisect on the cursor plus a walk
+    back through one index. An alert leaving a status stays in that status
+    index until stale entries make up half of it and it is compacted, so status
+    changes do not shift large lists. Resolved alerts are moved to an
+    append-only archive once they have been resolved for long enough.
+    """
+
+    def __init__(self, archive_path: str = None):
+        self.alerts: Dict[int, Dict] = {}
+        self.ids: List[int] = []
+        self.by_status: Dict[str, List[int]] = {}
+        self.by_service: Dict[str, List[int]] = {}
+        self.archive_path = archive_path
+        self.archived = 0
+        self._ids = count(1)
+        self._stale: Dict[str, int] = {}
+        # (resolved_at, id) in resolution order; stale entries are skipped on archival
+        self._resolved = deque()
+
+    def __len__(self) -> int:
+        return len(self.alerts)
+
+    def insert(self, alert: Dict) -> str:
+        """Store an alert and return its id"""
+        alert_id = next(self._ids)
+        alert["_id"] = str(alert_id)
+        self.alerts[alert_id] = alert
+        # New ids are always the largest, so appending keeps the indexes sorted
+        self.ids.append(alert_id)
+        self.by_status.setdefault(alert.get("status"), []).append(alert_id)
+        self.by_service.setdefault(alert.get("service"), []).append(alert_id)
+        if alert.get("status") == "resolved":
+            self._resolved.append((alert.setdefault("resolved_at", datetime.utcnow()), alert_id))
+        return alert["_id"]
+
+    def get(self, alert_id: str) -> Optional[Dict]:
+        """Return an alert by id"""
+        try:
+            return self.alerts.get(int(alert_id))
+        except (TypeError, ValueError):
+            return None
+
+    def update(self, alert_id: str, fields: Dict) -> Optional[Dict]:
+        """Update fields of an alert, moving it between status indexes"""
+        alert = self.get(alert_id)
+        if alert is None:
+            return None
+        status = fields.get("status", alert.get("status"))
+        if status != alert.get("status"):
+            key = int(alert_id)
+            self._move(key, alert.get("status"), status)
+            if status == "resolved":
+                fields = {**fields, "resolved_at": fields.get("resolved_at") or datetime.utcnow()}
+                self._resolved.append((fields["resolved_at"], key))
+        alert.update(fields)
+        return alert
+
+    def _move(self, alert_id: int, old: str, new: str):
+        ids = self.by_status.setdefault(new, [])
+        i = bisect_left(ids, alert_id)
+        if i < len(ids) and ids[i] == alert_id:
+            # Revives the entry left behind when it last had this status
+            self._stale[new] -= 1
+        else:
+            ids.insert(i, alert_id)
+        self._stale[old] = self._stale.get(old, 0) + 1
+        if self._stale[old] > len(self.by_status[old]) // 2:
+            self.by_status[old] = self._with_status(self.by_status[old], old)
+            self._stale[old] = 0
+
+    def _with_status(self, ids: Iterator[int], status: str) -> List[int]:
+        return [i for i in ids if i in self.alerts and self.alerts[i].get("status") == status]
+
+    def page(self, statuses: List[str] = None, service: str = None, cursor: str = None,
+             limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+        """Newest alerts with an id below cursor matching the filters, and the cursor of the next page
+
+        statuses=None matches every status.
+        """
+        before = int(cursor) if cursor else None
+        if service is not None:
+            ids = _descending(self.by_service.get(service, []), before)
+            if statuses is not None:
+                wanted = set(statuses)
+                ids = (i for i in ids if self.alerts[i].get("status") in wanted)
+        elif statuses is not None:
+            ids = merge(*(self._live(s, before) for s in statuses), reverse=True)
+        else:
+            ids = _descending(self.ids, before)
+
+        alerts = []
+        for alert_id in ids:
+            alerts.append(self.alerts[alert_id])
+            if len(alerts) == limit:
+                return alerts, alerts[-1]["_id"]
+        return alerts, None
+
+    def _live(self, status: str, before: int = None) -> Iterator[int]:
+        """Ids in a status index that still have that status, newest first"""
+        for i in _descending(self.by_status.get(status, []), before):
+            alert = self.alerts.get(i)
+            if alert is not None and alert.get("status") == status:
+                yield i
+
+    def seen_since(self, since: datetime) -> List[Dict]:
+        """Alerts last seen at or after since, in id order
+
+        Alerts opened since then are found walking back through the ids. An
+        older alert can only have been seen since while it is still open
+        (status indexes) or if it was resolved since (resolution queue).
+        """
+        found = {}
+        for i in _descending(self.ids):
+            if self.alerts[i]["timestamp"] < since:
+                break
+            found[i] = self.alerts[i]
+        for status in self.by_status:
+            if status != "resolved":
+                found.update((i, self.alerts[i]) for i in self._live(status))
+        for resolved_at, i in reversed(self._resolved):
+            if resolved_at < since:
+                break
+            if i in self.alerts:
+                found[i] = self.alerts[i]
+        return [
+            found[i] for i in sorted(found)
+            if found[i].get("last_seen", found[i]["timestamp"]) >= since
+        ]
+
+    def list(self, status: str = None) -> List[Dict]:
+        """All alerts in id order, optionally only those with the given status"""
+        if status is None:
+            return list(self.alerts.values())
+        return [self.alerts[i] for i in self._with_status(self.by_status.get(status, []), status)]
+
+    def archive(self, before: datetime) -> int:
+        """Move alerts resolved before the given time to the archive; returns how many"""
+        archived = []
+        while self._resolved and self._resolved[0][0] < before:
+            resolved_at, alert_id = self._resolved.popleft()
+            alert = self.alerts.get(alert_id)
+            # Skip alerts reopened (or resolved again later) since this entry
+            if alert is not None and alert.get("status") == "resolved" and alert.get("resolved_at") == resolved_at:
+                archived.append(self.alerts.pop(alert_id))
+        if not archived:
+            return 0
+
+        if self.archive_path:
+            with gzip.open(self.archive_path, "at", encoding="utf-8") as f:
+                for alert in archived:
+                    f.write(json.dumps(alert, default=str) + "\n")
+        ids = {int(alert["_id"]) for alert in archived}
+        self.ids = [i for i in self.ids if i not in ids]
+        self.by_status["resolved"] = self._with_status(self.by_status["resolved"], "resolved")
+        self._stale["resolved"] = 0
+        for service in {alert.get("service") for alert in archived}:
+            self.by_service[service] = [i for i in self.by_service[service] if i not in ids]
+        self.archived += len(archived)
+        return len(archived)
+
+
+def _descending(ids: List[int], before: int = None) -> Iterator[int]:
+    """Ids of a sorted index below before, newest first"""
+    end = len(ids) if before is None else bisect_left(ids, before)
+    for i in range(end - 1, -1, -1):
+        yield ids[i]
+
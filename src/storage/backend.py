@@ -0,0 +1,224 @@
+"""
+Storage backend interface and its columnar implementations
+"""
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from src.config.settings import MONITORING, DATABASE, LATENCY_SKETCH
+from src.storage.alert_store import AlertStore
+from src.storage.columnar import ColumnarLogStore, to_epoch_ns
+from src.storage.metric_buckets import MetricBucketStore
+from src.storage.segment_store import SegmentLogStore
+
+
+class StorageBackend(ABC):
+    """Async interface shared by every storage engine"""
+
+    @abstractmethod
+    async def insert_logs(self, logs: List[Dict]):
+        """Insert a batch of log dicts"""
+
+    @property
+    @abstractmethod
+    def dictionaries(self) -> Dict:
+        """Per-column dictionaries that encoded column ids refer to"""
+
+    @abstractmethod
+    def subscribe(self, callback: Callable[[Dict[str, np.ndarray]], None]):
+        """Call callback with every column batch once it is stored"""
+
+    @abstractmethod
+    async def insert_columns(self, batch: Dict[str, np.ndarray]):
+        """Insert a column batch already encoded with this backend's dictionaries"""
+
+    @abstractmethod
+    async def scan_logs(self, start_time: datetime, end_time: datetime, columns: List[str] = None) -> Dict[str, np.ndarray]:
+        """Return encoded columns of logs in [start_time, end_time]"""
+
+    @abstractmethod
+    def decode_logs(self, batch: Dict[str, np.ndarray]) -> List[Dict]:
+        """Convert a column batch returned by scan_logs into log dicts"""
+
+    @abstractmethod
+    async def count_logs(self) -> int:
+        """Number of stored logs"""
+
+    @abstractmethod
+    async def evict_logs(self, before: datetime):
+        """Drop logs older than before (at the engine's eviction granularity)"""
+
+    @abstractmethod
+    async def aggregate(self, start_time: datetime = None, end_time: datetime = None) -> Dict:
+        """Per-service metrics over [start_time, end_time]"""
+
+    @abstractmethod
+    async def metric_series(self, start_time: datetime = None, end_time: datetime = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """Per-service, per-bucket metric columns over [start_time, end_time]"""
+
+    @abstractmethod
+    async def latency_sketches(self, start_time: datetime = None, end_time: datetime = None) -> Dict[tuple, np.ndarray]:
+        """Latency sketch counts per (service, endpoint) merged over [start_time, end_time]"""
+
+    @abstractmethod
+    async def latency_series(self, service: str, qs: List[float], start_time: datetime = None,
+                             end_time: datetime = None) -> Dict[str, list]:
+        """Per-bucket latency quantiles of a service"""
+
+    @abstractmethod
+    async def insert_alert(self, alert: Dict) -> str:
+        """Store an alert and return its id"""
+
+    @abstractmethod
+    async def get_alert(self, alert_id: str) -> Optional[Dict]:
+        """Return an alert by id"""
+
+    @abstractmethod
+    async def update_alert(self, alert_id: str, fields: Dict) -> Optional[Dict]:
+        """Update fields of an alert and return it"""
+
+    @abstractmethod
+    async def list_alerts(self, status: str = None) -> List[Dict]:
+        """Return alerts, optionally only those with the given status"""
+
+    @abstractmethod
+    async def alerts_seen_since(self, since: datetime) -> List[Dict]:
+        """Alerts last seen at or after since, in id order"""
+
+    @abstractmethod
+    async def page_alerts(self, statuses: List[str] = None, service: str = None, cursor: str = None,
+                          limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+        """Newest alerts before cursor matching the filters, and the cursor of the next page"""
+
+    @abstractmethod
+    async def archive_alerts(self, before: datetime) -> int:
+        """Move alerts resolved before the given time out of the store; returns how many"""
+
+
+class ColumnarBackend(StorageBackend):
+    """Backend over a columnar log store with pre-aggregated metric buckets"""
+
+    def __init__(self, log_store: ColumnarLogStore, alert_archive: str = None):
+        self.log_store = log_store
+        self.metric_buckets = MetricBucketStore()
+        # Coarser buckets keep per-endpoint sketches within a fixed memory budget
+        self.endpoint_buckets = MetricBucketStore(LATENCY_SKETCH["endpoint_bucket_width"])
+        self.alerts = AlertStore(alert_archive)
+        self.subscribers: List[Callable[[Dict[str, np.ndarray]], None]] = []
+        self._backfilled = False
+
+    @property
+    def dictionaries(self) -> Dict:
+        return self.log_store.dictionaries
+
+    def subscribe(self, callback: Callable[[Dict[str, np.ndarray]], None]):
+        self.subscribers.append(callback)
+
+    def _backfill_metrics(self):
+        """Rebuild metric buckets from logs that were persisted before startup"""
+        if self._backfilled:
+            return
+        self._backfilled = True
+        if not len(self.log_store):
+            return
+        # Hour by hour to keep the working set small
+        services = self.dictionaries["service"].values
+        start = datetime.utcnow() - timedelta(hours=MONITORING["retention_period"])
+        end = datetime.utcnow()
+        while start < end:
+            batch = self.log_store.scan(
+                to_epoch_ns(start),
+                to_epoch_ns(start + timedelta(hours=1)) - 1,
+                ["timestamp", "service", "endpoint", "response_time", "error"]
+            )
+            if len(batch["timestamp"]):
+                self.metric_buckets.add_columns(batch, services)
+                self.endpoint_buckets.add_columns(batch, services, self.dictionaries["endpoint"].values)
+            start += timedelta(hours=1)
+
+    async def insert_logs(self, logs: List[Dict]):
+        if logs:
+            await self.insert_columns(self.log_store.encode(logs))
+
+    async def insert_columns(self, batch: Dict[str, np.ndarray]):
+        self._backfill_metrics()
+        if len(batch["timestamp"]):
+            self.log_store.append(batch)
+            self.metric_buckets.add_columns(batch, self.dictionaries["service"].values)
+            self.endpoint_buckets.add_columns(batch, self.dictionaries["service"].values,
+                                              self.dictionaries["endpoint"].values)
+            for callback in self.subscribers:
+                callback(batch)
+
+    async def scan_logs(self, start_time: datetime, end_time: datetime, columns: List[str] = None) -> Dict[str, np.ndarray]:
+        return self.log_store.scan(to_epoch_ns(start_time), to_epoch_ns(end_time), columns)
+
+    def decode_logs(self, batch: Dict[str, np.ndarray]) -> List[Dict]:
+        return self.log_store.decode(batch)
+
+    async def count_logs(self) -> int:
+        return len(self.log_store)
+
+    async def evict_logs(self, before: datetime):
+        self.log_store.evict_before(to_epoch_ns(before))
+
+    async def aggregate(self, start_time: datetime = None, end_time: datetime = None) -> Dict:
+        self._backfill_metrics()
+        return self.metric_buckets.summarize(start_time, end_time)
+
+    async def metric_series(self, start_time: datetime = None, end_time: datetime = None) -> Dict[str, Dict[str, np.ndarray]]:
+        self._backfill_metrics()
+        return self.metric_buckets.series(start_time, end_time)
+
+    async def latency_sketches(self, start_time: datetime = None, end_time: datetime = None) -> Dict[tuple, np.ndarray]:
+        self._backfill_metrics()
+        return self.endpoint_buckets.sketches(start_time, end_time)
+
+    async def latency_series(self, service: str, qs: List[float], start_time: datetime = None,
+                             end_time: datetime = None) -> Dict[str, list]:
+        self._backfill_metrics()
+        return self.metric_buckets.percentile_series(service, qs, start_time, end_time)
+
+    async def insert_alert(self, alert: Dict) -> str:
+        return self.alerts.insert(alert)
+
+    async def get_alert(self, alert_id: str) -> Optional[Dict]:
+        return self.alerts.get(alert_id)
+
+    async def update_alert(self, alert_id: str, fields: Dict) -> Optional[Dict]:
+        return self.alerts.update(alert_id, fields)
+
+    async def list_alerts(self, status: str = None) -> List[Dict]:
+        return self.alerts.list(status)
+
+    async def alerts_seen_since(self, since: datetime) -> List[Dict]:
+        return self.alerts.seen_since(since)
+
+    async def page_alerts(self, statuses: List[str] = None, service: str = None, cursor: str = None,
+                          limit: int = 100) -> Tuple[List[Dict], Optional[str]]:
+        return self.alerts.page(statuses, service, cursor, limit)
+
+    async def archive_alerts(self, before: datetime) -> int:
+        return self.alerts.archive(before)
+
+
+class InMemoryBackend(ColumnarBackend):
+    """Columnar backend that keeps everything on the Python heap"""
+
+    def __init__(self):
+        super().__init__(ColumnarLogStore())
+
+
+class SegmentBackend(ColumnarBackend):
+    """Columnar backend that persists logs in hourly memory-mapped segment files"""
+
+    def __init__(self, directory: str):
+        super().__init__(SegmentLogStore(directory), os.path.join(directory, "alerts-archive.jsonl.gz"))
+
+
+def create_backend() -> StorageBackend:
+    """Build the backend selected by DATABASE["type"]"""
+    if DATABASE["type"] == "segments":
+        return SegmentBackend(DATABASE["data_dir"])
+    return InMemoryBackend()
@@ -0,0 +1,216 @@
+"""
+Columnar, chunked log storage backed by NumPy arrays
+"""
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, List
+import numpy as np
+
+EPOCH = datetime(1970, 1, 1)
+
+# Fixed-width column layout of a stored log
+COLUMNS = {
+    "timestamp": np.int64,       # epoch ns (UTC)
+    "response_time": np.float32,  # ms
+    "status_code": np.int16,
+    "error": np.bool_,
+    "response_size": np.int32,   # bytes, 0 when unknown
+    "service": np.int16,         # dictionary-encoded
+    "endpoint": np.int32,        # dictionary-encoded
+    "method": np.int16,          # dictionary-encoded
+    "region": np.int16,          # dictionary-encoded
+    "environment": np.int16,     # dictionary-encoded
+    "error_type": np.int16       # dictionary-encoded
+}
+
+# Columns stored as ids into a per-column Dictionary
+ENCODED_COLUMNS = ("service", "endpoint", "method", "region", "environment", "error_type")
+
+CHUNK_SIZE = 65536
+
+
+def to_epoch_ns(timestamp: datetime) -> int:
+    """Convert a naive UTC datetime to epoch nanoseconds"""
+    return (timestamp - EPOCH) // timedelta(microseconds=1) * 1000
+
+
+class Dictionary:
+    """Bidirectional mapping between string values and small integer ids"""
+
+    def __init__(self, values: List[str] = None):
+        # Id 0 is reserved for missing values
+        self.values = [None]
+        self.ids = {None: 0}
+        for value in values or []:
+            self.encode(value)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def encode(self, value) -> int:
+        """Return the id of value, assigning a new one if needed"""
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = len(self.values)
+            self.ids[value] = value_id
+            self.values.append(value)
+        return value_id
+
+    def encode_many(self, values: List, dtype) -> np.ndarray:
+        """Encode a list of values into an id array"""
+        ids = self.ids
+        return np.fromiter(
+            (ids[v] if v in ids else self.encode(v) for v in values),
+            dtype=dtype,
+            count=len(values)
+        )
+
+    def lookup(self, value) -> int:
+        """Return the id of value, or -1 if it was never stored"""
+        return self.ids.get(value, -1)
+
+    def decode_many(self, ids: np.ndarray) -> List:
+        """Decode an id array back into values"""
+        values = self.values
+        return [values[i] for i in ids.tolist()]
+
+
+class Chunk:
+    """Preallocated block of columns filled by appends, kept sorted by timestamp"""
+
+    def __init__(self, capacity: int = CHUNK_SIZE):
+        self.capacity = capacity
+        self.size = 0
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in COLUMNS.items()}
+        self.min_timestamp = np.iinfo(np.int64).max
+        self.max_timestamp = np.iinfo(np.int64).min
+        self.sorted = True
+
+    def append(self, batch: Dict[str, np.ndarray], start: int) -> int:
+        """Copy rows from a sorted batch[start:] until full, returning the rows taken"""
+        count = min(self.capacity - self.size, len(batch["timestamp"]) - start)
+        if count <= 0:
+            return 0
+        for name, column in self.columns.items():
+            column[self.size:self.size + count] = batch[name][start:start + count]
+        timestamps = batch["timestamp"][start:start + count]
+        # Late rows break the order; it is restored lazily on the next read
+        if timestamps[0] < self.max_timestamp:
+            self.sorted = False
+        self.min_timestamp = min(self.min_timestamp, int(timestamps[0]))
+        self.max_timestamp = max(self.max_timestamp, int(timestamps[-1]))
+        self.size += count
+        return count
+
+    def view(self, name: str) -> np.ndarray:
+        """Filled part of a column"""
+        return self.columns[name][:self.size]
+
+    def bounds(self, start_ns: int, end_ns: int) -> tuple:
+        """Row range [lo, hi) with start_ns <= timestamp <= end_ns"""
+        if not self.sorted:
+            self._sort()
+        timestamps = self.view("timestamp")
+        return (
+            int(np.searchsorted(timestamps, start_ns, side="left")),
+            int(np.searchsorted(timestamps, end_ns, side="right"))
+        )
+
+    def _sort(self):
+        """Restore timestamp order after late appends"""
+        order = np.argsort(self.view("timestamp"), kind="stable")
+        for column in self.columns.values():
+            column[:self.size] = column[:self.size][order]
+        self.sorted = True
+
+
+class ColumnarLogStore:
+    """Append-only log store keeping fixed-width columns in time-ordered chunks"""
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks: List[Chunk] = []
+        # Running maximum of chunk max timestamps, non-decreasing so scans can bisect it
+        self.high_water: List[int] = []
+        self.dictionaries = {name: Dictionary() for name in ENCODED_COLUMNS}
+
+    def __len__(self) -> int:
+        return sum(chunk.size for chunk in self.chunks)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by column arrays"""
+        return sum(column.nbytes for chunk in self.chunks for column in chunk.columns.values())
+
+    def encode(self, logs: List[Dict]) -> Dict[str, np.ndarray]:
+        """Convert log dicts into a column batch"""
+        count = len(logs)
+        batch = {
+            "timestamp": np.fromiter((to_epoch_ns(log["timestamp"]) for log in logs), np.int64, count),
+            "response_time": np.fromiter((log["response_time"] for log in logs), np.float32, count),
+            "status_code": np.fromiter((log.get("status_code") or 0 for log in logs), np.int16, count),
+            "error": np.fromiter((bool(log.get("error")) for log in logs), np.bool_, count),
+            "response_size": np.fromiter((log.get("response_size") or 0 for log in logs), np.int32, count)
+        }
+        for name in ENCODED_COLUMNS:
+            batch[name] = self.dictionaries[name].encode_many([log.get(name) for log in logs], COLUMNS[name])
+        return batch
+
+    def append(self, batch: Dict[str, np.ndarray]):
+        """Append a column batch"""
+        timestamps = batch["timestamp"]
+        if len(timestamps) > 1 and (timestamps[1:] < timestamps[:-1]).any():
+            order = np.argsort(timestamps, kind="stable")
+            batch = {name: column[order] for name, column in batch.items()}
+
+        total = len(batch["timestamp"])
+        written = 0
+        while written < total:
+            if not self.chunks or self.chunks[-1].size == self.chunks[-1].capacity:
+                self.chunks.append(Chunk(self.chunk_size))
+                self.high_water.append(self.high_water[-1] if self.high_water else np.iinfo(np.int64).min)
+            written += self.chunks[-1].append(batch, written)
+            self.high_water[-1] = max(self.high_water[-1], self.chunks[-1].max_timestamp)
+
+    def scan(self, start_ns: int, end_ns: int, columns: List[str] = None) -> Dict[str, np.ndarray]:
+        """Return the given columns of all rows with start_ns <= timestamp <= end_ns"""
+        columns = columns or list(COLUMNS)
+        parts = {name: [] for name in columns}
+        # Chunks before this one hold nothing at or after start_ns
+        for chunk in self.chunks[bisect_left(self.high_water, start_ns):]:
+            if chunk.min_timestamp > end_ns:
+                continue
+            lo, hi = chunk.bounds(start_ns, end_ns)
+            if lo < hi:
+                for name in columns:
+                    parts[name].append(chunk.view(name)[lo:hi])
+        return {
+            name: np.concatenate(arrays) if arrays else np.zeros(0, dtype=COLUMNS[name])
+            for name, arrays in parts.items()
+        }
+
+    def evict_before(self, cutoff_ns: int):
+        """Drop the chunks whose rows are all older than cutoff_ns
+
+        Each chunk is judged by its own newest row: the running maximum in
+        high_water is held up by any later-dated chunk, e.g. one with a log
+        dated in the future. Dropping entries keeps high_water non-decreasing.
+        """
+        kept = [i for i, chunk in enumerate(self.chunks) if chunk.max_timestamp >= cutoff_ns]
+        if len(kept) < len(self.chunks):
+            self.chunks = [self.chunks[i] for i in kept]
+            self.high_water = [self.high_water[i] for i in kept]
+
+    def decode(self, batch: Dict[str, np.ndarray]) -> List[Dict]:
+        """Convert a column batch back into log dicts"""
+        fields = {
+            "timestamp": batch["timestamp"].view("datetime64[ns]").astype("datetime64[us]").tolist(),
+            "response_time": batch["response_time"].tolist(),
+            "status_code": batch["status_code"].tolist(),
+            "error": batch["error"].tolist(),
+            "response_size": batch["response_size"].tolist()
+        }
+        for name in ENCODED_COLUMNS:
+            fields[name] = self.dictionaries[name].decode_many(batch[name])
+        names = list(fields)
+        return [dict(zip(names, row)) for row in zip(*fields.values())]
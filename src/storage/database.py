@@ -1,88 +1,128 @@
 from typing import Dict, List
 from datetime import datetime, timedelta
+from src.config.settings import MONITORING
+from src.config.external_services import MONITORING_CONFIG
+from src.storage.backend import StorageBackend, create_backend
+from src.storage.sketch import LatencySketch, quantiles
+
+# Alert statuses that still need attention
+ACTIVE_STATUSES = ["new", "acknowledged"]
 
 class Database:
-    def __init__(self):
-        self.logs = []
+    def __init__(self, backend: StorageBackend = None):
+        self.backend = backend or create_backend()
         self.metrics = {}
-        self.alerts = []
-        
+
     async def store_logs(self, logs: List[Dict]):
-        """Store processed logs in memory"""
+        """Store processed logs"""
         if logs:
-            self.logs.extend(logs)
-            # Keep only last 24 hours of logs
-            cutoff = datetime.utcnow() - timedelta(hours=24)
-            self.logs = [log for log in self.logs if log["timestamp"] >= cutoff]
-
-    async def store_alert(self, alert: Dict):
-        """Store an alert in memory"""
-        alert["_id"] = str(len(self.alerts) + 1)  # Simple ID generation
+            await self.backend.insert_logs(logs)
+            # Drop whole chunks that fall out of the retention period
+            cutoff = datetime.utcnow() - timedelta(days=MONITORING_CONFIG["log_retention_days"])
+            await self.backend.evict_logs(cutoff)
+
+    def subscribe(self, callback):
+        """Receive every stored log batch as encoded columns"""
+        self.backend.subscribe(callback)
+
+    async def count_logs(self) -> int:
+        """Number of stored logs"""
+        return await self.backend.count_logs()
+
+    async def store_alert(self, alert: Dict) -> str:
+        """Store an alert and return its id"""
         alert["status"] = "new"
-        self.alerts.append(alert)
+        return await self.backend.insert_alert(alert)
 
     async def get_logs_between(self, start_time: datetime, end_time: datetime) -> List[Dict]:
         """Get logs between start_time and end_time"""
-        return [log for log in self.logs if start_time <= log["timestamp"] <= end_time]
+        return self.backend.decode_logs(await self.backend.scan_logs(start_time, end_time))
 
     async def get_historical_metrics(self) -> Dict:
         """Get historical metrics for analysis"""
-        metrics = {}
-        for log in self.logs:
-            service = log["service"]
-            if service not in metrics:
-                metrics[service] = {
-                    "timestamps": [],
-                    "response_times": [],
-                    "error_rates": [],
-                    "request_rates": [],
-                    "incidents": []
-                }
-            
-            metrics[service]["timestamps"].append(log["timestamp"])
-            metrics[service]["response_times"].append(log["response_time"])
-            metrics[service]["error_rates"].append(1 if log["error"] else 0)
-            metrics[service]["request_rates"].append(1)  # Simplified for demo
-            metrics[service]["incidents"].append(
-                1 if log["error"] or log["response_time"] > 1000 else 0
-            )
-            
-        return metrics
+        return await self.backend.aggregate()
+
+    async def get_historical_series(self) -> Dict:
+        """Get historical per-bucket metrics as numpy columns, for model training"""
+        return await self.backend.metric_series()
 
     async def get_recent_metrics(self) -> Dict:
         """Get metrics from the last 5 minutes"""
-        start_time = datetime.utcnow() - timedelta(minutes=5)
-        recent_logs = [log for log in self.logs if log["timestamp"] >= start_time]
-        
-        metrics = {}
-        for log in recent_logs:
-            service = log["service"]
-            if service not in metrics:
-                metrics[service] = {
-                    "response_times": [],
-                    "error_rates": [],
-                    "request_rates": [],
-                    "error_count": 0,
-                    "total_requests": 0
-                }
-            
-            metrics[service]["response_times"].append(log["response_time"])
-            metrics[service]["error_rates"].append(1 if log["error"] else 0)
-            metrics[service]["request_rates"].append(1)  # Simplified for demo
-            if log["error"]:
-                metrics[service]["error_count"] += 1
-            metrics[service]["total_requests"] += 1
-            
-        return metrics
-
-    async def get_active_alerts(self) -> List[Dict]:
-        """Get list of active (non-resolved) alerts"""
-        return [alert for alert in self.alerts if alert.get("status") != "resolved"]
+        start_time = datetime.utcnow() - timedelta(minutes=MONITORING["recent_window"])
+        return await self.backend.aggregate(start_time)
+
+    async def get_latency_percentiles(self, start_time: datetime = None, end_time: datetime = None,
+                                      service: str = None) -> Dict:
+        """p50/p95/p99 per service and endpoint, with the merged sketches for cross-node rollups"""
+        services = {}
+        for (name, endpoint), counts in (await self.backend.latency_sketches(start_time, end_time)).items():
+            if service is not None and name != service:
+                continue
+            sketch = LatencySketch(counts)
+            if name not in services:
+                services[name] = {"sketch": LatencySketch(counts.copy()), "endpoints": {}}
+            else:
+                services[name]["sketch"].merge(sketch)
+            services[name]["endpoints"][endpoint] = _percentiles(sketch)
+        return {
+            name: {**_percentiles(entry["sketch"]), "endpoints": entry["endpoints"]}
+            for name, entry in services.items()
+        }
+
+    async def get_latency_series(self, service: str, start_time: datetime = None, end_time: datetime = None) -> Dict:
+        """p50/p95/p99 of a service for every metric bucket in the window"""
+        series = await self.backend.latency_series(service, [0.5, 0.95, 0.99], start_time, end_time)
+        values = list(zip(*series["quantiles"])) or [(), (), ()]
+        return {
+            "timestamps": series["timestamps"],
+            "p50": list(values[0]),
+            "p95": list(values[1]),
+            "p99": list(values[2])
+        }
+
+    async def get_active_alerts(self, limit: int = None) -> List[Dict]:
+        """Get active (non-resolved) alerts, newest first"""
+        alerts, _ = await self.backend.page_alerts(ACTIVE_STATUSES, limit=limit)
+        return alerts
+
+    async def get_alerts_seen_since(self, since: datetime) -> List[Dict]:
+        """Alerts last seen at or after since, oldest first"""
+        return await self.backend.alerts_seen_since(since)
+
+    async def page_alerts(self, statuses: List[str] = None, service: str = None, cursor: str = None,
+                          limit: int = 100) -> Dict:
+        """One page of alerts, newest first, with the cursor of the next page (None on the last)"""
+        alerts, next_cursor = await self.backend.page_alerts(statuses, service, cursor, limit)
+        return {"alerts": alerts, "next_cursor": next_cursor}
+
+    async def archive_alerts(self, before: datetime) -> int:
+        """Archive alerts resolved before the given time"""
+        return await self.backend.archive_alerts(before)
+
+    async def get_alert(self, alert_id: str) -> Dict:
+        """Get an alert by id, None if unknown"""
+        return await self.backend.get_alert(alert_id)
 
     async def update_alert_status(self, alert_id: str, status: str):
         """Update the status of an alert"""
-        for alert in self.alerts:
-            if alert["_id"] == alert_id:
-                alert["status"] = status
-                alert["updated_at"] = datetime.utcnow()
-                break
+        await self.backend.update_alert(alert_id, {"status": status, "updated_at": datetime.utcnow()})
+
+    async def update_alert(self, alert_id: str, fields: Dict):
+        """Update fields of an alert"""
+        await self.backend.update_alert(alert_id, {**fields, "updated_at": datetime.utcnow()})
+
+
+def _percentiles(sketch: LatencySketch) -> Dict:
+    p50, p95, p99 = quantiles(sketch.counts, [0.5, 0.95, 0.99])
+    return {"count": sketch.count, "p50": p50, "p95": p95, "p99": p99, "sketch": sketch.to_dict()}
+
+
+_database = None
+
+
+def get_database() -> Database:
+    """Return the process-wide Database shared by all components"""
+    global _database
+    if _database is None:
+        _database = Database()
+    return _database
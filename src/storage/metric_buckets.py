@@ -0,0 +1,220 @@
+"""
+Time-bucketed, pre-aggregated per-service metrics
+"""
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+import numpy as np
+from src.config.settings import MONITORING, ALERT_THRESHOLDS
+from src.storage.sketch import N_BINS, bin_indexes, quantiles, quantiles_many
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch_seconds(timestamp: datetime) -> float:
+    """Convert a naive UTC datetime to epoch seconds"""
+    return (timestamp - EPOCH).total_seconds()
+
+
+class ServiceBuckets:
+    """Fixed-size ring of time buckets for a single service"""
+
+    def __init__(self, size: int):
+        self.size = size
+        # Absolute bucket number held by each slot (-1 when never used)
+        self.bucket_ids = np.full(size, -1, dtype=np.int64)
+        self.counts = np.zeros(size, dtype=np.int64)
+        self.errors = np.zeros(size, dtype=np.int64)
+        self.sums = np.zeros(size, dtype=np.float64)
+        self.mins = np.full(size, np.inf)
+        self.maxs = np.full(size, -np.inf)
+        self.sketches = np.zeros((size, N_BINS), dtype=np.uint32)
+
+    def add(self, bucket_ids: np.ndarray, response_times: np.ndarray, errors: np.ndarray):
+        """Fold a batch of observations into their buckets"""
+        slots = bucket_ids % self.size
+
+        # Recycle slots that still hold an older bucket
+        stale = bucket_ids > self.bucket_ids[slots]
+        if stale.any():
+            self._reset(np.unique(slots[stale]))
+            np.maximum.at(self.bucket_ids, slots[stale], bucket_ids[stale])
+
+        # Drop observations older than the ring covers
+        keep = bucket_ids == self.bucket_ids[slots]
+        if not keep.all():
+            slots, response_times, errors = slots[keep], response_times[keep], errors[keep]
+        if len(slots) == 0:
+            return
+
+        # Group by slot once, then reduce every aggregate with the same boundaries
+        order = np.argsort(slots, kind="stable")
+        slots, response_times, errors = slots[order], response_times[order], errors[order]
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(slots)) + 1))
+        targets = slots[starts]
+
+        self.counts[targets] += np.diff(np.append(starts, len(slots)))
+        self.errors[targets] += np.add.reduceat(errors.astype(np.int64), starts)
+        self.sums[targets] += np.add.reduceat(response_times, starts)
+        self.mins[targets] = np.minimum(self.mins[targets], np.minimum.reduceat(response_times, starts))
+        self.maxs[targets] = np.maximum(self.maxs[targets], np.maximum.reduceat(response_times, starts))
+
+        cells, cell_counts = np.unique(slots * N_BINS + bin_indexes(response_times), return_counts=True)
+        self.sketches.reshape(-1)[cells] += cell_counts.astype(np.uint32)
+
+    def _reset(self, slots: np.ndarray):
+        """Clear the aggregates held in the given slots"""
+        self.counts[slots] = 0
+        self.errors[slots] = 0
+        self.sums[slots] = 0
+        self.mins[slots] = np.inf
+        self.maxs[slots] = -np.inf
+        self.sketches[slots] = 0
+
+    def window(self, first_id: int, last_id: int) -> tuple:
+        """Return the non-empty bucket numbers and slots in [first_id, last_id]"""
+        first_id = max(first_id, last_id - self.size + 1)
+        ids = np.arange(first_id, last_id + 1, dtype=np.int64)
+        slots = ids % self.size
+        valid = (self.bucket_ids[slots] == ids) & (self.counts[slots] > 0)
+        return ids[valid], slots[valid]
+
+
+class MetricBucketStore:
+    """Per-key rings of fixed-width buckets, updated incrementally on ingest
+
+    Keys are service names, or (service, endpoint) pairs when filled by
+    add_columns(..., endpoints=...).
+    """
+
+    def __init__(self, bucket_width: int = None, retention_hours: int = None):
+        self.bucket_width = bucket_width or MONITORING["bucket_width"]
+        retention_hours = retention_hours or MONITORING["retention_period"]
+        self.size = int(retention_hours * 3600 // self.bucket_width)
+        self.services: Dict[str, ServiceBuckets] = {}
+
+    def add(self, service, timestamps: np.ndarray, response_times: np.ndarray, errors: np.ndarray,
+            now: float = None):
+        """Add observations for one service (timestamps in epoch seconds)
+
+        Observations dated more than max_clock_skew after now (epoch seconds,
+        default the current time) are dropped: a future bucket would claim
+        its ring slot and push out current data until the clock catches up.
+        """
+        if service not in self.services:
+            self.services[service] = ServiceBuckets(self.size)
+        bucket_ids = (np.asarray(timestamps) // self.bucket_width).astype(np.int64)
+        response_times = np.asarray(response_times, dtype=np.float64)
+        errors = np.asarray(errors, dtype=bool)
+        latest = ((time.time() if now is None else now) + MONITORING["max_clock_skew"]) // self.bucket_width
+        keep = bucket_ids <= latest
+        if not keep.all():
+            bucket_ids, response_times, errors = bucket_ids[keep], response_times[keep], errors[keep]
+        self.services[service].add(bucket_ids, response_times, errors)
+
+    def add_columns(self, batch: Dict[str, np.ndarray], services: List[str], endpoints: List[str] = None,
+                    now: float = None):
+        """Add a column batch whose service (and endpoint) columns hold ids into services (and endpoints)"""
+        keys = batch["service"].astype(np.int64)
+        if endpoints is not None:
+            keys = (keys << 32) | batch["endpoint"].astype(np.int64)
+        timestamps = batch["timestamp"] / 1e9
+        for key in np.unique(keys).tolist():
+            mask = keys == key
+            if endpoints is None:
+                name = services[key]
+            else:
+                name = (services[key >> 32], endpoints[key & 0xFFFFFFFF])
+            self.add(name, timestamps[mask], batch["response_time"][mask], batch["error"][mask], now)
+
+    def _window_ids(self, start_time: datetime = None, end_time: datetime = None) -> tuple:
+        """First and last bucket numbers of [start_time, end_time] (default: whole ring)"""
+        end_time = end_time or datetime.utcnow()
+        last_id = int(to_epoch_seconds(end_time) // self.bucket_width)
+        first_id = last_id - self.size + 1
+        if start_time is not None:
+            first_id = int(to_epoch_seconds(start_time) // self.bucket_width)
+        return first_id, last_id
+
+    def sketches(self, start_time: datetime = None, end_time: datetime = None) -> Dict:
+        """Latency sketch counts of every key merged over [start_time, end_time]"""
+        first_id, last_id = self._window_ids(start_time, end_time)
+        merged = {}
+        for key, buckets in self.services.items():
+            ids, slots = buckets.window(first_id, last_id)
+            if len(ids):
+                merged[key] = buckets.sketches[slots].sum(axis=0)
+        return merged
+
+    def percentile_series(self, key, qs: List[float], start_time: datetime = None,
+                          end_time: datetime = None) -> Dict[str, list]:
+        """Per-bucket latency quantiles of one key, {"timestamps": [...], "quantiles": [[...], ...]}"""
+        buckets = self.services.get(key)
+        if buckets is None:
+            return {"timestamps": [], "quantiles": []}
+        ids, slots = buckets.window(*self._window_ids(start_time, end_time))
+        return {
+            "timestamps": [EPOCH + timedelta(seconds=int(i) * self.bucket_width) for i in ids],
+            "quantiles": quantiles_many(buckets.sketches[slots], qs).tolist()
+        }
+
+    def summarize(self, start_time: datetime = None, end_time: datetime = None) -> Dict:
+        """Summarize every key over [start_time, end_time] (default: whole ring)"""
+        first_id, last_id = self._window_ids(start_time, end_time)
+        metrics = {}
+        for service, buckets in self.services.items():
+            ids, slots = buckets.window(first_id, last_id)
+            if len(ids):
+                metrics[service] = self._summarize_buckets(buckets, ids, slots)
+        return metrics
+
+    def series(self, start_time: datetime = None, end_time: datetime = None) -> Dict[str, Dict[str, np.ndarray]]:
+        """Per-bucket metric columns of every key over [start_time, end_time], as arrays
+
+        Same series as summarize() without the conversion to lists; timestamps
+        are bucket starts in epoch seconds.
+        """
+        first_id, last_id = self._window_ids(start_time, end_time)
+        columns = {}
+        for service, buckets in self.services.items():
+            ids, slots = buckets.window(first_id, last_id)
+            if len(ids):
+                columns[service] = self._bucket_columns(buckets, ids, slots)
+        return columns
+
+    def _bucket_columns(self, buckets: ServiceBuckets, ids: np.ndarray, slots: np.ndarray) -> Dict[str, np.ndarray]:
+        counts = buckets.counts[slots]
+        errors = buckets.errors[slots]
+        return {
+            "timestamps": ids * self.bucket_width,
+            "response_times": buckets.sums[slots] / counts,
+            "error_rates": errors / counts,
+            "request_rates": counts,
+            "incidents": ((errors > 0) | (buckets.maxs[slots] > ALERT_THRESHOLDS["response_time"]["critical"])).astype(int)
+        }
+
+    def _summarize_buckets(self, buckets: ServiceBuckets, ids: np.ndarray, slots: np.ndarray) -> Dict:
+        """Build the metrics dict for a set of buckets of one service"""
+        counts = buckets.counts[slots]
+        errors = buckets.errors[slots]
+        sums = buckets.sums[slots]
+        maxs = buckets.maxs[slots]
+        total_requests = int(counts.sum())
+        p50, p95, p99 = quantiles(buckets.sketches[slots].sum(axis=0), [0.5, 0.95, 0.99])
+        columns = self._bucket_columns(buckets, ids, slots)
+
+        return {
+            "timestamps": [EPOCH + timedelta(seconds=int(i) * self.bucket_width) for i in ids],
+            "response_times": columns["response_times"].tolist(),
+            "error_rates": columns["error_rates"].tolist(),
+            "request_rates": columns["request_rates"].tolist(),
+            "incidents": columns["incidents"].tolist(),
+            "error_count": int(errors.sum()),
+            "total_requests": total_requests,
+            "avg_response_time": float(sums.sum() / total_requests),
+            "min_response_time": float(buckets.mins[slots].min()),
+            "max_response_time": float(maxs.max()),
+            "p50_response_time": p50,
+            "p95_response_time": p95,
+            "p99_response_time": p99
+        }
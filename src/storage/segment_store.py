@@ -0,0 +1,175 @@
+"""
+Persistent log storage: one append-only file of fixed-width records per hour
+"""
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, List
+import numpy as np
+from src.storage.columnar import COLUMNS, ENCODED_COLUMNS, ColumnarLogStore, Dictionary, EPOCH
+
+# On-disk record layout, packed in COLUMNS order
+RECORD_DTYPE = np.dtype([(name, dtype) for name, dtype in COLUMNS.items()])
+
+HOUR_NS = 3600 * 10**9
+
+
+class HourSegment:
+    """Records for one hour: a .bin file of records and an .idx file of sorted-run starts"""
+
+    def __init__(self, directory: str, hour: int):
+        self.hour = hour
+        prefix = os.path.join(directory, f"logs-{EPOCH + timedelta(hours=hour):%Y%m%d%H}")
+        self.data_path = prefix + ".bin"
+        self.index_path = prefix + ".idx"
+        self.size = 0
+        if os.path.exists(self.data_path):
+            size_bytes = os.path.getsize(self.data_path)
+            # Discard a record torn by a crash mid-write
+            if size_bytes % RECORD_DTYPE.itemsize:
+                os.truncate(self.data_path, size_bytes - size_bytes % RECORD_DTYPE.itemsize)
+            self.size = size_bytes // RECORD_DTYPE.itemsize
+        self._records = None
+        self._runs = None
+        self._last_timestamp = None
+
+    def records(self) -> np.ndarray:
+        """Memory-mapped view of every record in the file"""
+        if self._records is None or len(self._records) != self.size:
+            self._records = np.memmap(self.data_path, dtype=RECORD_DTYPE, mode="r", shape=(self.size,))
+        return self._records
+
+    def runs(self) -> np.ndarray:
+        """Start offsets of the sorted runs the file is made of"""
+        if self._runs is None:
+            runs = np.zeros(0, dtype=np.int64)
+            if os.path.exists(self.index_path):
+                runs = np.fromfile(self.index_path, dtype=np.int64)
+            runs = runs[runs < self.size]
+            if self.size and (len(runs) == 0 or runs[0] != 0):
+                runs = np.concatenate(([0], runs))
+            self._runs = runs
+        return self._runs
+
+    def append(self, records: np.ndarray):
+        """Append timestamp-sorted records"""
+        # A new run starts whenever the batch does not continue the current order;
+        # the index is written first so a crash never leaves an unindexed run
+        if self.size and self._last_timestamp is None:
+            self._last_timestamp = int(self.records()["timestamp"][-1])
+        if self.size == 0 or records["timestamp"][0] < self._last_timestamp:
+            run_start = np.array([self.size], dtype=np.int64)
+            with open(self.index_path, "ab") as index_file:
+                index_file.write(run_start.tobytes())
+            self._runs = np.concatenate((self.runs(), run_start))
+        with open(self.data_path, "ab") as data_file:
+            data_file.write(records.tobytes())
+        self.size += len(records)
+        self._last_timestamp = int(records["timestamp"][-1])
+
+    def scan(self, start_ns: int, end_ns: int) -> List[np.ndarray]:
+        """Record slices with start_ns <= timestamp <= end_ns"""
+        if self.size == 0:
+            return []
+        records = self.records()
+        bounds = np.append(self.runs(), self.size)
+        parts = []
+        for run_start, run_end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            timestamps = records["timestamp"][run_start:run_end]
+            lo = int(np.searchsorted(timestamps, start_ns, side="left"))
+            hi = int(np.searchsorted(timestamps, end_ns, side="right"))
+            if lo < hi:
+                parts.append(records[run_start + lo:run_start + hi])
+        return parts
+
+    def remove(self):
+        """Delete the segment files"""
+        self._records = None
+        for path in (self.data_path, self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SegmentLogStore(ColumnarLogStore):
+    """Log store persisted as hourly segment files and read through memory maps"""
+
+    def __init__(self, directory: str):
+        super().__init__()
+        self.directory = directory
+        self.dictionaries_path = os.path.join(directory, "dictionaries.json")
+        os.makedirs(directory, exist_ok=True)
+
+        if os.path.exists(self.dictionaries_path):
+            with open(self.dictionaries_path) as f:
+                saved = json.load(f)
+            self.dictionaries = {name: Dictionary(saved.get(name, [])) for name in ENCODED_COLUMNS}
+        self._saved_dictionary_sizes = self._dictionary_sizes()
+
+        # Only file names are read here; data is mapped on first access
+        self.hours: List[int] = []
+        self.segments: Dict[int, HourSegment] = {}
+        for name in sorted(os.listdir(directory)):
+            if name.startswith("logs-") and name.endswith(".bin"):
+                hour_start = datetime.strptime(name[5:-4], "%Y%m%d%H")
+                hour = int((hour_start - EPOCH).total_seconds()) // 3600
+                self.segments[hour] = HourSegment(directory, hour)
+                self.hours.append(hour)
+
+    def __len__(self) -> int:
+        return sum(segment.size for segment in self.segments.values())
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in segment files"""
+        return len(self) * RECORD_DTYPE.itemsize
+
+    def _dictionary_sizes(self) -> Dict[str, int]:
+        return {name: len(dictionary) for name, dictionary in self.dictionaries.items()}
+
+    def _save_dictionaries(self):
+        """Persist dictionaries atomically before records that reference new ids"""
+        temp_path = self.dictionaries_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({name: d.values[1:] for name, d in self.dictionaries.items()}, f)
+        os.replace(temp_path, self.dictionaries_path)
+        self._saved_dictionary_sizes = self._dictionary_sizes()
+
+    def append(self, batch: Dict[str, np.ndarray]):
+        """Append a column batch, routing rows to their hour files"""
+        if self._dictionary_sizes() != self._saved_dictionary_sizes:
+            self._save_dictionaries()
+
+        records = np.empty(len(batch["timestamp"]), dtype=RECORD_DTYPE)
+        for name in COLUMNS:
+            records[name] = batch[name]
+        records = records[np.argsort(records["timestamp"], kind="stable")]
+
+        hours = records["timestamp"] // HOUR_NS
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(hours)) + 1, [len(records)]))
+        for lo, hi in zip(starts[:-1].tolist(), starts[1:].tolist()):
+            hour = int(hours[lo])
+            if hour not in self.segments:
+                self.segments[hour] = HourSegment(self.directory, hour)
+                self.hours.insert(bisect_left(self.hours, hour), hour)
+            self.segments[hour].append(records[lo:hi])
+
+    def scan(self, start_ns: int, end_ns: int, columns: List[str] = None) -> Dict[str, np.ndarray]:
+        """Return the given columns of all rows with start_ns <= timestamp <= end_ns"""
+        columns = columns or list(COLUMNS)
+        first = bisect_left(self.hours, start_ns // HOUR_NS)
+        last = bisect_right(self.hours, end_ns // HOUR_NS)
+        parts = []
+        for hour in self.hours[first:last]:
+            parts.extend(self.segments[hour].scan(start_ns, end_ns))
+        return {
+            name: np.concatenate([part[name] for part in parts]) if parts else np.zeros(0, dtype=COLUMNS[name])
+            for name in columns
+        }
+
+    def evict_before(self, cutoff_ns: int):
+        """Delete hour files whose rows are all older than cutoff_ns"""
+        expired = bisect_left(self.hours, cutoff_ns // HOUR_NS)
+        for hour in self.hours[:expired]:
+            self.segments.pop(hour).remove()
+        del self.hours[:expired]
@@ -0,0 +1,98 @@
+"""
+Mergeable latency sketch with bounded relative error (DDSketch style)
+"""
+import math
+from typing import Dict, List
+import numpy as np
+from src.config.settings import LATENCY_SKETCH
+
+_GAMMA = (1 + LATENCY_SKETCH["relative_accuracy"]) / (1 - LATENCY_SKETCH["relative_accuracy"])
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_INDEX = math.ceil(math.log(LATENCY_SKETCH["min_latency"]) / _LOG_GAMMA)
+_MAX_INDEX = math.ceil(math.log(LATENCY_SKETCH["max_latency"]) / _LOG_GAMMA)
+
+# Number of logarithmic bins in every sketch
+N_BINS = _MAX_INDEX - _MIN_INDEX + 1
+
+# Representative latency of each bin (within relative_accuracy of any value in it)
+BIN_VALUES = 2 * _GAMMA ** np.arange(_MIN_INDEX, _MAX_INDEX + 1) / (_GAMMA + 1)
+
+
+def bin_indexes(values) -> np.ndarray:
+    """Map latencies (ms) to sketch bin indexes"""
+    values = np.clip(
+        np.asarray(values, dtype=np.float64),
+        LATENCY_SKETCH["min_latency"],
+        LATENCY_SKETCH["max_latency"]
+    )
+    return (np.ceil(np.log(values) / _LOG_GAMMA) - _MIN_INDEX).astype(np.intp)
+
+
+def quantiles(counts: np.ndarray, qs: List[float]) -> List[float]:
+    """Estimate quantiles from a vector of bin counts"""
+    cumulative = np.cumsum(counts, dtype=np.int64)
+    total = cumulative[-1] if len(cumulative) else 0
+    if total == 0:
+        return [0.0 for _ in qs]
+    ranks = np.asarray(qs, dtype=np.float64) * (total - 1)
+    return BIN_VALUES[np.searchsorted(cumulative, ranks, side="right")].tolist()
+
+
+def quantiles_many(counts: np.ndarray, qs: List[float]) -> np.ndarray:
+    """Estimate quantiles for every row of a [rows, N_BINS] count matrix
+
+    Returns a [rows, len(qs)] array, 0 for empty rows.
+    """
+    cumulative = np.cumsum(counts, axis=1, dtype=np.int64)
+    totals = cumulative[:, -1]
+    ranks = np.asarray(qs, dtype=np.float64)[np.newaxis, :] * np.maximum(totals - 1, 0)[:, np.newaxis]
+    # Same as searchsorted(side="right") on each row
+    indexes = (cumulative[:, np.newaxis, :] <= ranks[:, :, np.newaxis]).sum(axis=2)
+    return np.where(totals[:, np.newaxis] > 0, BIN_VALUES[np.minimum(indexes, N_BINS - 1)], 0.0)
+
+
+class LatencySketch:
+    """Fixed-range logarithmic latency histogram that merges by addition"""
+
+    def __init__(self, counts: np.ndarray = None):
+        self.counts = np.zeros(N_BINS, dtype=np.uint32) if counts is None else counts
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum())
+
+    def add(self, values):
+        """Add one or more latencies (ms) to the sketch"""
+        np.add.at(self.counts, bin_indexes(np.atleast_1d(values)), 1)
+
+    def merge(self, other: "LatencySketch"):
+        """Merge another sketch into this one"""
+        self.counts += other.counts
+
+    def quantile(self, q: float) -> float:
+        """Estimate a single quantile"""
+        return quantiles(self.counts, [q])[0]
+
+    def to_dict(self) -> Dict:
+        """Compact form for merging on another node: the span of non-empty bins"""
+        filled = np.flatnonzero(self.counts)
+        first, last = (int(filled[0]), int(filled[-1])) if len(filled) else (0, -1)
+        return {
+            "relative_accuracy": LATENCY_SKETCH["relative_accuracy"],
+            "min_latency": LATENCY_SKETCH["min_latency"],
+            "offset": first,
+            "counts": self.counts[first:last + 1].tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "LatencySketch":
+        """Rebuild a sketch produced by to_dict with the same LATENCY_SKETCH settings"""
+        if (data["relative_accuracy"] != LATENCY_SKETCH["relative_accuracy"]
+                or data["min_latency"] != LATENCY_SKETCH["min_latency"]):
+            raise ValueError("Sketch was built with different LATENCY_SKETCH settings")
+        offset = data["offset"]
+        if offset < 0 or offset + len(data["counts"]) > N_BINS:
+            raise ValueError("Sketch bins out of range")
+        sketch = cls()
+        sketch.counts[offset:offset + len(data["counts"])] = data["counts"]
+        return sketch
@@ -0,0 +1,203 @@
+"""
+Test script for the OpenAI analysis cache against a local stub OpenAI server
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.integrations.analysis_cache import CachedAnalyzer
+from src.integrations.openai_analyzer import OpenAIAnalyzer
+
+
+class StubOpenAI:
+    """Answers chat completion requests after a fixed delay and counts them"""
+
+    def __init__(self, delay: float = 0.2, tokens: int = 300):
+        self.requests = []
+        self.delay = delay
+        self.tokens = tokens
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests.append(request)
+                time.sleep(stub.delay)
+                body = json.dumps({
+                    "id": f"chatcmpl-{len(stub.requests)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request["model"],
+                    "choices": [{
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": "Error rate is elevated on the auth service.\n"
+                                       "- You should roll back the latest deployment"
+                        },
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": stub.tokens - 50, "completion_tokens": 50, "total_tokens": stub.tokens}
+                }).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def analyzer(self) -> OpenAIAnalyzer:
+        return OpenAIAnalyzer("test-key", base_url=f"http://127.0.0.1:{self.server.server_port}/v1")
+
+    def close(self):
+        self.server.shutdown()
+
+
+def summary(mean: float, error_ratio: float = 0.08):
+    return {"count": 500, "mean": mean, "std": 40.0, "error_ratio": error_ratio, "rate": 8.3,
+            "p50": mean * 0.8, "p95": mean * 2, "p99": mean * 3}
+
+
+def alert(severity: str = "warning", value: str = "8.00%"):
+    return {"service": "auth-service", "endpoint": None, "rule": "error_rate", "severity": severity,
+            "title": f"{severity.capitalize()}: High Error Rate", "message": f"Error rate ({value}) exceeds threshold",
+            "timestamp": datetime.utcnow()}
+
+
+async def check_near_identical_inputs_hit_cache():
+    """Inputs that differ only slightly reuse one analysis"""
+    print("\n=== Cache hits ===")
+    stub = StubOpenAI()
+    analyzer = CachedAnalyzer(stub.analyzer(), ttl=60, max_entries=16, tokens_per_minute=100000)
+    try:
+        first = await analyzer.analyze_metrics(summary(250.0), [alert(value="8.00%")])
+        second = await analyzer.analyze_metrics(summary(252.0), [alert(value="8.10%")])
+        different = await analyzer.analyze_metrics(summary(250.0), [alert("critical", "12.00%")])
+        stats = analyzer.get_stats()
+        print(f"{len(stub.requests)} model calls for 3 requests: {stats}")
+        assert len(stub.requests) == 2
+        assert first is second and different is not first
+        assert first["recommendations"] == ["You should roll back the latest deployment"]
+        assert stats["hits"] == 1 and stats["tokens"] == 600 and stats["saved_seconds"] > 0.1
+    finally:
+        stub.close()
+
+
+async def check_concurrent_requests_single_flight():
+    """Identical concurrent requests share one model call"""
+    print("\n=== Single flight ===")
+    stub = StubOpenAI(delay=0.3)
+    analyzer = CachedAnalyzer(stub.analyzer(), ttl=60, max_entries=16, tokens_per_minute=100000)
+    try:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(analyzer.analyze_metrics(summary(400.0), [alert()]) for _ in range(20)))
+        elapsed = time.perf_counter() - start
+        stats = analyzer.get_stats()
+        print(f"20 requests in {elapsed:.2f}s with {len(stub.requests)} model call: {stats}")
+        assert len(stub.requests) == 1 and stats["coalesced"] == 19
+        assert all(result is results[0] for result in results)
+        assert stats["hit_rate"] == 0.95
+    finally:
+        stub.close()
+
+
+async def check_batches_single_flight():
+    """Repeated fingerprints in a batch and in concurrent batches share one model call"""
+    print("\n=== Batch single flight ===")
+    stub = StubOpenAI(delay=0.3)
+    analyzer = CachedAnalyzer(stub.analyzer(), ttl=60, max_entries=16, tokens_per_minute=100000)
+    errors = {**alert(), "metrics": summary(400.0)}
+    latency = {**alert(), "rule": "response_time", "title": "Warning: High Latency", "metrics": summary(900.0)}
+    try:
+        first, second = await asyncio.gather(
+            analyzer.analyze_alerts([errors, dict(errors), latency]),
+            analyzer.analyze_alerts([dict(latency), dict(errors)])
+        )
+        stats = analyzer.get_stats()
+        prompt = stub.requests[0]["messages"][1]["content"]
+        print(f"{len(stub.requests)} model call for 5 alerts: {stats}")
+        assert len(stub.requests) == 1 and len(re.findall(r"^Alert \d+:", prompt, re.MULTILINE)) == 2
+        assert first[0] is first[1] and second == [first[2], first[0]]
+        assert stats["coalesced"] == 3 and stats["tokens"] == 300
+
+        # Afterwards both fingerprints are cached
+        again = await analyzer.analyze_alerts([errors, latency])
+        assert len(stub.requests) == 1 and again == [first[0], first[2]]
+    finally:
+        stub.close()
+
+
+async def check_budget_falls_back():
+    """Past the per-minute budget, stale or rule-based analyses are returned without calling the model"""
+    print("\n=== Budget ===")
+    stub = StubOpenAI(tokens=300)
+    analyzer = CachedAnalyzer(stub.analyzer(), ttl=0.05, max_entries=16, tokens_per_minute=1200)
+    try:
+        first = await analyzer.analyze_metrics(summary(250.0), [alert()])
+        await asyncio.sleep(0.1)
+        # Expired, but the budget cannot fit another call: the stale analysis stands in
+        stale = await analyzer.analyze_metrics(summary(250.0), [alert()])
+        rules = await analyzer.analyze_metrics(summary(1500.0, 0.2), [alert("critical", "20.00%")])
+        stats = analyzer.get_stats()
+        print(f"{len(stub.requests)} model call, fallbacks: {stats['budget_fallbacks']}, rules: {rules['analysis']}")
+        assert len(stub.requests) == 1 and stats["budget_fallbacks"] == 2
+        assert stale is first
+        assert rules["source"] == "rules" and rules["severity"] == "danger" and rules["recommendations"]
+    finally:
+        stub.close()
+
+
+async def check_lru_eviction():
+    """The cache holds at most max_entries analyses, evicting the least recently used"""
+    print("\n=== LRU ===")
+    stub = StubOpenAI(delay=0)
+    analyzer = CachedAnalyzer(stub.analyzer(), ttl=60, max_entries=2, tokens_per_minute=100000)
+    try:
+        for mean in (100.0, 200.0, 100.0, 400.0, 100.0, 200.0):
+            await analyzer.analyze_metrics(summary(mean), [alert()])
+        print(f"{len(stub.requests)} model calls, {analyzer.get_stats()['cache_entries']} cached")
+        # 200 was evicted by 400 while 100 stayed recently used
+        assert len(stub.requests) == 4 and len(analyzer.cache.entries) == 2
+    finally:
+        stub.close()
+
+
+def test_near_identical_inputs_hit_cache():
+    asyncio.run(check_near_identical_inputs_hit_cache())
+
+
+def test_concurrent_requests_single_flight():
+    asyncio.run(check_concurrent_requests_single_flight())
+
+
+def test_batches_single_flight():
+    asyncio.run(check_batches_single_flight())
+
+
+def test_budget_falls_back():
+    asyncio.run(check_budget_falls_back())
+
+
+def test_lru_eviction():
+    asyncio.run(check_lru_eviction())
+
+
+async def main():
+    """Run all tests"""
+    await check_near_identical_inputs_hit_cache()
+    await check_concurrent_requests_single_flight()
+    await check_batches_single_flight()
+    await check_budget_falls_back()
+    await check_lru_eviction()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
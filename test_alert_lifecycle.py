@@ -0,0 +1,165 @@
+"""
+Test script for the alert lifecycle driven by detector breaches: open, resolve, reopen, flap and manual resolve
+"""
+import asyncio
+from datetime import datetime, timedelta
+from src.alerts.alert_manager import AlertManager
+from src.analyzers.anomaly_detector import AnomalyDetector
+from src.config.settings import ALERT_SETTINGS
+from src.storage.backend import InMemoryBackend
+from src.storage.database import Database
+
+KEY = ("checkout", "/pay", "response_time")
+BREACH = 600.0   # above the response time warning threshold
+HEALTHY = 100.0
+
+
+class RecordingNotifier:
+    """Keeps the alerts submitted for delivery"""
+
+    def __init__(self):
+        self.sent = []
+
+    def submit(self, alert):
+        self.sent.append(alert["_id"])
+
+    async def stop(self):
+        pass
+
+
+def make_detector() -> AnomalyDetector:
+    db = Database(InMemoryBackend())
+    manager = AlertManager(db)
+    manager.notifier = RecordingNotifier()
+    return AnomalyDetector(db, manager)
+
+
+async def check(detector: AnomalyDetector, response_time: float) -> dict:
+    """One evaluation of the checked series; returns the alert state tracking it"""
+    await detector._check_response_time("checkout", "/pay", response_time)
+    return detector.alert_manager.incidents.get(KEY)
+
+
+async def resolve_by_clearing(detector: AnomalyDetector):
+    """Clear the condition and run maintenance once it has stayed clear long enough"""
+    await check(detector, HEALTHY)
+    later = datetime.utcnow() + timedelta(seconds=ALERT_SETTINGS["resolve_after"] + 1)
+    await detector.alert_manager.maintain(later)
+
+
+async def check_open_and_resolve():
+    """A persisting breach keeps one alert open; it resolves after staying clear"""
+    print("\n=== Open and resolve ===")
+    detector = make_detector()
+    manager = detector.alert_manager
+    state = await check(detector, BREACH)
+    alert_id = state["id"]
+    for _ in range(3):
+        state = await check(detector, BREACH)
+    print(f"Alert {alert_id}: {state['status']}, {state['alert']['occurrences']} occurrences")
+    assert state["id"] == alert_id and state["status"] == "new"
+    assert state["alert"]["occurrences"] == 4 and manager.notifier.sent == [alert_id]
+
+    # Clearing only starts the resolve timer
+    await check(detector, HEALTHY)
+    await manager.maintain()
+    assert state["status"] == "new" and state["clear_since"] is not None
+    await resolve_by_clearing(detector)
+    assert state["status"] == "resolved" and state["alert"]["auto_resolved"]
+
+
+async def check_reopen_and_flap():
+    """Firing again within the cooldown reopens the alert until it is marked flapping"""
+    print("\n=== Reopen and flap ===")
+    detector = make_detector()
+    manager = detector.alert_manager
+    alert_id = (await check(detector, BREACH))["id"]
+    for reopens in range(1, ALERT_SETTINGS["flap_threshold"] + 1):
+        await resolve_by_clearing(detector)
+        state = await check(detector, BREACH)
+        assert state["id"] == alert_id and state["status"] == "new"
+        assert state["alert"]["reopens"] == reopens
+    print(f"Alert {alert_id}: {state['alert']['reopens']} reopens, flapping {state['alert']['flapping']}")
+    assert state["alert"]["flapping"]
+    # Notified when opened and on each reopen before it started flapping
+    assert manager.notifier.sent == [alert_id] * ALERT_SETTINGS["flap_threshold"]
+
+
+async def check_manual_resolve_during_breach():
+    """A breach that still holds after a manual resolve is reported again"""
+    print("\n=== Manual resolve ===")
+    detector = make_detector()
+    manager = detector.alert_manager
+    alert_id = (await check(detector, BREACH))["id"]
+    await manager.update_status(alert_id, "resolved")
+    assert manager.incidents[KEY]["status"] == "resolved"
+
+    state = await check(detector, BREACH)
+    print(f"Alert {alert_id}: {state['status']} after manual resolve, {state['alert']['reopens']} reopens")
+    assert state["id"] == alert_id and state["status"] == "new" and state["alert"]["reopens"] == 1
+    assert manager.notifier.sent == [alert_id, alert_id]
+    stored = await manager.db.backend.list_alerts()
+    assert [alert["status"] for alert in stored] == ["new"]
+
+    # The reopened alert is tracked as usual from then on
+    await check(detector, BREACH)
+    assert state["alert"]["occurrences"] == 3 and len(manager.notifier.sent) == 2
+
+
+async def check_recent_alerts():
+    """Recent alerts are those last seen in the period, found through the store's indexes"""
+    print("\n=== Recent alerts ===")
+    manager = make_detector().alert_manager
+    now = datetime.utcnow()
+    hours_ago = lambda hours: now - timedelta(hours=hours)
+
+    async def opened(name: str, hours: float, last_seen: float = None, resolved: float = None) -> str:
+        alert_id = await manager.create_alert({"service": name, "title": name, "message": "", "severity": "info",
+                                               "timestamp": hours_ago(hours)})
+        if last_seen is not None:
+            await manager.db.update_alert(alert_id, {"last_seen": hours_ago(last_seen)})
+        if resolved is not None:
+            await manager.db.update_alert(alert_id, {"status": "resolved", "resolved_at": hours_ago(resolved)})
+        return alert_id
+
+    # Alerts are resolved in time order, as the store expects
+    await opened("archived", 40, resolved=39)
+    await opened("resolved-long-ago", 30, resolved=29)
+    still_open = await opened("still-open", 30, last_seen=1)
+    await opened("quiet", 30, last_seen=26)
+    resolved_lately = await opened("resolved-lately", 30, last_seen=3, resolved=2)
+    await manager.db.archive_alerts(hours_ago(38))
+    new = await opened("new", 1)
+
+    recent = (await manager.get_recent_alerts(hours=24))["alerts"]
+    print(f"Recent: {[alert['service'] for alert in recent]}")
+    assert [alert["_id"] for alert in recent] == [still_open, resolved_lately, new]
+    assert recent == [alert for alert in await manager.db.backend.list_alerts() if alert["last_seen"] >= hours_ago(24)]
+
+
+def test_open_and_resolve():
+    asyncio.run(check_open_and_resolve())
+
+
+def test_reopen_and_flap():
+    asyncio.run(check_reopen_and_flap())
+
+
+def test_manual_resolve_during_breach():
+    asyncio.run(check_manual_resolve_during_breach())
+
+
+def test_recent_alerts():
+    asyncio.run(check_recent_alerts())
+
+
+async def main():
+    """Run all tests"""
+    await check_open_and_resolve()
+    await check_reopen_and_flap()
+    await check_manual_resolve_during_breach()
+    await check_recent_alerts()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,145 @@
+"""
+Test script for the adaptive baseline monitor: bucketing, backfill and scoring
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from src.analyzers.baselines import METRICS, BaselineMonitor
+from src.storage.backend import InMemoryBackend
+from src.storage.columnar import to_epoch_ns
+from src.storage.database import Database
+
+BUCKET = 60
+
+
+def minute_logs(start: datetime, minutes: int, per_minute: int = 20, latency: float = 100.0, seed: int = 0) -> list:
+    """per_minute logs of one endpoint in every minute from start, with normally distributed latency"""
+    rng = np.random.default_rng(seed)
+    return [{
+        "timestamp": start + timedelta(minutes=minute, seconds=i * 60 / per_minute),
+        "service": "checkout",
+        "endpoint": "/pay",
+        "response_time": float(rng.normal(latency, latency * 0.1)),
+        "error": False
+    } for minute in range(minutes) for i in range(per_minute)]
+
+
+def bucket_start(when: datetime) -> datetime:
+    """Start of the baseline bucket holding when"""
+    return when - timedelta(seconds=when.second, microseconds=when.microsecond)
+
+
+async def check_future_and_out_of_order_timestamps():
+    """Far-future logs are dropped without allocating their time span; shuffled logs land in their own buckets"""
+    print("\n=== Timestamps ===")
+    db = Database(InMemoryBackend())
+    monitor = BaselineMonitor(bucket_seconds=BUCKET)
+    now = bucket_start(datetime.utcnow())
+    logs = minute_logs(now - timedelta(minutes=3), 3)
+    logs.append({**logs[0], "timestamp": now + timedelta(days=5 * 365)})
+    logs.reverse()
+    batch = db.backend.log_store.encode(logs)
+
+    started = time.perf_counter()
+    monitor.add(batch, now=now)
+    elapsed = time.perf_counter() - started
+    print(f"Added {len(logs)} logs into {len(monitor.open)} buckets in {elapsed * 1000:.2f}ms")
+    assert elapsed < 0.5
+    expected = [to_epoch_ns(now - timedelta(minutes=m)) // (BUCKET * 10 ** 9) for m in (3, 2, 1)]
+    assert sorted(monitor.open) == expected
+    # Every bucket holds its 20 logs for the endpoint and for the service as a whole
+    assert all(counts.tolist() == [20, 20] for counts, _, _ in monitor.open.values())
+
+
+async def check_quiet_series_stays_quiet():
+    """After a backfill, steady traffic raises nothing and a latency spike is flagged"""
+    print("\n=== Backfill ===")
+    db = Database(InMemoryBackend())
+    now = bucket_start(datetime.utcnow())
+    await db.store_logs(minute_logs(now - timedelta(hours=6), 6 * 60))
+    monitor = BaselineMonitor(bucket_seconds=BUCKET)
+    await monitor.backfill(db, days=0.25)
+
+    flagged = []
+    for minute in range(30):
+        live = now + timedelta(minutes=minute)
+        latency = 500.0 if minute == 20 else 100.0
+        monitor.add(db.backend.log_store.encode(minute_logs(live, 1, latency=latency, seed=minute + 1)), now=live)
+        for result in monitor.close_buckets(live + timedelta(minutes=2)):
+            for metric in ("response_time", "error_rate", "request_rate"):
+                flagged += [(result["bucket"], metric, s) for s in result[metric]["severity"] if s]
+    print(f"Flagged: {flagged}")
+    assert [(bucket, metric) for bucket, metric, _ in flagged] == [(now + timedelta(minutes=20), "response_time")] * 2
+    assert {severity for _, _, severity in flagged} == {"critical"}
+
+
+async def check_new_series_waits_for_history():
+    """A series without history is not judged on its first bucket"""
+    print("\n=== Readiness ===")
+    db = Database(InMemoryBackend())
+    monitor = BaselineMonitor(bucket_seconds=BUCKET)
+    now = bucket_start(datetime.utcnow())
+    monitor.close_buckets(now)
+    monitor.add(db.backend.log_store.encode(minute_logs(now, 1, latency=5000.0)), now=now)
+    results = monitor.close_buckets(now + timedelta(minutes=3))
+    assert results and all(
+        s is None for result in results for metric in ("response_time", "request_rate")
+        for s in result[metric]["severity"]
+    )
+
+
+class FixedDetector:
+    """Scores every bucket with fixed z-scores per series (NaN while not ready)"""
+
+    def __init__(self, z: list):
+        self.z = np.array(z, dtype=np.float64)
+
+    def score(self, values: np.ndarray, bucket_id: int):
+        return self.z, np.zeros(len(self.z))
+
+    def update(self, values: np.ndarray, bucket_id: int):
+        pass
+
+
+async def check_detectors_vote():
+    """A bucket is flagged only when enough of the ready detectors agree"""
+    print("\n=== Voting ===")
+    monitor = BaselineMonitor(bucket_seconds=BUCKET)
+    nan = np.nan
+    # Series: one detector out of three, two out of two ready, the only ready one, none ready
+    scores = {"ewma": [9, 9, 9, nan], "mad": [1, 8, nan, nan], "seasonal": [1, nan, nan, nan]}
+    for metric in METRICS:
+        monitor.detectors[metric] = {name: FixedDetector(z) for name, z in scores.items()}
+    result = monitor._score(0, {metric: np.zeros(4) for metric in METRICS})
+    print(f"Severities: {result['response_time']['severity']}")
+    assert result["response_time"]["severity"] == [None, "critical", "critical", None]
+    assert result["response_time"]["z"][:3].tolist() == [1, 8, 9]
+
+
+def test_future_and_out_of_order_timestamps():
+    asyncio.run(check_future_and_out_of_order_timestamps())
+
+
+def test_quiet_series_stays_quiet():
+    asyncio.run(check_quiet_series_stays_quiet())
+
+
+def test_new_series_waits_for_history():
+    asyncio.run(check_new_series_waits_for_history())
+
+
+def test_detectors_vote():
+    asyncio.run(check_detectors_vote())
+
+
+async def main():
+    """Run all tests"""
+    await check_future_and_out_of_order_timestamps()
+    await check_quiet_series_stays_quiet()
+    await check_new_series_waits_for_history()
+    await check_detectors_vote()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,138 @@
+"""
+Test script for the bulk indexer and spill queue against a local stub Elasticsearch
+"""
+import asyncio
+import json
+import tempfile
+from aiohttp import web
+from elasticsearch import AsyncElasticsearch
+from src.collectors.bulk_indexer import BulkIndexer
+from src.collectors.spill_queue import SpillQueue
+
+HEADERS = {"X-Elastic-Product": "Elasticsearch"}
+
+
+class StubElasticsearch:
+    """Answers `_bulk` requests, refusing the next `reject` requests with a status"""
+
+    def __init__(self):
+        self.stored = []
+        self.requests = 0
+        self.reject = []
+        self.available = True
+
+    async def bulk(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        lines = (await request.read()).splitlines()
+        if not self.available:
+            return web.json_response({"error": "unavailable", "status": 503}, status=503, headers=HEADERS)
+        if self.reject:
+            status = self.reject.pop(0)
+            return web.json_response({"error": {"type": "illegal_argument_exception"}, "status": status},
+                                     status=status, headers=HEADERS)
+        docs = [json.loads(line) for line in lines[1::2]]
+        self.stored.extend(docs)
+        return web.json_response({"took": 1, "errors": False, "items": [{"index": {"status": 201}} for _ in docs]},
+                                 headers=HEADERS)
+
+    async def ping(self, request: web.Request) -> web.Response:
+        return web.json_response({"version": {"number": "8.11.0"}}, headers=HEADERS)
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_route("*", "/_bulk", self.bulk)
+        app.router.add_route("HEAD", "/", self.ping)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        return f"http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}"
+
+    async def close(self):
+        await self.runner.cleanup()
+
+
+def logs(start: int, count: int) -> list:
+    return [{"service": "api-gateway", "endpoint": "/orders", "response_time": 50.0, "seq": i}
+            for i in range(start, start + count)]
+
+
+async def check_rejected_batch_does_not_stop_ingestion():
+    """A batch refused with 400 is dropped and counted; the batches after it are indexed"""
+    print("\n=== Rejected batch ===")
+    stub = StubElasticsearch()
+    client = AsyncElasticsearch(await stub.start())
+    spill = SpillQueue(tempfile.mkdtemp())
+    indexer = BulkIndexer(client, max_docs=10, workers=1, max_retries=1, spill=spill)
+    try:
+        await indexer.start()
+        stub.reject = [400]
+        await indexer.add(logs(0, 10))
+        await indexer.add(logs(10, 40))
+        await indexer.stop()
+        print(f"Stats: {indexer.stats}, spill: {spill.stats}")
+        assert indexer.stats["failed"] == 10 and indexer.stats["indexed"] == 40
+        assert spill.empty and spill.stats["spilled_docs"] == 0
+        assert sorted(doc["seq"] for doc in stub.stored) == list(range(10, 50))
+    finally:
+        await client.close()
+        await stub.close()
+
+
+async def check_replay_skips_unsendable_batches():
+    """Replay drops batches that are refused or cannot be sent and delivers the rest"""
+    print("\n=== Replay ===")
+    stub = StubElasticsearch()
+    client = AsyncElasticsearch(await stub.start())
+    spill = SpillQueue(tempfile.mkdtemp())
+    indexer = BulkIndexer(client, max_docs=10, workers=1, max_retries=0, spill=spill)
+    try:
+        # An outage spills everything
+        stub.available = False
+        await indexer.start()
+        for i in range(0, 30, 10):
+            await indexer.add(logs(i, 10))
+        await indexer.stop()
+        assert spill.stats["spilled_docs"] == 30 and indexer.stats["indexed"] == 0
+
+        # The first spilled batch is refused for good, and a corrupt one cannot be sent at all
+        spill.put([b"{not json"])
+        stub.available = True
+        stub.reject = [400]
+
+        async def send(lines):
+            if lines == [b"{not json"]:
+                raise ValueError("invalid document")
+            return await indexer._send(lines)
+
+        assert await spill.replay(send, concurrency=1)
+        print(f"Stats: {indexer.stats}, spill: {spill.stats}")
+        assert spill.empty and indexer.stats["failed"] == 10 and spill.stats["dropped_docs"] == 1
+        assert sorted(doc["seq"] for doc in stub.stored) == list(range(10, 30))
+
+        # New batches go straight to Elasticsearch again
+        await indexer.start()
+        await indexer.add(logs(30, 10))
+        await indexer.stop()
+        assert len(stub.stored) == 30 and spill.empty
+    finally:
+        await client.close()
+        await stub.close()
+
+
+def test_rejected_batch_does_not_stop_ingestion():
+    asyncio.run(check_rejected_batch_does_not_stop_ingestion())
+
+
+def test_replay_skips_unsendable_batches():
+    asyncio.run(check_replay_skips_unsendable_batches())
+
+
+async def main():
+    """Run all tests"""
+    await check_rejected_batch_does_not_stop_ingestion()
+    await check_replay_skips_unsendable_batches()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+"""
+Test script for the columnar log store: chunked appends, scans and eviction
+"""
+import asyncio
+from datetime import datetime, timedelta
+from src.storage.columnar import ColumnarLogStore, to_epoch_ns
+
+
+def logs_at(when: datetime, count: int) -> list:
+    return [{
+        "timestamp": when + timedelta(seconds=i),
+        "service": "checkout",
+        "endpoint": "/pay",
+        "response_time": 100.0
+    } for i in range(count)]
+
+
+async def check_eviction_after_future_log():
+    """A chunk holding a future-dated log does not keep older chunks alive"""
+    print("\n=== Eviction ===")
+    store = ColumnarLogStore(chunk_size=4)
+    now = datetime.utcnow()
+    store.append(store.encode(logs_at(now + timedelta(days=365), 1)))
+    for hours in (4, 3, 2):
+        store.append(store.encode(logs_at(now - timedelta(hours=hours), 5)))
+    assert len(store) == 16
+
+    # Chunks: [future, 4h x3], [4h x2, 3h x2], [3h x3, 2h], [2h x4]
+    store.evict_before(to_epoch_ns(now - timedelta(hours=2.5)))
+    print(f"Kept {len(store)} rows in {len(store.chunks)} chunks")
+    assert len(store) == 12
+    rows = store.scan(to_epoch_ns(now - timedelta(hours=5)), to_epoch_ns(now), ["timestamp"])
+    assert len(rows["timestamp"]) == 11
+
+    store.evict_before(to_epoch_ns(now - timedelta(hours=1)))
+    assert len(store) == 4
+    assert len(store.scan(to_epoch_ns(now - timedelta(hours=5)), to_epoch_ns(now))["timestamp"]) == 3
+
+    # Appends and scans keep working after eviction
+    store.append(store.encode(logs_at(now, 6)))
+    assert len(store.scan(to_epoch_ns(now), to_epoch_ns(now + timedelta(minutes=1)))["timestamp"]) == 6
+
+
+def test_eviction_after_future_log():
+    asyncio.run(check_eviction_after_future_log())
+
+
+async def main():
+    """Run all tests"""
+    await check_eviction_after_future_log()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
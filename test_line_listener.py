@@ -0,0 +1,120 @@
+"""
+Test script for the UDP/TCP line listener: TCP backpressure and oversized lines
+"""
+import asyncio
+import json
+import socket
+from src.collectors.line_listener import LineListener
+from src.config.settings import LISTENER
+
+
+def line(seq: int) -> bytes:
+    return json.dumps({"service": "checkout", "endpoint": "/pay", "response_time": 80.0, "request_id": str(seq)}).encode()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class BlockingCollector:
+    """Stores logs once released"""
+
+    def __init__(self):
+        self.logs = []
+        self.released = asyncio.Event()
+
+    async def ingest(self, logs):
+        await self.released.wait()
+        self.logs.extend(logs)
+
+
+async def wait_for(condition, timeout: float = 5):
+    for _ in range(int(timeout / 0.02)):
+        if condition():
+            return
+        await asyncio.sleep(0.02)
+    raise AssertionError("timed out")
+
+
+async def check_tcp_backpressure():
+    """A full queue pauses TCP connections instead of dropping their lines"""
+    print("\n=== TCP backpressure ===")
+    collector = BlockingCollector()
+    listener = LineListener(collector, host="127.0.0.1", udp_port=0, tcp_port=free_port())
+    listener.batch_size = 10
+    listener.queue = asyncio.Queue(maxsize=2)
+    await listener.start()
+    try:
+        _, writer = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+        for start in range(0, 500, 10):
+            writer.write(b"".join(line(seq) + b"\n" for seq in range(start, start + 10)))
+            await asyncio.sleep(0.005)
+        await wait_for(lambda: listener.paused)
+        print(f"Paused with stats {listener.get_stats()}")
+        assert listener.stats["dropped"] == 0 and listener.queue.full()
+        assert listener.queue_depth == sum(len(batch) for batch in listener.queue._queue) + len(listener._pending)
+
+        # A second connection sending while the queue is full is held back and paused too
+        _, other = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+        other.write(b"".join(line(seq) + b"\n" for seq in range(500, 520)))
+        await wait_for(lambda: len(listener.paused) == 2)
+        assert listener.stats["dropped"] == 0
+
+        collector.released.set()
+        for stream in (writer, other):
+            await stream.drain()
+            stream.close()
+        await wait_for(lambda: len(collector.logs) == 520)
+        assert sorted(int(log["request_id"]) for log in collector.logs) == list(range(520))
+        assert listener.stats["dropped"] == 0 and not listener.paused and listener.queue_depth == 0
+    finally:
+        collector.released.set()
+        await listener.stop()
+
+
+async def check_oversized_tcp_line_is_skipped():
+    """The rest of a rejected oversized line is discarded up to its newline"""
+    print("\n=== Oversized line ===")
+    collector = BlockingCollector()
+    collector.released.set()
+    listener = LineListener(collector, host="127.0.0.1", udp_port=0, tcp_port=free_port())
+    max_line_bytes = LISTENER["max_line_bytes"]
+    LISTENER["max_line_bytes"] = 100
+    await listener.start()
+    try:
+        _, writer = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+        writer.write(line(0) + b"\n" + b"x" * 200)
+        await writer.drain()
+        await wait_for(lambda: listener.stats["rejected"] == 1)
+        # The tail of the oversized line is valid JSON on its own
+        writer.write(line(1) + b"\n" + line(2) + b"\n")
+        await writer.drain()
+        writer.close()
+        await wait_for(lambda: listener.stats["received"] == 2)
+        await listener.stop()
+        print(f"Stats: {listener.stats}")
+        assert [int(log["request_id"]) for log in collector.logs] == [0, 2]
+        assert listener.stats["rejected"] == 1
+    finally:
+        LISTENER["max_line_bytes"] = max_line_bytes
+        await listener.stop()
+
+
+def test_tcp_backpressure():
+    asyncio.run(check_tcp_backpressure())
+
+
+def test_oversized_tcp_line_is_skipped():
+    asyncio.run(check_oversized_tcp_line_is_skipped())
+
+
+async def main():
+    """Run all tests"""
+    await check_tcp_backpressure()
+    await check_oversized_tcp_line_is_skipped()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
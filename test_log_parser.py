@@ -0,0 +1,72 @@
+"""
+Test script for pushed log validation and NDJSON parsing
+"""
+import asyncio
+import json
+from src.collectors.log_parser import NDJSONDecoder, parse_lines
+
+GOOD = {"service": "checkout", "endpoint": "/pay", "response_time": 120.5, "status_code": 200}
+
+BAD = [
+    {"timestamp": True},
+    {"timestamp": [1, 2]},
+    {"timestamp": {"ms": 1}},
+    {"timestamp": 10 ** 20},
+    {"timestamp": 1e300},
+    {"status_code": 100000},
+    {"status_code": -1},
+    {"response_size": 2 ** 31},
+    {"response_size": -5},
+    {"response_time": "nan"},
+    {"response_time": "inf"},
+    {"response_time": "-5"},
+    {"response_time": -5.0},
+    {"response_time": float("nan")},
+    {"response_time": 1e39}
+]
+
+
+async def check_bad_values_are_line_errors():
+    """Malformed or out-of-range values fail their own line only"""
+    print("\n=== Bad values ===")
+    lines = [json.dumps(GOOD).encode()]
+    lines += [json.dumps({**GOOD, **fields}).encode() for fields in BAD]
+    lines.append(json.dumps({**GOOD, "timestamp": 1700000000000, "response_size": 512}).encode())
+
+    logs, errors = parse_lines(lines)
+    for index, message in errors:
+        print(f"line {index}: {message}")
+    assert [index for index, _ in errors] == list(range(1, len(BAD) + 1))
+    assert len(logs) == 2 and logs[1]["response_size"] == 512
+
+
+async def check_decoder_keeps_good_lines():
+    """A streamed body with bad lines still yields every valid log"""
+    print("\n=== Decoder ===")
+    body = b"\n".join(json.dumps({**GOOD, **fields}).encode() for fields in [{}] + BAD + [{}]) + b"\n"
+    decoder = NDJSONDecoder()
+    logs, errors = [], []
+    for chunk_logs, chunk_errors in decoder.feed(body):
+        logs += chunk_logs
+        errors += chunk_errors
+    print(f"{len(logs)} logs, {len(errors)} errors")
+    assert len(logs) == 2 and len(errors) == len(BAD)
+    assert errors[0].startswith("line 2:")
+
+
+def test_bad_values_are_line_errors():
+    asyncio.run(check_bad_values_are_line_errors())
+
+
+def test_decoder_keeps_good_lines():
+    asyncio.run(check_decoder_keeps_good_lines())
+
+
+async def main():
+    """Run all tests"""
+    await check_bad_values_are_line_errors()
+    await check_decoder_keeps_good_lines()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
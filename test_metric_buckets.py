@@ -0,0 +1,40 @@
+"""
+Test script for the pre-aggregated metric bucket rings
+"""
+import asyncio
+from datetime import timedelta
+import numpy as np
+from src.storage.metric_buckets import EPOCH, MetricBucketStore
+
+WIDTH = 60
+
+
+async def check_future_log_does_not_claim_slot():
+    """A log dated one ring length ahead is dropped instead of displacing the current bucket"""
+    print("\n=== Future log ===")
+    store = MetricBucketStore(bucket_width=WIDTH, retention_hours=1)
+    now = 1_700_000_000 // WIDTH * WIDTH + 30
+    # Same ring slot as the current bucket, one hour ahead
+    store.add("checkout", np.array([now + 3600]), np.array([100.0]), np.array([False]), now=now)
+    store.add("checkout", np.full(10, now), np.full(10, 100.0), np.zeros(10, bool), now=now)
+    # Within the clock skew allowance logs still count
+    store.add("checkout", np.array([now + 45]), np.array([300.0]), np.array([True]), now=now)
+
+    end = EPOCH + timedelta(seconds=now)
+    series = store.series(end - timedelta(minutes=5), end + timedelta(minutes=5))["checkout"]
+    print(f"Buckets {series['timestamps'].tolist()}, requests {series['request_rates'].tolist()}")
+    assert series["timestamps"].tolist() == [now // WIDTH * WIDTH, now // WIDTH * WIDTH + WIDTH]
+    assert series["request_rates"].tolist() == [10, 1] and series["error_rates"].tolist() == [0, 1]
+
+
+def test_future_log_does_not_claim_slot():
+    asyncio.run(check_future_log_does_not_claim_slot())
+
+
+async def main():
+    """Run all tests"""
+    await check_future_log_does_not_claim_slot()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,260 @@
+"""
+Test script for the alert notification dispatcher against a local fake SNS endpoint
+"""
+import asyncio
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+import boto3
+from botocore.config import Config
+from src.alerts.alert_manager import AlertManager
+from src.alerts.enrichment import AnalysisEnricher
+from src.alerts.notifier import NotificationDispatcher, SNSChannel
+from src.config.settings import AI_ENRICHMENT, NOTIFICATIONS
+from src.storage.backend import InMemoryBackend
+from src.storage.database import Database
+
+TOPIC_ARN = "arn:aws:sns:us-east-1:000000000000:alerts"
+
+PUBLISH_RESPONSE = b"""<PublishResponse xmlns="http://sns.amazonaws.com/doc/2010-03-31/">
+  <PublishResult><MessageId>00000000-0000-0000-0000-000000000000</MessageId></PublishResult>
+  <ResponseMetadata><RequestId>00000000-0000-0000-0000-000000000001</RequestId></ResponseMetadata>
+</PublishResponse>"""
+
+
+class FakeSNS:
+    """Accepts SNS Publish calls over HTTP, optionally slow or failing"""
+
+    def __init__(self, delay: float = 0, failures: int = 0):
+        self.messages = []
+        self.attempts = 0
+        self.delay = delay
+        self.failures = failures
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                params = {k: v[0] for k, v in parse_qs(body.decode()).items()}
+                fake.attempts += 1
+                time.sleep(fake.delay)
+                if fake.failures:
+                    fake.failures -= 1
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                fake.messages.append(params)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml")
+                self.send_header("Content-Length", str(len(PUBLISH_RESPONSE)))
+                self.end_headers()
+                self.wfile.write(PUBLISH_RESPONSE)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def client(self):
+        return boto3.client(
+            "sns",
+            region_name="us-east-1",
+            endpoint_url=self.url,
+            aws_access_key_id="test",
+            aws_secret_access_key="test",
+            config=Config(retries={"total_max_attempts": 1})
+        )
+
+    def close(self):
+        self.server.shutdown()
+
+
+def make_alert(i: int, severity: str = "warning"):
+    return {
+        "service": f"service-{i % 3}",
+        "title": f"Alert {i}",
+        "message": f"Condition {i} breached",
+        "severity": severity,
+        "timestamp": datetime.utcnow()
+    }
+
+
+async def check_storm_is_coalesced():
+    """A burst of alerts goes out as a few rate-limited digests"""
+    print("\n=== Storm digests ===")
+    NOTIFICATIONS["rate_limits"]["sns"] = {"rate": 4, "burst": 1}
+    sns = FakeSNS()
+    dispatcher = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)])
+    try:
+        for i in range(200):
+            dispatcher.submit(make_alert(i))
+        await dispatcher.stop(timeout=10)
+        stats = dispatcher.get_stats()
+        print(f"{len(sns.messages)} messages for 200 alerts: {stats}")
+        assert stats["delivered"] == 200 and stats["dropped"] == 0
+        assert len(sns.messages) <= 10
+        assert any(m["Subject"].startswith("API Alerts: ") for m in sns.messages)
+        assert all(m["TopicArn"] == TOPIC_ARN for m in sns.messages)
+    finally:
+        sns.close()
+
+
+async def check_submit_does_not_wait():
+    """Queuing alerts returns at once even when SNS is slow"""
+    print("\n=== Non-blocking submit ===")
+    sns = FakeSNS(delay=0.5)
+    dispatcher = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)])
+    try:
+        start = time.perf_counter()
+        for i in range(100):
+            dispatcher.submit(make_alert(i))
+        elapsed = time.perf_counter() - start
+        print(f"Queued 100 alerts in {elapsed * 1000:.2f}ms")
+        assert elapsed < 0.1
+        await dispatcher.stop(timeout=10)
+        assert dispatcher.get_stats()["delivered"] == 100
+    finally:
+        sns.close()
+
+
+async def check_failures_are_retried():
+    """Publish errors are retried with backoff until they succeed"""
+    print("\n=== Retries ===")
+    NOTIFICATIONS["retry_base_delay"] = 0.01
+    sns = FakeSNS(failures=2)
+    dispatcher = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)], workers=1)
+    try:
+        dispatcher.submit(make_alert(1, "critical"))
+        await dispatcher.stop(timeout=10)
+        stats = dispatcher.get_stats()
+        print(f"{sns.attempts} attempts: {stats}")
+        assert sns.attempts == 3 and stats["retried"] == 2
+        assert stats["delivered"] == 1 and len(sns.messages) == 1
+        assert sns.messages[0]["Subject"] == "API Alert: Alert 1"
+    finally:
+        sns.close()
+
+
+async def check_full_queue_drops():
+    """Alerts beyond the queue size are dropped and counted, never awaited"""
+    print("\n=== Bounded queue ===")
+    sns = FakeSNS(delay=0.2)
+    dispatcher = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)], queue_size=10, workers=1)
+    try:
+        accepted = sum(dispatcher.submit(make_alert(i)) for i in range(50))
+        stats = dispatcher.get_stats()
+        print(f"Accepted {accepted} of 50: {stats}")
+        assert accepted == 10 and stats["dropped"] == 40
+        await dispatcher.stop(timeout=10)
+    finally:
+        sns.close()
+
+
+async def check_alert_manager_delivery():
+    """Alerts raised through the manager reach SNS once per incident"""
+    print("\n=== Alert manager ===")
+    NOTIFICATIONS["rate_limits"]["sns"] = {"rate": 100, "burst": 100}
+    sns = FakeSNS(delay=0.2)
+    manager = AlertManager(Database(InMemoryBackend()))
+    manager.notifier = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)])
+    try:
+        start = time.perf_counter()
+        for _ in range(20):
+            await manager.create_alert({**make_alert(7), "rule": "error_rate"})
+        await manager.create_alert({**make_alert(8, "info"), "rule": "error_rate"})
+        elapsed = time.perf_counter() - start
+        await manager.stop()
+        print(f"Raised 21 alerts in {elapsed * 1000:.2f}ms, {len(sns.messages)} delivered")
+        assert elapsed < 0.1
+        assert len(sns.messages) == 1 and "Alert 7" in sns.messages[0]["Message"]
+    finally:
+        sns.close()
+
+
+class StubAnalyzer:
+    """Analyzes alerts after a delay, or fails"""
+
+    def __init__(self, delay: float = 0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+
+    async def analyze_alerts(self, alerts):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("analysis unavailable")
+        return [{"analysis": f"Root cause of {alert['title']}", "recommendations": ["Roll back"]} for alert in alerts]
+
+
+async def check_notification_carries_analysis():
+    """Notifications wait for the alert's AI analysis, but only up to notify_wait"""
+    print("\n=== Notification analysis ===")
+    NOTIFICATIONS["rate_limits"]["sns"] = {"rate": 100, "burst": 100}
+    notify_wait = AI_ENRICHMENT["notify_wait"]
+    AI_ENRICHMENT["notify_wait"] = 1
+    sns = FakeSNS()
+    try:
+        for analyzer in (StubAnalyzer(delay=0.1), StubAnalyzer(fail=True), StubAnalyzer(delay=2)):
+            manager = AlertManager(Database(InMemoryBackend()))
+            manager.notifier = NotificationDispatcher([SNSChannel(sns.client(), TOPIC_ARN)])
+            manager.enricher = AnalysisEnricher(analyzer, manager._attach_analysis)
+            start = time.perf_counter()
+            await manager.create_alert({**make_alert(7), "rule": "error_rate"})
+            await manager.create_alert({**make_alert(7), "rule": "error_rate"})
+            assert time.perf_counter() - start < 0.1
+            await asyncio.sleep(1.2)
+            await manager.stop()
+
+        for message in sns.messages:
+            print(message["Message"].splitlines()[-3:])
+        assert len(sns.messages) == 3
+        assert "Root cause of Alert 7" in sns.messages[0]["Message"]
+        # A failed or late analysis does not hold the notification back
+        assert all("Root cause" not in message["Message"] for message in sns.messages[1:])
+    finally:
+        AI_ENRICHMENT["notify_wait"] = notify_wait
+        sns.close()
+
+
+def test_storm_is_coalesced():
+    asyncio.run(check_storm_is_coalesced())
+
+
+def test_submit_does_not_wait():
+    asyncio.run(check_submit_does_not_wait())
+
+
+def test_failures_are_retried():
+    asyncio.run(check_failures_are_retried())
+
+
+def test_full_queue_drops():
+    asyncio.run(check_full_queue_drops())
+
+
+def test_alert_manager_delivery():
+    asyncio.run(check_alert_manager_delivery())
+
+
+def test_notification_carries_analysis():
+    asyncio.run(check_notification_carries_analysis())
+
+
+async def main():
+    """Run all tests"""
+    await check_storm_is_coalesced()
+    await check_submit_does_not_wait()
+    await check_failures_are_retried()
+    await check_full_queue_drops()
+    await check_alert_manager_delivery()
+    await check_notification_carries_analysis()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,294 @@
+"""
+Test script for the incident predictor: background training, model publishing, online updates, scoring and checkpoints
+"""
+import asyncio
+import os
+import pickle
+import tempfile
+import time
+import numpy as np
+from bench_training_data import generate_series
+from src.config.settings import PREDICTION
+from src.predictors.predictor import Predictor, FEATURE_METRICS, incident_probability
+from src.predictors.training import ModelTrainer
+from src.storage.backend import InMemoryBackend
+from src.storage.database import Database
+
+
+class SeriesDatabase(Database):
+    """Database whose historical series are fixed synthetic data"""
+
+    def __init__(self, series: dict):
+        super().__init__(InMemoryBackend())
+        self.series = series
+
+    async def get_historical_series(self) -> dict:
+        return self.series
+
+    async def get_recent_metrics(self) -> dict:
+        return recent(self.series)
+
+
+def recent(series: dict) -> dict:
+    """The last buckets of every service, shaped like Database.get_recent_metrics()"""
+    return {service: {m: metrics[m][-30:].tolist() for m in FEATURE_METRICS} for service, metrics in series.items()}
+
+
+async def check_training_does_not_block():
+    """The event loop keeps running while the model trains, and predictions use a consistent model"""
+    print("\n=== Background training ===")
+    series = generate_series(10_000, 10)
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=tempfile.mkdtemp())
+    predictor.trainer = ModelTrainer(n_estimators=20)
+    lags = []
+
+    async def tick():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(0.01)
+            lags.append(time.perf_counter() - started - 0.01)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        assert (await predictor.get_scores())["probabilities"] == {}
+        started = time.perf_counter()
+        await predictor.retrain()
+        elapsed = time.perf_counter() - started
+        print(f"Trained version {predictor.current['version']} on {predictor.current['samples']:,} rows "
+              f"in {elapsed:.2f}s, max loop lag {max(lags) * 1000:.1f}ms")
+        assert predictor.current["version"] == 1 and predictor.current["samples"] > 0
+        assert max(lags) < 0.2
+
+        # A retrain requested while one is running joins it
+        first = predictor.retrain()
+        assert predictor.retrain() is first
+        scores_during = await predictor.get_scores()
+        await first
+        assert predictor.current["version"] == 2
+        assert scores_during["version"] == 1 and len(scores_during["probabilities"]) == len(series)
+        assert (await predictor.get_scores())["version"] == 2
+    finally:
+        ticker.cancel()
+        await predictor.stop()
+
+
+async def check_history_without_incidents():
+    """A model trained only on healthy history predicts nothing instead of failing"""
+    print("\n=== No incidents ===")
+    series = generate_series(20_000, 2)
+    for metrics in series.values():
+        metrics["incidents"] = np.zeros_like(metrics["incidents"])
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=tempfile.mkdtemp())
+    predictor.trainer = ModelTrainer(n_estimators=20)
+    try:
+        await predictor.retrain()
+        scores = await predictor.get_scores()
+        assert set(scores["probabilities"].values()) == {0.0} and predictor._make_predictions(scores) == []
+    finally:
+        await predictor.stop()
+
+
+def append_buckets(series: dict, buckets: int, latency_factor: float = 1.0, seed: int = 1):
+    """Add newer buckets to every service's series"""
+    newer = generate_series(buckets * len(series), len(series), seed=seed)
+    for (service, metrics), extra in zip(series.items(), newer.values()):
+        extra["timestamps"] = extra["timestamps"] + metrics["timestamps"][-1] + 10
+        extra["response_times"] = extra["response_times"] * latency_factor
+        for name in metrics:
+            metrics[name] = np.concatenate([metrics[name], extra[name]])
+
+
+async def check_online_updates():
+    """New windows add trees to the forest; drifted windows trigger a full retrain"""
+    print("\n=== Online updates ===")
+    series = generate_series(10_000, 10)
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=tempfile.mkdtemp())
+    predictor.trainer = ModelTrainer(n_estimators=20, trees_per_update=5, max_trees=30)
+    try:
+        await predictor.retrain()
+        first = predictor.current
+        full_seconds = predictor.stats["training_seconds"]
+
+        # Too few new windows: nothing to do yet
+        append_buckets(series, 5)
+        await predictor.retrain(full=False)
+        assert predictor.current is first
+
+        append_buckets(series, 50, seed=2)
+        await predictor.retrain(full=False)
+        update_seconds = predictor.stats["training_seconds"] - full_seconds
+        updated = predictor.current
+        print(f"Full fit {full_seconds:.2f}s on {first['samples']:,} rows, "
+              f"update {update_seconds:.2f}s on {updated['samples'] - first['samples']:,} new rows")
+        assert predictor.stats["updates"] == 1 and updated["version"] == 2
+        assert len(updated["model"].estimators_) == 25 and len(first["model"].estimators_) == 20
+        assert updated["samples"] - first["samples"] == 10 * 55
+        assert updated["trained_until"] == series["service-0"]["timestamps"][-2]
+
+        # Older trees age out past max_trees
+        for seed in (3, 4):
+            append_buckets(series, 50, seed=seed)
+            await predictor.retrain(full=False)
+        assert len(predictor.current["model"].estimators_) == 30
+
+        append_buckets(series, 50, latency_factor=5, seed=5)
+        await predictor.retrain(full=False)
+        print(f"Stats after drift: {predictor.stats}")
+        assert predictor.stats["drift_retrains"] == 1 and predictor.stats["fits"] == 2
+        assert len(predictor.current["model"].estimators_) == 20
+    finally:
+        await predictor.stop()
+
+
+async def check_incident_free_windows_defer_update():
+    """Healthy new windows do not force a full retrain; they join the next update"""
+    print("\n=== Incident-free update ===")
+    series = generate_series(10_000, 10)
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=tempfile.mkdtemp())
+    predictor.trainer = ModelTrainer(n_estimators=20, trees_per_update=5, max_trees=30)
+    try:
+        await predictor.retrain()
+        first = predictor.current
+
+        append_buckets(series, 50, seed=2)
+        for metrics in series.values():
+            metrics["incidents"][-50:] = 0
+        full_fits = []
+        train = predictor._train_initial_model
+
+        async def counted():
+            full_fits.append(True)
+            await train()
+
+        predictor._train_initial_model = counted
+        await predictor.retrain(full=False)
+        print(f"Stats after healthy windows: {predictor.stats}")
+        assert full_fits == [] and predictor.current is first
+        assert predictor.stats["deferred_updates"] == 1 and predictor.stats["updates"] == 0
+
+        # Once incidents appear, the update covers every window since the fit
+        append_buckets(series, 50, seed=3)
+        await predictor.retrain(full=False)
+        assert full_fits == [] and predictor.stats["updates"] == 1 and predictor.stats["fits"] == 1
+        assert predictor.current["samples"] - first["samples"] == 10 * 100
+    finally:
+        await predictor.stop()
+
+
+async def check_batched_scoring():
+    """All services are scored in one call, once per model version and time bucket"""
+    print("\n=== Batched scoring ===")
+    PREDICTION["score_bucket"] = 3600
+    series = generate_series(300 * 200, 300)
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=tempfile.mkdtemp())
+    predictor.trainer = ModelTrainer(n_estimators=20)
+    try:
+        await predictor.retrain()
+        model = predictor.current["model"]
+        metrics = recent(series)
+
+        started = time.perf_counter()
+        single = {}
+        for service, service_metrics in metrics.items():
+            X = np.array([service_metrics[m][-5:] for m in FEATURE_METRICS]).T.reshape(1, -1)
+            single[service] = float(incident_probability(model, X)[0])
+        single_ms = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        scores = await predictor.get_scores()
+        batched_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in range(100):
+            assert await predictor.get_scores() is scores
+        cached_ms = (time.perf_counter() - started) * 1000 / 100
+        print(f"300 services: {single_ms:.1f}ms one by one, {batched_ms:.1f}ms batched, {cached_ms:.3f}ms cached")
+        assert scores["probabilities"] == single
+        assert predictor.stats["scored"] == 300 and predictor.stats["score_hits"] == 100
+
+        # A new time bucket scores again
+        scores["bucket"] -= 1
+        assert await predictor.get_scores() is not scores
+        assert predictor.stats["scored"] == 600
+    finally:
+        await predictor.stop()
+
+
+async def check_checkpoint_warm_start():
+    """A new predictor serves the last checkpointed model at once, then replaces it with a fresh fit"""
+    print("\n=== Checkpoints ===")
+    PREDICTION["score_bucket"] = 3600
+    series = generate_series(20_000, 50)
+    directory = tempfile.mkdtemp()
+    trained = Predictor(SeriesDatabase(series), checkpoint_dir=directory)
+    trained.trainer = ModelTrainer(n_estimators=50)
+    try:
+        await trained.retrain()
+        await trained.saving
+        expected = (await trained.get_scores())["probabilities"]
+    finally:
+        await trained.stop()
+    model = trained.current["model"]
+    path = os.path.join(directory, "model-00000001")
+    size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    started = time.perf_counter()
+    predictor = Predictor(SeriesDatabase(series), checkpoint_dir=directory)
+    load_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    pickle.loads(pickle.dumps(model))
+    pickle_ms = (time.perf_counter() - started) * 1000
+    predictor.trainer = ModelTrainer(n_estimators=50)
+    try:
+        scores = await predictor.get_scores()
+        print(f"Checkpoint of {len(model.estimators_)} trees: {size / 1024:.0f} KiB "
+              f"(pickle {len(pickle.dumps(model)) / 1024:.0f} KiB), loaded in {load_ms:.1f}ms "
+              f"(unpickling {pickle_ms:.1f}ms)")
+        assert scores["version"] == 1 and predictor.current["trained_until"] == trained.current["trained_until"]
+        assert scores["probabilities"].keys() == expected.keys()
+        assert max(abs(scores["probabilities"][s] - expected[s]) for s in expected) < 1e-6
+
+        # The loaded model cannot grow trees, so the first update is a full fit
+        await predictor.retrain(full=False)
+        await predictor.saving
+        assert predictor.current["version"] == 2 and predictor.stats["fits"] == 1
+        assert sorted(os.listdir(directory)) == ["model-00000001", "model-00000002"]
+    finally:
+        await predictor.stop()
+
+
+def test_training_does_not_block():
+    asyncio.run(check_training_does_not_block())
+
+
+def test_history_without_incidents():
+    asyncio.run(check_history_without_incidents())
+
+
+def test_online_updates():
+    asyncio.run(check_online_updates())
+
+
+def test_incident_free_windows_defer_update():
+    asyncio.run(check_incident_free_windows_defer_update())
+
+
+def test_batched_scoring():
+    asyncio.run(check_batched_scoring())
+
+
+def test_checkpoint_warm_start():
+    asyncio.run(check_checkpoint_warm_start())
+
+
+async def main():
+    """Run all tests"""
+    await check_training_does_not_block()
+    await check_history_without_incidents()
+    await check_online_updates()
+    await check_incident_free_windows_defer_update()
+    await check_batched_scoring()
+    await check_checkpoint_warm_start()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""
+Test script for the streaming /analyze endpoint against a local fake streaming OpenAI server
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import uvicorn
+
+ANSWER = [
+    "Latency is ", "elevated on ", "the order service.\n",
+    "- You should ", "scale the database ", "read replicas\n",
+    "Error rates look normal.\n",
+    "- Consider adding ", "a cache for product lookups"
+]
+
+REQUEST = {
+    "metrics": {"response_times": [150, 200, 1180], "error_rates": [0.02, 0.03, 0.01], "request_rate": 100},
+    "alerts": [{"title": "High Latency", "message": "Response time exceeded threshold", "severity": "warning"}]
+}
+
+
+class FakeStreamingOpenAI:
+    """Streams a fixed answer as chat completion chunks, after a delay"""
+
+    def __init__(self, first_token_delay: float = 0.5, chunk_delay: float = 0.05):
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if not request.get("stream"):
+                    body = json.dumps({
+                        "id": "chatcmpl-1", "object": "chat.completion", "created": int(time.time()),
+                        "model": request["model"],
+                        "choices": [{"index": 0, "finish_reason": "stop",
+                                     "message": {"role": "assistant", "content": "".join(ANSWER)}}],
+                        "usage": {"prompt_tokens": 100, "completion_tokens": 30, "total_tokens": 130}
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                time.sleep(first_token_delay)
+                for i, content in enumerate(ANSWER):
+                    chunk = {
+                        "id": "chatcmpl-1", "object": "chat.completion.chunk", "created": int(time.time()),
+                        "model": request["model"],
+                        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                    time.sleep(chunk_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/v1"
+
+    def close(self):
+        self.server.shutdown()
+
+
+async def read_frames(port: int):
+    """POST /analyze?stream=true and collect (seconds since request, frame)"""
+    frames = []
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=10) as client:
+        async with client.stream("POST", f"http://127.0.0.1:{port}/analyze?stream=true", json=REQUEST) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"].startswith("text/event-stream")
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    frames.append((time.perf_counter() - start, json.loads(line[6:])))
+    return frames
+
+
+async def check_streaming_analyze():
+    """Severity arrives before the model answers; tokens and recommendations follow as they stream"""
+    print("\n=== Streaming /analyze ===")
+    fake = FakeStreamingOpenAI()
+    os.environ["OPENAI_API_KEY"] = "test-key"
+    os.environ["OPENAI_BASE_URL"] = fake.url
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+    import main
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    try:
+        while not server.started:
+            await asyncio.sleep(0.01)
+        port = server.servers[0].sockets[0].getsockname()[1]
+
+        frames = await read_frames(port)
+        for elapsed, frame in frames:
+            print(f"{elapsed * 1000:7.1f}ms {frame['type']}: {frame.get('content') or frame.get('recommendation') or ''}")
+        types = [frame["type"] for _, frame in frames]
+
+        first_elapsed, first = frames[0]
+        assert first["type"] == "severity" and first["severity"] == "danger"
+        # The first frame does not wait for the model's first token
+        assert first_elapsed < 0.4 < frames[1][0]
+
+        assert "".join(frame["content"] for _, frame in frames if frame["type"] == "token") == "".join(ANSWER)
+        recommendations = [frame["recommendation"] for _, frame in frames if frame["type"] == "recommendation"]
+        assert recommendations == ["You should scale the database read replicas",
+                                   "Consider adding a cache for product lookups"]
+        # The first recommendation is sent as soon as its line ends, before the rest of the answer
+        assert types.index("recommendation") == 7
+        done = frames[-1][1]
+        assert done["type"] == "done" and done["recommendations"] == recommendations
+        assert done["recommendations"] == main.openai_analyzer._extract_recommendations("".join(ANSWER))
+
+        # Without stream=true the endpoint still returns one JSON document
+        async with httpx.AsyncClient(timeout=10) as client:
+            result = (await client.post(f"http://127.0.0.1:{port}/analyze", json=REQUEST)).json()
+        assert result["analysis"] == "".join(ANSWER) and result["severity"] == "danger"
+    finally:
+        server.should_exit = True
+        await serving
+        fake.close()
+
+
+def test_streaming_analyze():
+    asyncio.run(check_streaming_analyze())
+
+
+async def main():
+    """Run all tests"""
+    await check_streaming_analyze()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+"""
+Test script for the sliding-window request statistics: clock-driven advance, expiry and timestamps
+"""
+import asyncio
+import numpy as np
+from src.analyzers.streaming_stats import NS, SlidingWindowStats
+
+NOW = 1_700_000_000 * NS
+
+
+def events(offsets_s: list, latency: float = 100.0) -> tuple:
+    """One event per offset (seconds from NOW) for service 1, endpoint 2"""
+    n = len(offsets_s)
+    timestamps = NOW + (np.asarray(offsets_s, dtype=np.float64) * NS).astype(np.int64)
+    return (np.full(n, 1, dtype=np.int32), np.full(n, 2, dtype=np.int32), timestamps,
+            np.full(n, latency, dtype=np.float32), np.zeros(n, dtype=bool))
+
+
+async def check_future_timestamp_does_not_move_window():
+    """A log dated an hour ahead is dropped and current logs keep counting"""
+    print("\n=== Future timestamp ===")
+    window = SlidingWindowStats(window_seconds=60)
+    window.add(*events([3600]), now_ns=NOW)
+    window.add(*events(np.linspace(-30, 0, 50)), now_ns=NOW)
+    stats = window.snapshot()
+    print(f"Counted {stats['count'].tolist()} requests")
+    assert stats["count"].tolist() == [50]
+
+    # A log a few seconds ahead (within the clock skew) counts in the newest slot
+    window.add(*events([5]), now_ns=NOW)
+    assert window.snapshot()["count"].tolist() == [51]
+    window.advance(NOW + 60 * NS)
+    assert window.snapshot()["count"].tolist() == [0]
+
+
+async def check_out_of_order_and_expiry():
+    """Shuffled logs land in their own slots and expire as the clock moves on"""
+    print("\n=== Out of order ===")
+    window = SlidingWindowStats(window_seconds=60)
+    offsets = [-50, -5, -30, -59, -10, -90]
+    window.add(*events(offsets), now_ns=NOW)
+    # The log 90 seconds old is outside the window
+    assert window.snapshot()["count"].tolist() == [5]
+
+    window.add(*events([-20], latency=400.0), now_ns=NOW)
+    stats = window.snapshot()
+    assert stats["count"].tolist() == [6] and stats["mean"][0] == 150.0
+
+    # Moving 15 seconds on expires the logs from 59 and 50 seconds before NOW
+    window.advance(NOW + 15 * NS)
+    stats = window.snapshot()
+    print(f"After advance: count {stats['count'].tolist()}, mean {stats['mean'].tolist()}")
+    assert stats["count"].tolist() == [4] and stats["mean"][0] == 175.0
+    assert stats["sketch"].sum() == 4
+
+    # An older clock reading never moves the window back
+    window.add(*events([-50]), now_ns=NOW)
+    assert window.snapshot()["count"].tolist() == [4]
+
+
+async def check_batches_match_direct_statistics():
+    """Incremental updates over many keys agree with statistics computed from all events"""
+    print("\n=== Many keys ===")
+    rng = np.random.default_rng(7)
+    window = SlidingWindowStats(window_seconds=600)
+    n = 5000
+    services = rng.integers(1, 20, n).astype(np.int32)
+    endpoints = rng.integers(1, 6, n).astype(np.int32)
+    timestamps = NOW - rng.integers(0, 599 * NS, n)
+    latencies = rng.lognormal(4, 1, n).astype(np.float32)
+    errors = rng.random(n) < 0.1
+    for part in np.array_split(np.arange(n), 25):
+        window.add(services[part], endpoints[part], timestamps[part], latencies[part], errors[part], now_ns=NOW)
+
+    stats = window.snapshot()
+    for i, (service, endpoint) in enumerate(stats["keys"].tolist()):
+        mask = (services == service) & (endpoints == endpoint)
+        assert stats["count"][i] == mask.sum() and stats["sketch"][i].sum() == mask.sum()
+        assert np.isclose(stats["mean"][i], latencies[mask].astype(np.float64).mean())
+        assert np.isclose(stats["error_ratio"][i], errors[mask].mean())
+    assert stats["count"].sum() == n
+
+
+def test_future_timestamp_does_not_move_window():
+    asyncio.run(check_future_timestamp_does_not_move_window())
+
+
+def test_out_of_order_and_expiry():
+    asyncio.run(check_out_of_order_and_expiry())
+
+
+def test_batches_match_direct_statistics():
+    asyncio.run(check_batches_match_direct_statistics())
+
+
+async def main():
+    """Run all tests"""
+    await check_future_timestamp_does_not_move_window()
+    await check_out_of_order_and_expiry()
+    await check_batches_match_direct_statistics()
+    print("\nTests completed!")
+
+if __name__ == "__main__":
+    asyncio.run(main())